@@ -4,13 +4,29 @@ AI classification module for Smart Inbox Application
 
 import logging
 import os
-from typing import Dict, Tuple
+import time
+from typing import Dict, Optional, Tuple
 import openai
 
 from app.config.settings import AI_SETTINGS
+from app.backend.ai.resilience import CircuitBreaker, DeadlineCaller, LatencyTracker
 
 logger = logging.getLogger(__name__)
 
+# Classification sources learnt from: the primary classifier and manual review.
+# Outcomes derived from earlier outcomes (nearest neighbours, sender history)
+# would otherwise reinforce their own mistakes, and keyword guesses made while
+# the primary classifier is unavailable ("fallback") are too weak to learn from.
+LEARNING_SOURCES = ("classifier", "manual")
+
+class Classification(tuple):
+    """(classification, confidence) pair from a classifier other than the primary one"""
+    
+    def __new__(cls, classification: str, confidence: float, source: str):
+        result = super().__new__(cls, (classification, confidence))
+        result.source = source
+        return result
+
 class AIClassifier:
     """Base class for AI-based email classification"""
     
@@ -29,6 +45,28 @@ class AIClassifier:
             Tuple of (classification, confidence_score)
         """
         raise NotImplementedError
+    
+    def learn(self, email_content: str, classification: str, reference: Optional[int] = None,
+              source: Optional[str] = None):
+        """
+        Learn from a classification outcome (no-op unless overridden)
+        
+        Args:
+            email_content: Email body content
+            classification: Classification
+            reference: Email ID
+            source: Classification source; only LEARNING_SOURCES are learnt from
+        """
+        pass
+    
+    def load_history(self, db):
+        """
+        Load state from stored emails (no-op unless overridden)
+        
+        Args:
+            db: Database session
+        """
+        pass
 
 
 class OpenAIClassifier(AIClassifier):
@@ -38,11 +76,28 @@ class OpenAIClassifier(AIClassifier):
         super().__init__()
         self.api_key = os.getenv("OPENAI_API_KEY", AI_SETTINGS["api_key"])
         self.model = AI_SETTINGS["model"]
+        self.request_timeout = AI_SETTINGS["request_timeout"]
         openai.api_key = self.api_key
+        
+        # Latency SLO guards: deadline, circuit breaker and local fallback
+        breaker_settings = AI_SETTINGS["circuit_breaker"]
+        self.circuit_breaker = CircuitBreaker(
+            failure_threshold=breaker_settings["failure_threshold"],
+            reset_timeout=breaker_settings["reset_timeout"],
+            slow_call_threshold=breaker_settings["slow_call_threshold"]
+        )
+        self.caller = DeadlineCaller(
+            max_workers=AI_SETTINGS["max_concurrent_requests"],
+            deadline=self.request_timeout,
+            hedge=AI_SETTINGS["hedge_requests"],
+            latency=LatencyTracker()
+        )
+        self.fallback = CustomClassifier()
     
     def classify_email(self, email_content: str) -> Tuple[str, float]:
         """
-        Classify email content using OpenAI API
+        Classify email content using OpenAI API, falling back to the local
+        classifier when the call fails, misses its deadline or the circuit is open
         
         Args:
             email_content: Email body content
@@ -50,58 +105,96 @@ class OpenAIClassifier(AIClassifier):
         Returns:
             Tuple of (classification, confidence_score)
         """
+        if not self.circuit_breaker.allow_request():
+            self.logger.warning("OpenAI circuit open, using local classifier")
+            return self.classify_fallback(email_content)
+        
+        start = time.monotonic()
         try:
-            # Prepare prompt for classification
-            prompt = f"""
-            Classify the following email into one of these categories:
-            - technical: Technical issues, bug reports, feature requests
-            - commercial: Sales inquiries, pricing questions, contract discussions
-            - administrative: Account management, general inquiries, scheduling
+            result = self.caller.call(self.request_classification, email_content)
+        except Exception as e:
+            self.circuit_breaker.record_failure()
+            self.logger.error(f"OpenAI API error: {str(e)}, using local classifier")
+            return self.classify_fallback(email_content)
+        
+        self.circuit_breaker.record_success(time.monotonic() - start)
+        return result
+    
+    def classify_fallback(self, email_content: str) -> "Classification":
+        """
+        Classify with the local classifier, tagged with source "fallback" so
+        the guess is not learnt from as a primary classifier outcome
+        
+        Args:
+            email_content: Email body content
             
-            Email content:
-            {email_content[:1000]}  # Limit content length
+        Returns:
+            Classification with source "fallback"
+        """
+        classification, confidence = self.fallback.classify_email(email_content)
+        return Classification(classification, confidence, "fallback")
+    
+    def request_classification(self, email_content: str) -> Tuple[str, float]:
+        """
+        Request a classification from the OpenAI API
+        
+        Args:
+            email_content: Email body content
             
-            Respond with only the category name and confidence score (0-1) separated by a comma.
-            Example: "technical,0.85"
-            """
+        Returns:
+            Tuple of (classification, confidence_score)
             
-            # Call OpenAI API
-            response = openai.ChatCompletion.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are an email classification assistant."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3,  # Lower temperature for more deterministic results
-                max_tokens=20     # Short response needed
-            )
+        Raises:
+            Exception: If the API call fails
+        """
+        # Prepare prompt for classification
+        prompt = f"""
+        Classify the following email into one of these categories:
+        - technical: Technical issues, bug reports, feature requests
+        - commercial: Sales inquiries, pricing questions, contract discussions
+        - administrative: Account management, general inquiries, scheduling
+        
+        Email content:
+        {email_content[:1000]}  # Limit content length
+        
+        Respond with only the category name and confidence score (0-1) separated by a comma.
+        Example: "technical,0.85"
+        """
+        
+        # Call OpenAI API
+        response = openai.ChatCompletion.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": "You are an email classification assistant."},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.3,  # Lower temperature for more deterministic results
+            max_tokens=20,    # Short response needed
+            request_timeout=self.request_timeout
+        )
+        
+        # Parse response
+        result = response.choices[0].message.content.strip()
+        parts = result.split(',')
+        
+        if len(parts) == 2:
+            classification = parts[0].strip().lower()
+            try:
+                confidence = float(parts[1].strip())
+            except ValueError:
+                confidence = 0.5  # Default if parsing fails
             
-            # Parse response
-            result = response.choices[0].message.content.strip()
-            parts = result.split(',')
+            # Validate classification
+            valid_categories = ["technical", "commercial", "administrative"]
+            if classification not in valid_categories:
+                self.logger.warning(f"Invalid classification: {classification}, defaulting to 'administrative'")
+                classification = "administrative"
+                confidence = 0.5
             
-            if len(parts) == 2:
-                classification = parts[0].strip().lower()
-                try:
-                    confidence = float(parts[1].strip())
-                except ValueError:
-                    confidence = 0.5  # Default if parsing fails
-                
-                # Validate classification
-                valid_categories = ["technical", "commercial", "administrative"]
-                if classification not in valid_categories:
-                    self.logger.warning(f"Invalid classification: {classification}, defaulting to 'administrative'")
-                    classification = "administrative"
-                    confidence = 0.5
-                
-                self.logger.info(f"Classified email as '{classification}' with confidence {confidence}")
-                return classification, confidence
-            else:
-                self.logger.error(f"Unexpected response format: {result}")
-                return "administrative", 0.5  # Default to administrative with low confidence
-                
-        except Exception as e:
-            self.logger.error(f"OpenAI API error: {str(e)}")
+            self.logger.info(f"Classified email as '{classification}' with confidence {confidence}")
+            return classification, confidence
+        else:
+            self.logger.error(f"Unexpected response format: {result}")
             return "administrative", 0.5  # Default to administrative with low confidence
 
 
@@ -172,6 +265,13 @@ def get_ai_classifier() -> AIClassifier:
     """Factory function to get appropriate AI classifier"""
     # Check if OpenAI API key is available
     if os.getenv("OPENAI_API_KEY") or AI_SETTINGS.get("api_key"):
-        return OpenAIClassifier()
+        classifier = OpenAIClassifier()
     else:
-        return CustomClassifier()
+        classifier = CustomClassifier()
+    
+    # Put the nearest-neighbour vote in front of the configured classifier
+    if AI_SETTINGS["nearest_neighbour"]["enabled"]:
+        from app.backend.ai.nearest_neighbour import NearestNeighbourClassifier
+        return NearestNeighbourClassifier(fallback=classifier)
+    
+    return classifier
@@ -0,0 +1,375 @@
+"""
+TF-IDF nearest-neighbour classification over labelled historical emails
+"""
+
+import datetime
+import heapq
+import json
+import logging
+import math
+import os
+import re
+import struct
+import threading
+import zlib
+from array import array
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from app.config.settings import AI_SETTINGS
+from app.backend.ai.classifier import LEARNING_SOURCES, AIClassifier, Classification
+
+logger = logging.getLogger(__name__)
+
+INDEX_MAGIC = b"SIKNN1"
+
+TOKEN_PATTERN = re.compile(r"[a-z][a-z0-9]{2,}")
+TAG_PATTERN = re.compile(r"<[^>]+>")
+STOPWORDS = frozenset("""
+    the and for are but not you your with this that have from they will would there their what
+    about which when make can like just than them some could into other then its only also our
+    was were been has had any all out who get how more these may very well please thanks thank
+    regards best dear hello kind hi
+""".split())
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split email text into index terms
+    
+    Args:
+        text: Email body (plain text or HTML)
+        
+    Returns:
+        List of lowercased terms without stopwords
+    """
+    text = TAG_PATTERN.sub(" ", text or "").lower()
+    return [t for t in TOKEN_PATTERN.findall(text) if t not in STOPWORDS]
+
+
+class TfidfIndex:
+    """In-memory sparse TF-IDF index with inverted postings"""
+    
+    def __init__(self, max_terms_per_doc: int = 200, max_df: float = 0.5):
+        self.max_terms_per_doc = max_terms_per_doc
+        self.max_df = max_df
+        self.doc_ids = []
+        self.labels = []
+        self.doc_terms = []
+        self.norms = []
+        self.postings = {}
+        self.df = Counter()
+        self._positions = {}
+        self._lock = threading.RLock()
+        # processed_at of the newest labelled email read from the database
+        self.watermark: Optional[datetime.datetime] = None
+    
+    def __len__(self):
+        return len(self.doc_ids)
+    
+    def idf(self, term: str) -> float:
+        """Smoothed inverse document frequency of a term"""
+        return math.log((1 + len(self.doc_ids)) / (1 + self.df.get(term, 0))) + 1.0
+    
+    def add(self, doc_id: int, text: str, label: str, compute_norm: bool = True) -> bool:
+        """
+        Add a labelled document, or relabel it if already indexed
+        
+        Args:
+            doc_id: Email ID
+            text: Email body
+            label: Classification
+            compute_norm: Set to False for bulk loads followed by rebuild()
+            
+        Returns:
+            True if the index changed
+        """
+        with self._lock:
+            position = self._positions.get(doc_id)
+            if position is not None:
+                if self.labels[position] == label:
+                    return False
+                self.labels[position] = label
+                return True
+            
+            counts = Counter(tokenize(text))
+            if not counts:
+                return False
+            terms = dict(counts.most_common(self.max_terms_per_doc))
+            self._append(doc_id, label, terms, compute_norm)
+            return True
+    
+    def _append(self, doc_id: int, label: str, terms: Dict[str, int], compute_norm: bool = True):
+        """Append a document's term counts to the index"""
+        position = len(self.doc_ids)
+        self._positions[doc_id] = position
+        self.doc_ids.append(doc_id)
+        self.labels.append(label)
+        self.doc_terms.append(terms)
+        
+        for term, count in terms.items():
+            self.df[term] += 1
+            self.postings.setdefault(term, []).append((position, 1.0 + math.log(count)))
+        
+        # Norms use the IDF at insert time; rebuild() refreshes them after large growth
+        norm = 0.0
+        if compute_norm:
+            norm = sum(((1.0 + math.log(c)) * self.idf(t)) ** 2 for t, c in terms.items())
+        self.norms.append(math.sqrt(norm) or 1.0)
+    
+    def rebuild(self):
+        """Recompute document norms with the current IDF values"""
+        with self._lock:
+            for position, terms in enumerate(self.doc_terms):
+                norm = sum(((1.0 + math.log(c)) * self.idf(t)) ** 2 for t, c in terms.items())
+                self.norms[position] = math.sqrt(norm) or 1.0
+    
+    def query(self, text: str, k: int) -> List[Tuple[int, str, float]]:
+        """
+        Find the k most similar labelled documents
+        
+        Args:
+            text: Query email body
+            k: Number of neighbours
+            
+        Returns:
+            List of (doc_id, label, cosine_similarity), most similar first
+        """
+        counts = Counter(tokenize(text))
+        with self._lock:
+            total = len(self.doc_ids)
+            if not counts or not total:
+                return []
+            
+            scores = {}
+            query_norm = 0.0
+            for term, count in counts.items():
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = self.idf(term)
+                query_weight = (1.0 + math.log(count)) * idf
+                query_norm += query_weight ** 2
+                # Very common terms carry little signal but dominate the postings scan
+                if len(postings) > self.max_df * total and total >= 20:
+                    continue
+                for position, weight in postings:
+                    scores[position] = scores.get(position, 0.0) + query_weight * weight * idf
+            
+            if not scores:
+                return []
+            
+            query_norm = math.sqrt(query_norm) or 1.0
+            best = heapq.nlargest(k, scores.items(), key=lambda item: item[1] / self.norms[item[0]])
+            return [
+                (self.doc_ids[p], self.labels[p], score / (self.norms[p] * query_norm))
+                for p, score in best
+            ]
+    
+    def save(self, path: str):
+        """
+        Write the index to disk in a compact binary format
+        
+        Term strings are stored once in a vocabulary; each document is a run of
+        (term id, count) pairs in packed arrays, all zlib-compressed.
+        
+        Args:
+            path: Destination file path
+        """
+        with self._lock:
+            vocabulary = {}
+            label_names = sorted(set(self.labels))
+            label_ids = {label: i for i, label in enumerate(label_names)}
+            ids = array('q', self.doc_ids)
+            doc_labels = array('B', (label_ids[label] for label in self.labels))
+            lengths = array('I')
+            term_ids = array('I')
+            term_counts = array('H')
+            for terms in self.doc_terms:
+                lengths.append(len(terms))
+                for term, count in terms.items():
+                    term_ids.append(vocabulary.setdefault(term, len(vocabulary)))
+                    term_counts.append(min(count, 65535))
+        
+        meta = json.dumps({
+            "version": 1,
+            "vocabulary": list(vocabulary),
+            "labels": label_names,
+            "watermark": self.watermark.isoformat() if self.watermark else None
+        }).encode()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(INDEX_MAGIC)
+            for blob in (meta, ids.tobytes(), doc_labels.tobytes(), lengths.tobytes(),
+                         term_ids.tobytes(), term_counts.tobytes()):
+                data = zlib.compress(blob, 6)
+                f.write(struct.pack("<Q", len(data)))
+                f.write(data)
+        os.replace(tmp_path, path)
+    
+    @classmethod
+    def load(cls, path: str, **kwargs) -> "TfidfIndex":
+        """
+        Load an index written by save()
+        
+        Args:
+            path: Index file path
+            
+        Returns:
+            TfidfIndex instance
+        """
+        with open(path, "rb") as f:
+            if f.read(len(INDEX_MAGIC)) != INDEX_MAGIC:
+                raise ValueError(f"Not a nearest-neighbour index file: {path}")
+            blobs = []
+            for _ in range(6):
+                (size,) = struct.unpack("<Q", f.read(8))
+                blobs.append(zlib.decompress(f.read(size)))
+        
+        meta = json.loads(blobs[0])
+        arrays = []
+        for typecode, blob in zip(('q', 'B', 'I', 'I', 'H'), blobs[1:]):
+            values = array(typecode)
+            values.frombytes(blob)
+            arrays.append(values)
+        ids, doc_labels, lengths, term_ids, term_counts = arrays
+        
+        index = cls(**kwargs)
+        vocabulary = meta["vocabulary"]
+        label_names = meta["labels"]
+        offset = 0
+        for doc_id, label_id, length in zip(ids, doc_labels, lengths):
+            terms = {
+                vocabulary[term_ids[i]]: term_counts[i]
+                for i in range(offset, offset + length)
+            }
+            offset += length
+            index._append(doc_id, label_names[label_id], terms, compute_norm=False)
+        index.rebuild()
+        if meta.get("watermark"):
+            index.watermark = datetime.datetime.fromisoformat(meta["watermark"])
+        return index
+
+
+class NearestNeighbourClassifier(AIClassifier):
+    """Classifier voting over the most similar labelled historical emails"""
+    
+    def __init__(self, fallback: Optional[AIClassifier] = None, index: Optional[TfidfIndex] = None):
+        super().__init__()
+        settings = AI_SETTINGS["nearest_neighbour"]
+        self.k = settings["k"]
+        self.min_similarity = settings["min_similarity"]
+        self.index_path = settings["index_path"]
+        self.save_every = settings["save_every"]
+        self.fallback = fallback
+        self.index = index or TfidfIndex(max_terms_per_doc=settings["max_terms_per_doc"])
+        self._unsaved = 0
+    
+    def classify_email(self, email_content: str) -> Tuple[str, float]:
+        """
+        Classify email content by similarity-weighted neighbour vote,
+        delegating to the fallback classifier when the vote is not confident
+        
+        Args:
+            email_content: Email body content
+            
+        Returns:
+            Tuple of (classification, confidence_score); a neighbour vote is
+            returned as a Classification with source "nearest_neighbour"
+        """
+        votes = {}
+        for _, label, similarity in self.index.query(email_content, self.k):
+            if similarity >= self.min_similarity:
+                votes[label] = votes.get(label, 0.0) + similarity
+        
+        if votes:
+            classification = max(votes, key=votes.get)
+            confidence = votes[classification] / sum(votes.values())
+            if confidence >= self.confidence_threshold or not self.fallback:
+                self.logger.info(f"Classified email as '{classification}' with confidence {confidence} from neighbours")
+                return Classification(classification, confidence, "nearest_neighbour")
+        
+        if self.fallback:
+            return self.fallback.classify_email(email_content)
+        return "administrative", 0.5
+    
+    def learn(self, email_content: str, classification: str, reference: Optional[int] = None,
+              source: Optional[str] = None):
+        """
+        Add a labelled email to the index
+        
+        Only primary classifier and manual review outcomes are indexed, so
+        the index never learns from its own votes.
+        
+        Args:
+            email_content: Email body content
+            classification: Classification
+            reference: Email ID
+            source: Classification source
+        """
+        if source not in LEARNING_SOURCES or reference is None:
+            return
+        if not self.index.add(reference, email_content, classification):
+            return
+        
+        self._unsaved += 1
+        if self._unsaved >= self.save_every:
+            self.save()
+    
+    def save(self):
+        """Persist the index to the configured path"""
+        try:
+            self.index.save(self.index_path)
+            self._unsaved = 0
+        except Exception as e:
+            self.logger.error(f"Failed to save nearest-neighbour index: {str(e)}")
+    
+    def load_history(self, db):
+        """
+        Load the on-disk index and add emails labelled since it was saved
+        
+        Emails processed since the index's watermark are read again, so
+        labels learnt after the last save, manual reviews of older emails and
+        relabels of indexed emails all reach the index. Files without a
+        watermark are topped up from every labelled email.
+        
+        Args:
+            db: Database session
+        """
+        from app.models.models import Email
+        
+        if os.path.exists(self.index_path):
+            try:
+                self.index = TfidfIndex.load(self.index_path, max_terms_per_doc=self.index.max_terms_per_doc)
+            except Exception as e:
+                self.logger.error(f"Failed to load nearest-neighbour index, rebuilding: {str(e)}")
+        
+        query = (
+            db.query(Email.id, Email.body, Email.classification, Email.processed_at)
+            .filter(
+                Email.status == "processed",
+                Email.classification.isnot(None),
+                Email.classification_source.in_(LEARNING_SOURCES)
+            )
+        )
+        if self.index.watermark is not None:
+            # Inclusive, since emails can share the watermark's timestamp
+            query = query.filter(Email.processed_at >= self.index.watermark)
+        
+        changed = 0
+        watermark = self.index.watermark
+        for email_id, body, classification, processed_at in query.order_by(Email.processed_at).yield_per(1000):
+            if self.index.add(email_id, body, classification, compute_norm=False):
+                changed += 1
+            if processed_at is not None and (watermark is None or processed_at > watermark):
+                watermark = processed_at
+        
+        advanced = watermark != self.index.watermark
+        self.index.watermark = watermark
+        if changed:
+            self.index.rebuild()
+        if changed or advanced:
+            self.save()
+        self.logger.info(f"Nearest-neighbour index ready with {len(self.index)} emails ({changed} added or relabelled)")
@@ -0,0 +1,165 @@
+"""
+Latency and failure guards for external API calls
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+class CircuitBreaker:
+    """Circuit breaker that opens after consecutive failures or slow calls"""
+    
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    
+    def __init__(self, failure_threshold: int, reset_timeout: float, slow_call_threshold: Optional[float] = None):
+        self.logger = logging.getLogger(__name__)
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.slow_call_threshold = slow_call_threshold
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+    
+    def allow_request(self) -> bool:
+        """
+        Check whether a call may go to the protected service
+        
+        Returns:
+            True if the call is allowed, False if the caller should fall back
+        """
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    return False
+                # Let a single probe through to test recovery
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = True
+                self.logger.info("Circuit half-open, sending probe request")
+                return True
+            
+            if self.state == self.HALF_OPEN:
+                if self._probe_in_flight:
+                    return False
+                self._probe_in_flight = True
+            
+            return True
+    
+    def record_success(self, duration: float):
+        """
+        Record a completed call
+        
+        Args:
+            duration: Call duration in seconds; slow calls count as failures
+        """
+        if self.slow_call_threshold is not None and duration > self.slow_call_threshold:
+            self.record_failure()
+            return
+        
+        with self._lock:
+            if self.state != self.CLOSED:
+                self.logger.info("Circuit closed after successful probe")
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+    
+    def record_failure(self):
+        """Record a failed or slow call"""
+        with self._lock:
+            self.consecutive_failures += 1
+            self._probe_in_flight = False
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.logger.warning(f"Circuit opened after {self.consecutive_failures} consecutive failures")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    """Rolling window of call latencies"""
+    
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+    
+    def record(self, duration: float):
+        """Record a call duration in seconds"""
+        with self._lock:
+            self._samples.append(duration)
+    
+    def percentile(self, percentile: float) -> Optional[float]:
+        """
+        Get a latency percentile
+        
+        Args:
+            percentile: Percentile between 0 and 1
+            
+        Returns:
+            Latency in seconds, or None if there are too few samples
+        """
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < self.min_samples:
+            return None
+        index = min(len(samples) - 1, int(percentile * len(samples)))
+        return samples[index]
+
+
+class DeadlineCaller:
+    """Runs calls on a bounded pool with a strict deadline and optional hedging"""
+    
+    def __init__(self, max_workers: int, deadline: float, hedge: bool = False, latency: Optional[LatencyTracker] = None):
+        self.deadline = deadline
+        self.hedge = hedge
+        self.latency = latency or LatencyTracker()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="deadline-call")
+    
+    def call(self, func: Callable, *args, **kwargs) -> Any:
+        """
+        Call a function, returning its result within the deadline
+        
+        Args:
+            func: Function to call
+            
+        Returns:
+            Result of the first successful call
+            
+        Raises:
+            TimeoutError: If no call completed before the deadline
+            Exception: The error of the failed call if every attempt failed
+        """
+        start = time.monotonic()
+        futures = [self.executor.submit(func, *args, **kwargs)]
+        
+        # Fire a hedged second request once the first exceeds the p95 latency
+        hedge_after = self.latency.percentile(0.95) if self.hedge else None
+        if hedge_after is not None and hedge_after < self.deadline:
+            done, _ = wait(futures, timeout=hedge_after)
+            if not done:
+                futures.append(self.executor.submit(func, *args, **kwargs))
+        
+        error = None
+        pending = set(futures)
+        while pending:
+            remaining = self.deadline - (time.monotonic() - start)
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    self.latency.record(time.monotonic() - start)
+                    return future.result()
+                error = future.exception()
+        
+        if error is not None and not pending:
+            raise error
+        raise TimeoutError(f"Call exceeded deadline of {self.deadline}s")
@@ -0,0 +1,161 @@
+"""
+Per-sender classification history for Smart Inbox Application
+"""
+
+import datetime
+import logging
+import threading
+from collections import OrderedDict, deque
+from typing import Dict, Optional, Tuple
+
+from app.config.settings import SENDER_HISTORY, AI_SETTINGS
+from app.utils.helpers import extract_email_address
+
+logger = logging.getLogger(__name__)
+
+class SenderHistory:
+    """Rolling per-sender summary of recent classifications"""
+    
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self.enabled = SENDER_HISTORY["enabled"]
+        self.window = SENDER_HISTORY["window"]
+        self.min_samples = SENDER_HISTORY["min_samples"]
+        self.dominance = SENDER_HISTORY["dominance"]
+        self.max_age = datetime.timedelta(days=SENDER_HISTORY["max_age_days"])
+        self.max_senders = SENDER_HISTORY["max_senders"]
+        self.confidence_threshold = AI_SETTINGS["confidence_threshold"]
+        self.loaded = False
+        self._senders = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def record(self,
+               sender: str,
+               classification: str,
+               confidence: float,
+               timestamp: Optional[datetime.datetime] = None):
+        """
+        Add a classification outcome to the sender's history
+        
+        Args:
+            sender: Sender header value or address
+            classification: Email classification
+            confidence: Confidence score of the classification
+            timestamp: When the email was classified, defaults to now
+        """
+        address = extract_email_address(sender)
+        if not self.enabled or not address or not classification:
+            return
+        
+        entry = (classification, confidence or 0.0, timestamp or datetime.datetime.utcnow())
+        with self._lock:
+            history = self._senders.get(address)
+            if history is None:
+                history = deque(maxlen=self.window)
+                self._senders[address] = history
+            else:
+                self._senders.move_to_end(address)
+            history.append(entry)
+            
+            while len(self._senders) > self.max_senders:
+                self._senders.popitem(last=False)
+    
+    def summary(self, sender: str) -> Optional[Dict]:
+        """
+        Get the rolling summary for a sender
+        
+        Args:
+            sender: Sender header value or address
+            
+        Returns:
+            Dict with samples, counts, mean confidence per classification and
+            last_seen, or None if the sender has no history
+        """
+        address = extract_email_address(sender)
+        with self._lock:
+            history = list(self._senders.get(address) or [])
+        if not history:
+            return None
+        
+        counts = {}
+        confidence_sums = {}
+        for classification, confidence, _ in history:
+            counts[classification] = counts.get(classification, 0) + 1
+            confidence_sums[classification] = confidence_sums.get(classification, 0.0) + confidence
+        
+        return {
+            "samples": len(history),
+            "counts": counts,
+            "mean_confidence": {c: confidence_sums[c] / counts[c] for c in counts},
+            "last_seen": max(timestamp for _, _, timestamp in history)
+        }
+    
+    def predict(self, sender: str) -> Optional[Tuple[str, float]]:
+        """
+        Predict the classification from a stable sender history
+        
+        Args:
+            sender: Sender header value or address
+            
+        Returns:
+            Tuple of (classification, confidence_score) if the history is
+            dominant and recent enough, None otherwise
+        """
+        if not self.enabled:
+            return None
+        
+        summary = self.summary(sender)
+        if not summary or summary["samples"] < self.min_samples:
+            return None
+        
+        if datetime.datetime.utcnow() - summary["last_seen"] > self.max_age:
+            return None
+        
+        counts = summary["counts"]
+        classification = max(counts, key=counts.get)
+        share = counts[classification] / summary["samples"]
+        if share < self.dominance:
+            return None
+        
+        confidence = share * summary["mean_confidence"][classification]
+        if confidence < self.confidence_threshold:
+            return None
+        
+        return classification, round(confidence, 4)
+    
+    def load(self, db, limit: int = 100000):
+        """
+        Warm the history from recently processed emails
+        
+        Only classifier and manual review outcomes are read, as in live
+        recording; emails classified from the history itself would keep a
+        sender's record alive without the classifier ever re-checking it.
+        
+        Args:
+            db: Database session
+            limit: Maximum number of emails to read
+        """
+        from app.backend.ai.classifier import LEARNING_SOURCES
+        from app.models.models import Email
+        
+        rows = (
+            db.query(Email.sender, Email.classification, Email.confidence_score,
+                     Email.classification_source, Email.processed_at)
+            .filter(
+                Email.status == "processed",
+                Email.classification.isnot(None),
+                Email.classification_source.in_(LEARNING_SOURCES),
+                Email.processed_at.isnot(None)
+            )
+            .order_by(Email.processed_at.desc())
+            .limit(limit)
+            .all()
+        )
+        
+        # Replay oldest first so each sender's deque keeps its most recent window
+        for sender, classification, confidence, source, processed_at in reversed(rows):
+            # Manual classifications are recorded as certain, as in the review route
+            self.record(sender, classification, 1.0 if source == "manual" else confidence, processed_at)
+        
+        self.loaded = True
+        self.logger.info(f"Loaded sender history from {len(rows)} emails ({len(self._senders)} senders)")
@@ -9,6 +9,8 @@ from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import logging
 import os
+import json
+import threading
 from typing import Dict, List, Optional, Tuple
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
@@ -16,7 +18,7 @@ from google.auth.transport.requests import Request
 from googleapiclient.discovery import build
 import base64
 
-from app.config.settings import EMAIL_SETTINGS, GMAIL_API
+from app.config.settings import EMAIL_SETTINGS, GMAIL_API, RAW_ARCHIVE
 
 logger = logging.getLogger(__name__)
 
@@ -85,6 +87,7 @@ class ImapSmtpHandler(EmailHandler):
             
             raw_email = data[0][1]
             email_data = self.parse_email(raw_email)
+            email_data['raw'] = raw_email  # Original bytes for the raw message archive
             emails.append(email_data)
             
             # Mark as read
@@ -137,9 +140,14 @@ class ImapSmtpHandler(EmailHandler):
             'subject': msg.get('Subject', ''),
             'date': msg.get('Date', ''),
             'body': '',
-            'attachments': []
+            'attachments': [],
+            'headers': {}
         }
         
+        # Keep headers (first occurrence, lowercased names) for prefiltering
+        for name, value in msg.items():
+            email_data['headers'].setdefault(name.lower(), str(value))
+        
         # Extract body and attachments
         if msg.is_multipart():
             for part in msg.walk():
@@ -178,6 +186,8 @@ class GmailApiHandler(EmailHandler):
         self.token_file = GMAIL_API["token_file"]
         self.scopes = GMAIL_API["scopes"]
         self.service = self._get_gmail_service()
+        # The Gmail client's HTTP transport is not thread-safe
+        self._service_lock = threading.Lock()
     
     def _get_gmail_service(self):
         """Get authenticated Gmail API service"""
@@ -225,6 +235,8 @@ class GmailApiHandler(EmailHandler):
                 ).execute()
                 
                 email_data = self._parse_gmail_message(msg)
+                if RAW_ARCHIVE["enabled"]:
+                    email_data['raw'] = self._get_raw_message(message['id'])
                 emails.append(email_data)
                 
                 # Mark as read
@@ -259,10 +271,11 @@ class GmailApiHandler(EmailHandler):
             encoded_message = base64.urlsafe_b64encode(message.as_bytes()).decode()
             
             # Send message
-            self.service.users().messages().send(
-                userId='me',
-                body={'raw': encoded_message}
-            ).execute()
+            with self._service_lock:
+                self.service.users().messages().send(
+                    userId='me',
+                    body={'raw': encoded_message}
+                ).execute()
             
             self.logger.info(f"Email forwarded to {destination}")
             return True
@@ -270,6 +283,15 @@ class GmailApiHandler(EmailHandler):
             self.logger.error(f"Failed to forward email: {str(e)}")
             return False
     
+    def _get_raw_message(self, message_id: str) -> bytes:
+        """Fetch the original RFC822 bytes of a Gmail message"""
+        raw = self.service.users().messages().get(
+            userId='me',
+            id=message_id,
+            format='raw'
+        ).execute()
+        return base64.urlsafe_b64decode(raw['raw'])
+    
     def _parse_gmail_message(self, msg) -> Dict:
         """Parse Gmail API message into structured format"""
         headers = msg['payload']['headers']
@@ -282,11 +304,13 @@ class GmailApiHandler(EmailHandler):
             'recipient': '',
             'subject': '',
             'body': '',
-            'attachments': []
+            'attachments': [],
+            'headers': {}
         }
         
         for header in headers:
             name = header['name'].lower()
+            email_data['headers'].setdefault(name, header['value'])
             if name == 'from':
                 email_data['sender'] = header['value']
             elif name == 'to':
@@ -0,0 +1,238 @@
+"""
+Single-flight mailbox poller with leader election for Smart Inbox Application
+"""
+
+import datetime
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+from typing import Callable, Optional
+
+from sqlalchemy import text
+
+from app.config.settings import EMAIL_SETTINGS, POLLER
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+def default_lock_dir(engine) -> str:
+    """
+    Get the directory for SQLite mailbox lock files
+    
+    Lock files go next to the database file, resolved the way SQLite resolves
+    it, so every process using the database contends for the same lock
+    whatever its working directory.
+    
+    Args:
+        engine: SQLAlchemy engine
+        
+    Returns:
+        Absolute directory path
+    """
+    if POLLER["lock_dir"]:
+        return os.path.abspath(POLLER["lock_dir"])
+    database = engine.url.database
+    if not database or database == ":memory:" or database.startswith("file:"):
+        return tempfile.gettempdir()
+    return os.path.dirname(os.path.abspath(database))
+
+class MailboxLock:
+    """
+    Cross-process lock electing the one process that polls a mailbox
+    
+    On PostgreSQL this is a session-level advisory lock held on a dedicated
+    connection; on SQLite it is an exclusive file lock next to the database.
+    Both are released by the server or OS when the holding process dies, so
+    another process takes over on its next election attempt.
+    """
+    
+    def __init__(self, engine, mailbox: str, lock_dir: Optional[str] = None):
+        self.logger = logging.getLogger(__name__)
+        self.engine = engine
+        self.mailbox = mailbox
+        self.key = int.from_bytes(hashlib.sha1(mailbox.encode()).digest()[:8], "big", signed=True)
+        slug = re.sub(r"[^a-zA-Z0-9]+", "_", mailbox).strip("_") or "mailbox"
+        self.lock_path = os.path.join(lock_dir or default_lock_dir(engine), f"mailbox_{slug}.lock")
+        self._connection = None
+        self._file = None
+        self._guard = threading.RLock()
+    
+    @property
+    def held(self) -> bool:
+        return self._connection is not None or self._file is not None
+    
+    def acquire(self) -> bool:
+        """
+        Try to take the lock without blocking
+        
+        Returns:
+            True if this process now holds the lock
+        """
+        with self._guard:
+            if self.held:
+                return True
+            try:
+                if self.engine.dialect.name == "postgresql":
+                    return self._acquire_advisory()
+                return self._acquire_file()
+            except Exception as e:
+                self.logger.error(f"Failed to acquire mailbox lock for {self.mailbox}: {str(e)}")
+                self.release()
+                return False
+    
+    def _acquire_advisory(self) -> bool:
+        connection = self.engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+        acquired = connection.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": self.key}).scalar()
+        if acquired:
+            self._connection = connection
+        else:
+            connection.close()
+        return bool(acquired)
+    
+    def _acquire_file(self) -> bool:
+        directory = os.path.dirname(self.lock_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        lock_file = open(self.lock_path, "a")
+        if fcntl is None:
+            # No file locking available: assume a single-process deployment
+            self._file = lock_file
+            return True
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._file = lock_file
+        return True
+    
+    def check(self) -> bool:
+        """
+        Verify the lock is still held, dropping it if its connection was lost
+        
+        Returns:
+            True if this process still holds the lock
+        """
+        with self._guard:
+            if self._connection is not None:
+                try:
+                    self._connection.execute(text("SELECT 1"))
+                except Exception as e:
+                    self.logger.warning(f"Lost mailbox lock connection for {self.mailbox}: {str(e)}")
+                    self.release()
+            return self.held
+    
+    def release(self):
+        """Release the lock if held"""
+        with self._guard:
+            if self._connection is not None:
+                try:
+                    self._connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": self.key})
+                    self._connection.close()
+                except Exception:
+                    pass
+                self._connection = None
+            if self._file is not None:
+                try:
+                    if fcntl is not None:
+                        fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+                finally:
+                    self._file.close()
+                self._file = None
+
+
+class MailboxPoller:
+    """
+    Background poller fetching a mailbox from exactly one process at a time
+    
+    Every process runs the poller thread, but only the process holding the
+    mailbox lock syncs; the others retry the election periodically. Triggers
+    received while a sync is running coalesce into a single follow-up sync.
+    """
+    
+    def __init__(self, session_factory, engine, sync: Callable, mailbox: Optional[str] = None,
+                 interval: Optional[float] = None, lock: Optional[MailboxLock] = None):
+        self.logger = logging.getLogger(__name__)
+        self.session_factory = session_factory
+        self.sync = sync
+        self.mailbox = mailbox or EMAIL_SETTINGS["central_inbox"]
+        self.interval = interval if interval is not None else EMAIL_SETTINGS["check_interval"]
+        self.election_interval = POLLER["election_interval"]
+        self.lock = lock or MailboxLock(engine, self.mailbox)
+        self.syncing = False
+        self.last_sync = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+    
+    @property
+    def is_leader(self) -> bool:
+        return self.lock.held
+    
+    def start(self):
+        """Start the poller thread if it is not running"""
+        with self._start_lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run, name="mailbox-poller", daemon=True)
+            self._thread.start()
+    
+    def stop(self, timeout: Optional[float] = None):
+        """Stop the poller thread and give up leadership"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self.lock.release()
+    
+    def trigger(self) -> str:
+        """
+        Request a sync without starting a concurrent one
+        
+        Returns:
+            "started" if the sync starts now, "coalesced" if it will follow the
+            running sync, or "leader_elsewhere" if another process polls the mailbox
+        """
+        self.start()
+        if not self.is_leader and not self.lock.acquire():
+            return "leader_elsewhere"
+        
+        status = "coalesced" if self.syncing or self._wake.is_set() else "started"
+        self._wake.set()
+        return status
+    
+    def run(self):
+        """Poller loop: hold or contend for leadership and sync while leader"""
+        self.logger.info(f"Mailbox poller started for {self.mailbox}")
+        while not self._stop.is_set():
+            if not self.lock.check() and not self.lock.acquire():
+                self._wake.wait(self.election_interval)
+                continue
+            
+            # Clear before syncing so triggers arriving mid-sync cause one rerun
+            self._wake.clear()
+            self.run_sync()
+            self._wake.wait(self.interval)
+        self.logger.info(f"Mailbox poller stopped for {self.mailbox}")
+    
+    def run_sync(self):
+        """Run one sync with a fresh database session"""
+        self.syncing = True
+        db = self.session_factory()
+        try:
+            self.sync(db)
+        except Exception as e:
+            self.logger.error(f"Mailbox sync failed for {self.mailbox}: {str(e)}")
+        finally:
+            db.close()
+            self.syncing = False
+            self.last_sync = datetime.datetime.utcnow()
@@ -0,0 +1,94 @@
+"""
+Header-based prefilter for automated and bulk mail
+"""
+
+import logging
+from typing import Dict, Optional, Tuple
+
+from app.config.settings import PREFILTER
+from app.utils.helpers import extract_email_address
+
+logger = logging.getLogger(__name__)
+
+class EmailPrefilter:
+    """Detects bounces, auto-replies and list/bulk mail before classification"""
+    
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self.enabled = PREFILTER["enabled"]
+        self.handling = PREFILTER["handling"]
+        self.bounce_senders = [s.lower() for s in PREFILTER["bounce_senders"]]
+    
+    def check(self, email_data: Dict) -> Optional[Dict]:
+        """
+        Check email headers for automated or bulk mail
+        
+        Args:
+            email_data: Email data dictionary with a 'headers' mapping
+        
+        Returns:
+            Dict with category, reason and handling, or None if the email
+            should go through the normal pipeline
+        """
+        if not self.enabled:
+            return None
+        
+        match = self.detect(email_data)
+        if not match:
+            return None
+        
+        category, reason = match
+        handling = self.handling.get(category, "filter")
+        self.logger.info(f"Prefilter matched '{category}' ({reason}), handling: {handling}")
+        return {
+            "category": category,
+            "reason": reason,
+            "handling": handling
+        }
+    
+    def detect(self, email_data: Dict) -> Optional[Tuple[str, str]]:
+        """
+        Detect the automated-mail category of an email
+        
+        Args:
+            email_data: Email data dictionary with a 'headers' mapping
+        
+        Returns:
+            Tuple of (category, reason) or None if nothing matched
+        """
+        headers = email_data.get('headers') or {}
+        content_type = headers.get('content-type', '').lower()
+        sender = extract_email_address(email_data.get('sender', ''))
+        
+        # Delivery status notifications (RFC 3464) and bounce senders
+        if 'multipart/report' in content_type and 'delivery-status' in content_type:
+            return "bounce", "delivery status notification"
+        if 'x-failed-recipients' in headers:
+            return "bounce", "X-Failed-Recipients header"
+        if sender.split('@')[0] in self.bounce_senders:
+            return "bounce", f"sender {sender}"
+        
+        # Auto-replies (RFC 3834) and vendor-specific markers
+        auto_submitted = headers.get('auto-submitted', '').strip().lower()
+        if auto_submitted and auto_submitted != 'no':
+            return "auto_reply", f"Auto-Submitted: {auto_submitted}"
+        if 'x-autoreply' in headers or 'x-autorespond' in headers:
+            return "auto_reply", "X-Autoreply header"
+        if 'multipart/report' in content_type and 'disposition-notification' in content_type:
+            return "auto_reply", "read receipt"
+        
+        precedence = headers.get('precedence', '').strip().lower()
+        if precedence == 'auto_reply':
+            return "auto_reply", "Precedence: auto_reply"
+        
+        # Mailing lists and bulk senders
+        if 'list-id' in headers:
+            return "mailing_list", f"List-Id: {headers['list-id']}"
+        if precedence == 'list':
+            return "mailing_list", "Precedence: list"
+        if precedence in ('bulk', 'junk'):
+            return "bulk", f"Precedence: {precedence}"
+        if 'list-unsubscribe' in headers:
+            return "bulk", "List-Unsubscribe header"
+        
+        return None
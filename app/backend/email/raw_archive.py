@@ -0,0 +1,249 @@
+"""
+Raw message archive for Smart Inbox Application
+
+The original RFC822 bytes of every fetched email are kept in append-only,
+compressed segment files so messages can be re-parsed or reprocessed
+offline after the mailbox has marked them read. An append-only offset
+index maps Email.id to its record; reads memory-map the segment and
+decompress just that record.
+
+Layout of the archive directory:
+    segment-000001.seg  records of (header, compressed message)
+    index.bin           fixed-size entries of (email_id, segment, offset, length)
+"""
+
+import glob
+import logging
+import mmap
+import os
+import re
+import struct
+import threading
+import zlib
+from typing import Dict, Iterable, Optional, Tuple
+
+from app.config.settings import RAW_ARCHIVE
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# email_id, codec, compressed length, CRC32 of the raw message
+RECORD_HEADER = struct.Struct("<QBII")
+# email_id, segment number, payload offset, compressed length
+INDEX_ENTRY = struct.Struct("<QIQI")
+
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+
+SEGMENT_PATTERN = re.compile(r"^segment-(\d+)\.seg$")
+
+class RawMessageArchive:
+    """Append-only store of compressed raw messages keyed by email ID"""
+    
+    def __init__(self, directory: Optional[str] = None, segment_size: Optional[int] = None,
+                 enabled: Optional[bool] = None):
+        """
+        Initialize the archive; files are created on the first append
+        
+        Args:
+            directory: Archive directory
+            segment_size: Size in bytes after which a new segment is started
+            enabled: Store messages; when False appends are ignored
+        """
+        self.directory = directory or RAW_ARCHIVE["directory"]
+        self.segment_size = segment_size or RAW_ARCHIVE["segment_size"]
+        self.enabled = RAW_ARCHIVE["enabled"] if enabled is None else enabled
+        self.codec = CODEC_ZSTD if zstandard is not None and RAW_ARCHIVE["codec"] == "zstd" else CODEC_ZLIB
+        self.index: Dict[int, Tuple[int, int, int]] = {}
+        self._index_position = 0
+        self._maps: Dict[int, Tuple[object, mmap.mmap]] = {}
+        self._lock = threading.RLock()
+    
+    @property
+    def index_path(self) -> str:
+        return os.path.join(self.directory, "index.bin")
+    
+    def segment_path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"segment-{segment:06d}.seg")
+    
+    def compress(self, raw: bytes) -> bytes:
+        if self.codec == CODEC_ZSTD:
+            return zstandard.ZstdCompressor(level=RAW_ARCHIVE["compression_level"]).compress(raw)
+        return zlib.compress(raw, RAW_ARCHIVE["compression_level"])
+    
+    @staticmethod
+    def decompress(codec: int, payload: bytes) -> bytes:
+        if codec == CODEC_ZSTD:
+            if zstandard is None:
+                raise RuntimeError("zstandard is required to read this archive record")
+            return zstandard.ZstdDecompressor().decompress(payload)
+        return zlib.decompress(payload)
+    
+    def append_many(self, messages: Iterable[Tuple[int, bytes]]) -> int:
+        """
+        Append raw messages
+        
+        Messages are compressed outside the lock, then written to the
+        current segment and indexed under an exclusive file lock shared
+        with other processes using the same directory.
+        
+        Args:
+            messages: (email ID, raw RFC822 bytes) pairs
+            
+        Returns:
+            Number of messages stored
+        """
+        if not self.enabled:
+            return 0
+        records = [
+            (email_id, self.compress(raw), zlib.crc32(raw))
+            for email_id, raw in messages
+            if raw is not None
+        ]
+        if not records:
+            return 0
+        
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock, open(os.path.join(self.directory, "archive.lock"), "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                segment = self.current_segment()
+                entries = []
+                with open(self.segment_path(segment), "ab") as segment_file:
+                    offset = segment_file.tell()
+                    for email_id, payload, crc in records:
+                        segment_file.write(RECORD_HEADER.pack(email_id, self.codec, len(payload), crc))
+                        segment_file.write(payload)
+                        offset += RECORD_HEADER.size
+                        entries.append((email_id, segment, offset, len(payload)))
+                        offset += len(payload)
+                    self.sync(segment_file)
+                
+                with open(self.index_path, "ab") as index_file:
+                    # Drop a torn entry left by a crash so entries stay aligned
+                    size = index_file.tell()
+                    if size % INDEX_ENTRY.size:
+                        index_file.truncate(size - size % INDEX_ENTRY.size)
+                    for entry in entries:
+                        index_file.write(INDEX_ENTRY.pack(*entry))
+                    self.sync(index_file)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+        
+        self.refresh()
+        return len(records)
+    
+    def append(self, email_id: int, raw: bytes) -> int:
+        """Append one raw message"""
+        return self.append_many([(email_id, raw)])
+    
+    @staticmethod
+    def sync(file):
+        file.flush()
+        if RAW_ARCHIVE["fsync"]:
+            os.fsync(file.fileno())
+    
+    def current_segment(self) -> int:
+        """Number of the segment to append to, starting a new one when the last is full"""
+        segments = [
+            int(match.group(1))
+            for match in (SEGMENT_PATTERN.match(os.path.basename(path))
+                          for path in glob.glob(os.path.join(self.directory, "segment-*.seg")))
+            if match
+        ]
+        if not segments:
+            return 1
+        last = max(segments)
+        if os.path.getsize(self.segment_path(last)) >= self.segment_size:
+            return last + 1
+        return last
+    
+    def refresh(self):
+        """Read index entries appended since the last refresh, by this or another process"""
+        with self._lock:
+            if not os.path.exists(self.index_path):
+                return
+            with open(self.index_path, "rb") as index_file:
+                index_file.seek(self._index_position)
+                data = index_file.read()
+            usable = len(data) - len(data) % INDEX_ENTRY.size
+            for email_id, segment, offset, length in INDEX_ENTRY.iter_unpack(data[:usable]):
+                # A message archived again (e.g. re-fetched) supersedes the earlier record
+                self.index[email_id] = (segment, offset, length)
+            self._index_position += usable
+    
+    def locate(self, email_id: int) -> Optional[Tuple[int, int, int]]:
+        """Find a message's (segment, offset, length), reading new index entries on a miss"""
+        entry = self.index.get(email_id)
+        if entry is None:
+            self.refresh()
+            entry = self.index.get(email_id)
+        return entry
+    
+    def __contains__(self, email_id: int) -> bool:
+        return self.locate(email_id) is not None
+    
+    def segment_map(self, segment: int, end: int) -> mmap.mmap:
+        """Memory map of a segment covering at least `end` bytes, remapped when the segment grew"""
+        with self._lock:
+            cached = self._maps.get(segment)
+            if cached is None or len(cached[1]) < end:
+                if cached is not None:
+                    cached[1].close()
+                    cached[0].close()
+                segment_file = open(self.segment_path(segment), "rb")
+                cached = (segment_file, mmap.mmap(segment_file.fileno(), 0, access=mmap.ACCESS_READ))
+                self._maps[segment] = cached
+            return cached[1]
+    
+    def get(self, email_id: int) -> Optional[bytes]:
+        """
+        Read a raw message
+        
+        Args:
+            email_id: Email ID
+            
+        Returns:
+            Raw RFC822 bytes, or None if the message was not archived
+            
+        Raises:
+            ValueError: If the record is corrupt
+        """
+        entry = self.locate(email_id)
+        if entry is None:
+            return None
+        segment, offset, length = entry
+        with self._lock:
+            segment_map = self.segment_map(segment, offset + length)
+            header = RECORD_HEADER.unpack_from(segment_map, offset - RECORD_HEADER.size)
+            payload = segment_map[offset:offset + length]
+        
+        stored_id, codec, stored_length, crc = header
+        if stored_id != email_id or stored_length != length:
+            raise ValueError(f"Raw archive index does not match the record for email {email_id}")
+        raw = self.decompress(codec, payload)
+        if zlib.crc32(raw) != crc:
+            raise ValueError(f"Raw archive record for email {email_id} is corrupt")
+        return raw
+    
+    def close(self):
+        """Release memory maps and open segment files"""
+        with self._lock:
+            for segment_file, segment_map in self._maps.values():
+                segment_map.close()
+                segment_file.close()
+            self._maps = {}
+
+# Process-wide archive
+raw_archive = RawMessageArchive()
@@ -4,7 +4,9 @@ GitHub integration module for Smart Inbox Application
 
 import logging
 import os
-from typing import Dict, Optional
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
 from github import Github, GithubException
 
 from app.config.settings import GITHUB_API
@@ -20,6 +22,88 @@ class GitHubHandler:
         self.default_repo = GITHUB_API["default_repo"]
         self.issue_labels = GITHUB_API["issue_labels"]
         self.github = Github(self.access_token)
+        self.repo_cache_ttl = GITHUB_API["repo_cache_ttl"]
+        self.label_color = GITHUB_API["label_color"]
+        self._repos: Dict[str, Tuple[object, float]] = {}  # 'owner/repo' -> (repository, fetched at)
+        self._labels: Dict[str, Set[str]] = {}  # 'owner/repo' -> lowercased names of labels known to exist
+        self._cache_lock = threading.Lock()
+    
+    def get_repository(self, repo_name: str):
+        """
+        Get a repository, reusing the handle fetched within the last repo_cache_ttl seconds
+        
+        Args:
+            repo_name: Repository in format 'owner/repo'
+            
+        Returns:
+            PyGithub Repository object
+        """
+        key = repo_name.lower()
+        with self._cache_lock:
+            cached = self._repos.get(key)
+            if cached and time.monotonic() - cached[1] < self.repo_cache_ttl:
+                return cached[0]
+        
+        repo = self.github.get_repo(repo_name)
+        with self._cache_lock:
+            self._repos[key] = (repo, time.monotonic())
+            # Labels are checked again along with the repository
+            self._labels.pop(key, None)
+        return repo
+    
+    def invalidate_repository(self, repo_name: str):
+        """Drop the cached handle and labels of a repository, e.g. after an API error"""
+        key = repo_name.lower()
+        with self._cache_lock:
+            self._repos.pop(key, None)
+            self._labels.pop(key, None)
+    
+    def ensure_labels(self, repo_name: str, repo, labels: List[str]) -> List[str]:
+        """
+        Make sure labels exist in a repository, creating missing ones once
+        
+        The repository's labels are listed on first use and cached with its
+        handle, so in the steady state this makes no API call. A label that
+        cannot be created is left off the issue rather than failing it.
+        
+        Args:
+            repo_name: Repository in format 'owner/repo'
+            repo: PyGithub Repository object
+            labels: Label names to apply
+            
+        Returns:
+            The labels that exist in the repository
+        """
+        key = repo_name.lower()
+        with self._cache_lock:
+            known = self._labels.get(key)
+        if known is None:
+            try:
+                known = {label.name.lower() for label in repo.get_labels()}
+            except GithubException as e:
+                self.logger.warning(f"Could not list labels of {repo_name}: {str(e)}")
+                return list(labels)
+        else:
+            known = set(known)
+        
+        for name in labels:
+            if name.lower() in known:
+                continue
+            try:
+                repo.create_label(name, self.label_color)
+                self.logger.info(f"Created label '{name}' in {repo_name}")
+                known.add(name.lower())
+            except GithubException as e:
+                if e.status == 422:
+                    # Created concurrently by someone else
+                    known.add(name.lower())
+                else:
+                    self.logger.warning(f"Could not create label '{name}' in {repo_name}: {str(e)}")
+        
+        with self._cache_lock:
+            if key in self._repos:
+                self._labels[key] = known
+        return [name for name in labels if name.lower() in known]
     
     def create_issue(self, 
                      title: str, 
@@ -41,10 +125,10 @@ class GitHubHandler:
         try:
             # Use provided repository or default
             repo_name = repository or self.default_repo
-            repo = self.github.get_repo(repo_name)
+            repo = self.get_repository(repo_name)
             
-            # Use provided labels or default
-            issue_labels = labels or self.issue_labels
+            # Use provided labels or default, keeping only those the repository has
+            issue_labels = self.ensure_labels(repo_name, repo, labels or self.issue_labels)
             
             # Create issue
             issue = repo.create_issue(
@@ -63,6 +147,9 @@ class GitHubHandler:
             }
         except GithubException as e:
             self.logger.error(f"GitHub API error: {str(e)}")
+            if e.status in (401, 404, 410):
+                # The repository was renamed, deleted or became inaccessible
+                self.invalidate_repository(repository or self.default_repo)
             return {
                 "success": False,
                 "error": str(e),
@@ -75,6 +162,46 @@ class GitHubHandler:
                 "error": str(e)
             }
     
+    def add_issue_comment(self, repository: str, issue_number: int, body: str) -> Dict:
+        """
+        Add a comment to a GitHub issue
+        
+        Args:
+            repository: Repository in format 'owner/repo'
+            issue_number: Issue number
+            body: Comment body
+            
+        Returns:
+            Dict containing comment details or error information
+        """
+        try:
+            repo = self.get_repository(repository)
+            comment = repo.get_issue(issue_number).create_comment(body)
+            
+            self.logger.info(f"Commented on GitHub issue #{issue_number} in {repository}")
+            
+            return {
+                "success": True,
+                "issue_number": issue_number,
+                "comment_url": comment.html_url,
+                "repository": repository
+            }
+        except GithubException as e:
+            self.logger.error(f"GitHub API error: {str(e)}")
+            if e.status in (401, 404, 410):
+                self.invalidate_repository(repository)
+            return {
+                "success": False,
+                "error": str(e),
+                "status_code": e.status
+            }
+        except Exception as e:
+            self.logger.error(f"Unexpected error commenting on GitHub issue: {str(e)}")
+            return {
+                "success": False,
+                "error": str(e)
+            }
+    
     def format_issue_from_email(self, email_data: Dict, client_name: str) -> Dict:
         """
         Format email data into GitHub issue format
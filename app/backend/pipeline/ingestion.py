@@ -0,0 +1,753 @@
+"""
+Staged email ingestion pipeline for Smart Inbox Application
+"""
+
+import datetime
+import logging
+import random
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import partial
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import undefer_group
+
+from app.config.settings import PIPELINE, RETRY
+from app.backend.email.raw_archive import RawMessageArchive
+from app.backend.pipeline.lanes import LaneScheduler
+from app.models.models import Email, Client, Log
+from app.utils.log_sink import LogSink
+
+logger = logging.getLogger(__name__)
+
+# Bound on IN-list size, below SQLite's host parameter limit
+IN_CLAUSE_CHUNK = 500
+
+class IngestionPipeline:
+    """Pipeline running identify → classify → route → persist with bounded concurrency per stage"""
+    
+    def __init__(self, routing_engine, prefilter, log_sink: Optional[LogSink] = None,
+                 raw_archive: Optional[RawMessageArchive] = None):
+        self.logger = logging.getLogger(__name__)
+        self.routing_engine = routing_engine
+        self.prefilter = prefilter
+        self.log_sink = log_sink  # Without a sink log rows join the email's transaction
+        self.raw_archive = raw_archive  # Without an archive raw messages are not kept
+        classify_workers = PIPELINE["classify_workers"]
+        route_workers = PIPELINE["route_workers"]
+        self.persist_batch_size = PIPELINE["persist_batch_size"]
+        self.classify_slots = threading.BoundedSemaphore(classify_workers)
+        self.route_slots = threading.BoundedSemaphore(route_workers)
+        self.max_in_flight = classify_workers + route_workers
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.max_in_flight,
+            thread_name_prefix="ingestion"
+        )
+        self.schedulers = set()  # Lane schedulers of running execute() calls
+        self._schedulers_lock = threading.Lock()
+    
+    def run(self, db, emails: List[Dict]) -> Dict:
+        """
+        Run fetched emails through the pipeline
+        
+        The database session is only used on the calling thread; classification
+        and routing run on worker threads with plain dict snapshots.
+        
+        Args:
+            db: Database session
+            emails: Parsed email data dictionaries
+            
+        Returns:
+            Dict with counts per outcome
+        """
+        work, summary = self.prepare(db, emails)
+        summary.update(self.execute(db, work))
+        
+        self.logger.info(f"Ingestion finished: {summary}")
+        return summary
+    
+    def prepare(self, db, emails: List[Dict]) -> Tuple[List[Dict], Dict]:
+        """
+        Store, prefilter and identify fetched emails
+        
+        Args:
+            db: Database session
+            emails: Parsed email data dictionaries
+            
+        Returns:
+            Tuple of (work items for classification and routing, summary counts)
+        """
+        summary = {"received": len(emails), "new": 0, "filtered": 0, "unidentified": 0}
+        
+        # Persist new emails so every message is recorded before any network call
+        records = self.store_new_emails(db, emails)
+        summary["new"] = len(records)
+        
+        work, counts = self.identify(db, records)
+        summary.update(counts)
+        
+        return work, summary
+    
+    def identify(self, db, records: List[Tuple[Email, Dict]]) -> Tuple[List[Dict], Dict]:
+        """
+        Prefilter stored emails and match them to clients
+        
+        Args:
+            db: Database session
+            records: List of (Email, email_data)
+            
+        Returns:
+            Tuple of (work items for classification and routing, filtered and unidentified counts)
+        """
+        summary = {"filtered": 0, "unidentified": 0}
+        
+        # Identify: prefilter and client matching are cheap and run inline
+        clients = db.query(Client).all()
+        work = []
+        updates = []
+        for email, email_data in records:
+            prefilter_result = self.prefilter.check(email_data)
+            if prefilter_result and prefilter_result["handling"] != "process":
+                updates.append(partial(apply_prefilter_result, email, prefilter_result, db, self.log_sink))
+                summary["filtered"] += 1
+                continue
+            
+            client = match_client(email_data, clients)
+            if not client:
+                updates.append(partial(mark_unidentified, email, db, self.log_sink))
+                summary["unidentified"] += 1
+                continue
+            
+            email.client_id = client.id
+            work.append({
+                "email": email,
+                "email_data": email_snapshot(email, email_data),
+                "client_data": client_snapshot(client),
+                "thread": thread_key(email_data)
+            })
+        commit_batch(db, updates)
+        
+        return work, summary
+    
+    def load_stored_records(self, db, email_ids: List[int]) -> List[Tuple[Email, Dict]]:
+        """
+        Rebuild (Email, email_data) records of stored emails for identify()
+        
+        Headers are not stored, so each email forms its own conversation.
+        
+        Args:
+            db: Database session
+            email_ids: Email IDs
+            
+        Returns:
+            List of (Email, email_data) in the order of email_ids
+        """
+        emails = load_emails(db, email_ids)
+        return [
+            (emails[email_id], {
+                "message_id": emails[email_id].message_id,
+                "sender": emails[email_id].sender,
+                "recipient": emails[email_id].recipient,
+                "subject": emails[email_id].subject,
+                "body": emails[email_id].body,
+                "attachments": emails[email_id].attachments or [],
+                "date": str(emails[email_id].received_at),
+                "headers": {}
+            })
+            for email_id in email_ids if email_id in emails
+        ]
+    
+    def execute(self, db, work: List[Dict]) -> Dict:
+        """
+        Classify and route work items concurrently and persist the results
+        
+        Conversations are handed to the workers one at a time, as workers
+        free up, in the order chosen by a LaneScheduler, so higher priority
+        clients are served first however long the backlog is.
+        
+        Args:
+            db: Database session
+            work: Work items from prepare() or load_work_items()
+            
+        Returns:
+            Dict with processed and error counts
+        """
+        summary = {"processed": 0, "errors": 0}
+        
+        # Emails of one conversation stay in order; results are persisted in batches
+        scheduler = LaneScheduler()
+        for items in group_by_thread(work):
+            scheduler.push(items)
+        with self._schedulers_lock:
+            self.schedulers.add(scheduler)
+        
+        results = []
+        running = {}
+        try:
+            while len(scheduler) or running:
+                while len(running) < self.max_in_flight:
+                    entry = scheduler.pop()
+                    if entry is None:
+                        break
+                    running[self.executor.submit(self.process_thread, entry[1])] = entry
+                
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    scheduler.done(*running.pop(future))
+                    for item, result in future.result():
+                        results.append((item, result))
+                        summary["processed" if result.get("success") else "errors"] += 1
+                if len(results) >= self.persist_batch_size:
+                    self.persist_results(db, results)
+                    results = []
+        finally:
+            with self._schedulers_lock:
+                self.schedulers.discard(scheduler)
+        self.persist_results(db, results)
+        
+        return summary
+    
+    def lane_depths(self) -> Dict[str, Dict[str, int]]:
+        """
+        Get the conversations queued and in flight per priority lane
+        
+        Returns:
+            Lane name -> counts summed over running execute() calls
+        """
+        depths = {name: {"queued": 0, "in_flight": 0} for name in PIPELINE["lanes"]}
+        with self._schedulers_lock:
+            schedulers = list(self.schedulers)
+        for scheduler in schedulers:
+            for name, counts in scheduler.depths().items():
+                depths[name]["queued"] += counts["queued"]
+                depths[name]["in_flight"] += counts["in_flight"]
+        return depths
+    
+    def persist_results(self, db, results: List[Tuple[Dict, Dict]]):
+        """
+        Apply a batch of processing results in one transaction
+        
+        Args:
+            db: Database session
+            results: List of (work item, result)
+        """
+        if not results:
+            return
+        load_emails(db, [item["email_data"]["id"] for item, _ in results])
+        commit_batch(db, [partial(apply_processing_result, item["email"], result, db, self.log_sink) for item, result in results])
+    
+    def load_work_items(self, db, threads: List[List[int]]) -> List[Dict]:
+        """
+        Rebuild work items for stored, identified emails
+        
+        Args:
+            db: Database session
+            threads: Email IDs grouped by conversation, in processing order
+            
+        Returns:
+            Work items for emails still awaiting classification
+        """
+        email_ids = [email_id for thread in threads for email_id in thread]
+        emails = load_emails(db, email_ids)
+        client_ids = {e.client_id for e in emails.values() if e.client_id}
+        clients = {c.id: c for c in db.query(Client).filter(Client.id.in_(client_ids)).all()}
+        
+        work = []
+        for thread in threads:
+            for email_id in thread:
+                email = emails.get(email_id)
+                # Skip emails already handled, e.g. by an earlier attempt of the same job
+                if not email or email.status != "pending" or email.routing_action or email.client_id not in clients:
+                    continue
+                work.append({
+                    "email": email,
+                    "email_data": email_snapshot(email, {"date": str(email.received_at)}),
+                    "client_data": client_snapshot(clients[email.client_id]),
+                    "thread": thread[0]
+                })
+        
+        return work
+    
+    def store_new_emails(self, db, emails: List[Dict]) -> List[Tuple[Email, Dict]]:
+        """
+        Insert emails that are not stored yet in a single transaction
+        
+        Args:
+            db: Database session
+            emails: Parsed email data dictionaries
+            
+        Returns:
+            List of (Email, email_data) for newly stored emails
+        """
+        # Drop duplicates within the batch, then check the rest with IN queries
+        fetched = OrderedDict()
+        for email_data in emails:
+            fetched.setdefault(email_data["message_id"], email_data)
+        message_ids = list(fetched)
+        existing = set()
+        for start in range(0, len(message_ids), IN_CLAUSE_CHUNK):
+            chunk = message_ids[start:start + IN_CLAUSE_CHUNK]
+            existing.update(
+                message_id for (message_id,) in
+                db.query(Email.message_id).filter(Email.message_id.in_(chunk))
+            )
+        
+        received_at = datetime.datetime.utcnow()
+        records = [
+            (new_email_record(email_data, received_at), email_data)
+            for message_id, email_data in fetched.items()
+            if message_id not in existing
+        ]
+        if not records:
+            return []
+        
+        try:
+            db.add_all([email for email, _ in records])
+            db.flush()
+            email_ids = [email.id for email, _ in records]
+            db.commit()
+        except IntegrityError as e:
+            # Another process stored some of these emails meanwhile; insert one by one
+            db.rollback()
+            self.logger.warning(f"Batch insert of {len(records)} emails failed, retrying per email: {str(e)}")
+            records, email_ids = self.store_each(db, [email_data for _, email_data in records], received_at)
+        
+        # Committing expired the records; reload them together rather than row by row
+        load_emails(db, email_ids)
+        self.archive_raw_messages(records)
+        return records
+    
+    def archive_raw_messages(self, records: List[Tuple[Email, Dict]]):
+        """
+        Keep the original bytes of newly stored emails, keyed by email ID
+        
+        Args:
+            records: List of (Email, email_data) for newly stored emails
+        """
+        if self.raw_archive is None:
+            return
+        try:
+            self.raw_archive.append_many((email.id, email_data.get("raw")) for email, email_data in records)
+        except Exception as e:
+            # The parsed email is stored; a missing raw copy only limits later reprocessing
+            self.logger.error(f"Error archiving raw messages: {str(e)}")
+    
+    def store_each(self, db, emails: List[Dict], received_at: datetime.datetime) -> Tuple[List[Tuple[Email, Dict]], List[int]]:
+        """
+        Insert emails one transaction each, skipping those already stored
+        
+        Args:
+            db: Database session
+            emails: Parsed email data dictionaries
+            received_at: Reception timestamp
+            
+        Returns:
+            Tuple of (list of (Email, email_data) for stored emails, their IDs)
+        """
+        records = []
+        email_ids = []
+        for email_data in emails:
+            email = new_email_record(email_data, received_at)
+            try:
+                db.add(email)
+                db.flush()
+                email_id = email.id
+                db.commit()
+            except IntegrityError:
+                db.rollback()
+                continue
+            records.append((email, email_data))
+            email_ids.append(email_id)
+        return records, email_ids
+    
+    def process_thread(self, items: List[Dict]) -> List[Tuple[Dict, Dict]]:
+        """
+        Classify and route the emails of one conversation in order
+        
+        Args:
+            items: Work items of a single thread
+            
+        Returns:
+            List of (item, result)
+        """
+        return [(item, self.process_item(item)) for item in items]
+    
+    def process_item(self, item: Dict) -> Dict:
+        """
+        Classify and route a single email, holding a slot of each stage in turn
+        
+        Args:
+            item: Work item with email_data and client_data snapshots, and
+                optionally a decision to route without classifying again
+            
+        Returns:
+            Dict with processing results
+        """
+        try:
+            decision = item.get("decision")
+            if decision is None:
+                with self.classify_slots:
+                    decision = self.routing_engine.decide(item["email_data"])
+            with self.route_slots:
+                return self.routing_engine.route_decision(item["email_data"], item["client_data"], decision)
+        except Exception as e:
+            self.logger.error(f"Error processing email: {str(e)}")
+            return {
+                "success": False,
+                "action": "error",
+                "message": f"Error processing email: {str(e)}"
+            }
+
+
+def new_email_record(email_data: Dict, received_at: datetime.datetime) -> Email:
+    """Build a pending Email record from parsed email data"""
+    return Email(
+        message_id=email_data["message_id"],
+        sender=email_data["sender"],
+        recipient=email_data["recipient"],
+        subject=email_data["subject"],
+        body=email_data["body"],
+        attachments=email_data.get("attachments", []),
+        received_at=received_at,
+        status="pending"
+    )
+
+def load_emails(db, email_ids: List[int]) -> Dict[int, Email]:
+    """
+    Load or refresh Email records, including their bodies, with one IN query per chunk
+    
+    Args:
+        db: Database session
+        email_ids: Email IDs
+        
+    Returns:
+        Dict mapping email ID to Email
+    """
+    emails = {}
+    for start in range(0, len(email_ids), IN_CLAUSE_CHUNK):
+        chunk = email_ids[start:start + IN_CLAUSE_CHUNK]
+        query = db.query(Email).options(undefer_group("content")).filter(Email.id.in_(chunk))
+        emails.update((email.id, email) for email in query)
+    return emails
+
+def commit_batch(db, updates: List[Callable[[], None]]):
+    """
+    Apply record updates and commit them in one transaction
+    
+    If the batch fails to commit, each update is retried in its own
+    transaction so one bad row does not lose the rest of the batch.
+    
+    Args:
+        db: Database session
+        updates: Callables applying one record's changes to the session
+    """
+    if not updates:
+        return
+    
+    try:
+        for update in updates:
+            update()
+        db.commit()
+        return
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"Batch commit of {len(updates)} updates failed, retrying per update: {str(e)}")
+    
+    for update in updates:
+        try:
+            update()
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to persist update: {str(e)}")
+
+def email_snapshot(email: Email, email_data: Dict) -> Dict:
+    """Build the email data dictionary passed to the routing engine"""
+    return {
+        "id": email.id,
+        "sender": email.sender,
+        "recipient": email.recipient,
+        "subject": email.subject,
+        "body": email.body,
+        "date": email_data.get("date", ""),
+        "attachments": email.attachments
+    }
+
+def client_snapshot(client: Client) -> Dict:
+    """Build the client data dictionary passed to the routing engine"""
+    return {
+        "id": client.id,
+        "name": client.name,
+        "priority": client.priority,
+        "github_repository": client.github_repository,
+        "technical_contact": client.technical_contact,
+        "commercial_contact": client.commercial_contact,
+        "administrative_contact": client.administrative_contact
+    }
+
+def group_by_thread(work: List[Dict]) -> List[List[Dict]]:
+    """
+    Group work items by conversation, keeping arrival order within each group
+    """
+    threads = OrderedDict()
+    for item in work:
+        threads.setdefault(item["thread"], []).append(item)
+    return list(threads.values())
+
+def thread_key(email_data: Dict) -> str:
+    """
+    Get a key shared by all emails of a conversation
+    
+    Args:
+        email_data: Email data dictionary
+        
+    Returns:
+        Root message ID from References/In-Reply-To, or the email's own message ID
+    """
+    headers = email_data.get("headers") or {}
+    references = headers.get("references", "").split()
+    if references:
+        return references[0]
+    return headers.get("in-reply-to", "").strip() or email_data.get("message_id", "")
+
+def write_log(db, log_sink: Optional[LogSink], **fields):
+    """
+    Add a log entry through the sink, or to the session without one
+    """
+    if log_sink is None:
+        db.add(Log(**fields))
+    else:
+        log_sink.write(db, **fields)
+
+def apply_processing_result(email: Email, result: Dict, db, log_sink: Optional[LogSink] = None):
+    """
+    Update an email record with the routing engine result and log it
+    """
+    email.classification = result.get("classification")
+    email.confidence_score = result.get("confidence")
+    if result.get("classification_source") != "stored":
+        # Retries route with the stored classification and keep its source
+        email.classification_source = result.get("classification_source")
+    
+    details = f"Email processed. Classification: {email.classification}, Action: {result.get('action')}"
+    details += apply_routing_result(email, result)
+    
+    # Add log entry
+    write_log(
+        db,
+        log_sink,
+        email_id=email.id,
+        action="processing",
+        details=details,
+        status="success" if result.get("success") else "failure",
+        error=result.get("message") if not result.get("success") else None
+    )
+
+def apply_routing_result(email: Email, result: Dict) -> str:
+    """
+    Set the action, status and retry schedule of an email from a routing result
+    
+    Deferred and digest emails are left for the retry scheduler to route
+    again, and failures are scheduled for a retry or dead-lettered.
+    
+    Args:
+        email: Routed email
+        result: Routing result with success, action, status and message
+        
+    Returns:
+        Suffix for the log details
+    """
+    email.routing_action = result.get("action")
+    email.action_reference = result.get("reference")
+    
+    if result.get("action") == "manual_review":
+        email.status = "pending"
+        email.next_attempt_at = None
+    elif result.get("status") == "deferred":
+        # Held back by a rate limit before any call was made, so no attempt is used
+        email.status = "deferred"
+        email.error_message = result.get("message")
+        return defer(email, result.get("retry_after") or 0)
+    elif result.get("status") == "digest_pending":
+        # Buffered for a digest; marked processed once the digest is sent
+        email.status = "digest_pending"
+        email.error_message = None
+        email.processed_at = None
+        email.next_attempt_at = datetime.datetime.utcnow() + datetime.timedelta(seconds=result["retry_after"])
+    else:
+        email.status = "processed" if result.get("success") else "error"
+        email.error_message = result.get("message") if not result.get("success") else None
+        email.processed_at = datetime.datetime.utcnow()
+        email.next_attempt_at = None
+        if not result.get("success") and result.get("retryable", True):
+            return schedule_retry(email)
+    return ""
+
+def apply_digest_result(db, emails: List[Email], result: Dict, now: datetime.datetime,
+                        log_sink: Optional[LogSink] = None):
+    """
+    Record the outcome of sending a digest on its emails and commit
+    
+    Args:
+        db: Database session
+        emails: Emails sent in the digest, with status "digest_pending"
+        result: Send result with success, reference and message
+        now: Current time
+        log_sink: Log sink (defaults to the session)
+    """
+    for email in emails:
+        details = f"Digest to {result.get('destination') or email.routing_action} "
+        if result["success"]:
+            email.status = "processed"
+            email.action_reference = result.get("reference")
+            email.error_message = None
+            email.processed_at = now
+            email.next_attempt_at = None
+            details += "sent"
+        else:
+            email.status = "error"
+            email.error_message = result.get("message")
+            email.processed_at = now
+            email.next_attempt_at = None
+            details += "failed" + schedule_retry(email, now)
+        write_log(
+            db,
+            log_sink,
+            email_id=email.id,
+            action="digest",
+            details=details,
+            status="success" if result["success"] else "failure",
+            error=result.get("message") if not result["success"] else None
+        )
+    db.commit()
+
+def retry_delay(attempts: int) -> float:
+    """
+    Delay before the next attempt after `attempts` failures
+    
+    The delay doubles per failure up to max_delay; a random part of it
+    (jitter) spreads out retries of emails that failed together.
+    """
+    delay = min(RETRY["base_delay"] * 2 ** max(attempts - 1, 0), RETRY["max_delay"])
+    return delay * (1 - RETRY["jitter"] * random.random())
+
+def schedule_retry(email: Email, now: Optional[datetime.datetime] = None) -> str:
+    """
+    Count a failed routing attempt and schedule the next one, or dead-letter
+    the email once it has used up its attempts
+    
+    Args:
+        email: Email whose routing failed
+        now: Current time (defaults to utcnow)
+        
+    Returns:
+        Suffix for the processing log details
+    """
+    email.routing_attempts = (email.routing_attempts or 0) + 1
+    if not RETRY["enabled"]:
+        return ""
+    if email.routing_attempts >= RETRY["max_attempts"]:
+        email.status = "dead_letter"
+        return f". Dead-lettered after {email.routing_attempts} attempts"
+    
+    now = now or datetime.datetime.utcnow()
+    email.next_attempt_at = now + datetime.timedelta(seconds=retry_delay(email.routing_attempts))
+    return f". Retry {email.routing_attempts} scheduled for {email.next_attempt_at:%Y-%m-%d %H:%M:%S}"
+
+def defer(email: Email, retry_after: float, now: Optional[datetime.datetime] = None) -> str:
+    """
+    Schedule a deferred email without counting an attempt
+    
+    The delay is at least base_delay, stretched by a random part (jitter) so
+    emails deferred together do not all come due at the same moment.
+    
+    Args:
+        email: Email held back by a rate limit
+        retry_after: Seconds until its destination has tokens again
+        now: Current time (defaults to utcnow)
+        
+    Returns:
+        Suffix for the processing log details
+    """
+    delay = max(retry_after, RETRY["base_delay"]) * (1 + RETRY["jitter"] * random.random())
+    now = now or datetime.datetime.utcnow()
+    email.next_attempt_at = now + datetime.timedelta(seconds=delay)
+    return f". Deferred until {email.next_attempt_at:%Y-%m-%d %H:%M:%S}"
+
+def mark_unidentified(email: Email, db, log_sink: Optional[LogSink] = None):
+    """
+    Mark an email without an identified client for manual review
+    """
+    email.status = "pending"
+    email.routing_action = "manual_review"
+    
+    write_log(
+        db,
+        log_sink,
+        email_id=email.id,
+        action="client_identification",
+        details="No client identified for this email",
+        status="failure",
+        error="Unable to identify client"
+    )
+
+def apply_prefilter_result(email: Email, prefilter_result: Dict, db, log_sink: Optional[LogSink] = None):
+    """
+    Apply prefilter handling to an email record
+    """
+    if prefilter_result["handling"] == "manual_review":
+        email.status = "pending"
+        email.routing_action = "manual_review"
+    else:
+        email.status = "filtered"
+        email.routing_action = "filtered"
+        email.action_reference = prefilter_result["category"]
+        email.processed_at = datetime.datetime.utcnow()
+    
+    write_log(
+        db,
+        log_sink,
+        email_id=email.id,
+        action="prefilter",
+        details=f"Prefilter matched {prefilter_result['category']}: {prefilter_result['reason']}",
+        status="success"
+    )
+
+def match_client(email_data: Dict, clients: List) -> Optional[Client]:
+    """
+    Match email data against a list of clients
+    
+    Args:
+        email_data: Email data dictionary
+        clients: Client rows
+        
+    Returns:
+        First matching client or None
+    """
+    # Check by email domain
+    sender_domain = email_data["sender"].split('@')[-1]
+    for client in clients:
+        # Check domains
+        if client.domains and sender_domain in client.domains:
+            return client
+        
+        # Check authorized emails
+        if client.authorized_emails and email_data["sender"] in client.authorized_emails:
+            return client
+        
+        # Check signature patterns
+        if client.signature_patterns and email_data["body"]:
+            for pattern in client.signature_patterns:
+                if re.search(pattern, email_data["body"]):
+                    return client
+    
+    return None
+
+def identify_client(email_data: Dict, db) -> Optional[Client]:
+    """
+    Identify client based on email data
+    """
+    return match_client(email_data, db.query(Client).all())
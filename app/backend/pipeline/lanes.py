@@ -0,0 +1,154 @@
+"""
+Priority lanes for the ingestion pipeline
+
+Work is split into lanes by client priority. Lanes share the pipeline
+workers by weighted fair queuing: each dispatch advances the lane's pass
+by 1/weight and the eligible lane with the lowest pass goes next, so a
+lane of weight 8 gets eight dispatches for every one of a lane of weight
+1 while both have work, and an idle lane never banks credit. Within a
+lane, clients take turns and each client is capped at
+PIPELINE["client_concurrency"] conversations in flight, so one noisy
+client cannot take every worker.
+"""
+
+import threading
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Tuple
+
+from app.config.settings import PIPELINE
+
+def lane_for(priority: Optional[int]) -> str:
+    """
+    Get the lane of a client priority
+    
+    Args:
+        priority: Client priority (higher is more urgent)
+        
+    Returns:
+        Name of the first lane, in the configured order, whose min_priority
+        the priority reaches; the last lane takes everything else
+    """
+    lanes = PIPELINE["lanes"]
+    for name, lane in lanes.items():
+        if lane["min_priority"] is not None and (priority or 0) >= lane["min_priority"]:
+            return name
+    return next(reversed(lanes))
+
+def lane_rank(name: str) -> int:
+    """Job queue priority of a lane: the first lane ranks highest"""
+    names = list(PIPELINE["lanes"])
+    return len(names) - 1 - names.index(name)
+
+class Lane:
+    """Conversations waiting in one lane, queued per client"""
+    
+    def __init__(self, name: str, weight: float):
+        self.name = name
+        self.weight = weight
+        self.clients: "OrderedDict[Optional[int], deque]" = OrderedDict()
+        self.depth = 0
+        self.in_flight = 0
+        self.passes = 0.0
+
+class LaneScheduler:
+    """Weighted fair queue of conversations over priority lanes with per-client caps"""
+    
+    def __init__(self, client_concurrency: Optional[int] = None):
+        """
+        Initialize empty lanes
+        
+        Args:
+            client_concurrency: Conversations of one client processed at once
+        """
+        self.client_concurrency = client_concurrency or PIPELINE["client_concurrency"]
+        self.lanes = OrderedDict(
+            (name, Lane(name, lane["weight"])) for name, lane in PIPELINE["lanes"].items()
+        )
+        self.client_in_flight: Dict[Optional[int], int] = {}
+        self.virtual_time = 0.0
+        self._lock = threading.Lock()
+    
+    def push(self, items: List[Dict]):
+        """
+        Queue the work items of one conversation
+        
+        Args:
+            items: Work items of a single thread, with client_data snapshots
+        """
+        client_data = items[0]["client_data"]
+        lane = self.lanes[lane_for(client_data.get("priority"))]
+        with self._lock:
+            if not lane.depth:
+                # A lane that was idle starts at the current virtual time
+                lane.passes = max(lane.passes, self.virtual_time)
+            lane.clients.setdefault(client_data.get("id"), deque()).append(items)
+            lane.depth += 1
+    
+    def pop(self) -> Optional[Tuple[str, List[Dict]]]:
+        """
+        Take the next conversation to process
+        
+        Returns:
+            Tuple of (lane name, work items), or None if every queued
+            conversation belongs to a client at its concurrency cap
+        """
+        with self._lock:
+            eligible = [
+                lane for lane in self.lanes.values()
+                if lane.depth and self._next_client(lane) is not None
+            ]
+            if not eligible:
+                return None
+            lane = min(eligible, key=lambda l: l.passes)
+            client_id = self._next_client(lane)
+            
+            queue = lane.clients.pop(client_id)
+            items = queue.popleft()
+            if queue:
+                # Rotate the client to the back so clients of a lane take turns
+                lane.clients[client_id] = queue
+            lane.depth -= 1
+            lane.in_flight += 1
+            self.client_in_flight[client_id] = self.client_in_flight.get(client_id, 0) + 1
+            self.virtual_time = lane.passes
+            lane.passes += 1.0 / lane.weight
+            return lane.name, items
+    
+    def done(self, lane_name: str, items: List[Dict]):
+        """
+        Release the lane and client slots of a finished conversation
+        
+        Args:
+            lane_name: Lane the conversation was taken from
+            items: Its work items
+        """
+        client_id = items[0]["client_data"].get("id")
+        with self._lock:
+            self.lanes[lane_name].in_flight -= 1
+            remaining = self.client_in_flight[client_id] - 1
+            if remaining:
+                self.client_in_flight[client_id] = remaining
+            else:
+                del self.client_in_flight[client_id]
+    
+    def _next_client(self, lane: Lane) -> Optional[int]:
+        for client_id in lane.clients:
+            if self.client_in_flight.get(client_id, 0) < self.client_concurrency:
+                return client_id
+        return None
+    
+    def __len__(self) -> int:
+        return sum(lane.depth for lane in self.lanes.values())
+    
+    def depths(self) -> Dict[str, Dict[str, int]]:
+        """
+        Get the queue depth per lane
+        
+        Returns:
+            Lane name -> counts of queued and in-flight conversations
+        """
+        with self._lock:
+            return {
+                lane.name: {"queued": lane.depth, "in_flight": lane.in_flight}
+                for lane in self.lanes.values()
+            }
@@ -0,0 +1,187 @@
+"""
+Retry scheduler for emails whose routing failed
+
+Emails left in status "error" by a transient failure (a GitHub 5xx, an
+SMTP timeout) carry a next_attempt_at set with exponential backoff. The
+scheduler claims the emails that are due and re-runs only the routing
+step from the stored email and classification, without fetching the
+mailbox again. After RETRY["max_attempts"] failures an email is moved
+to status "dead_letter" and left for a human. Emails deferred by a
+destination's rate limit (status "deferred") are routed again the same
+way, without counting against max_attempts, as are emails buffered for
+a digest (status "digest_pending") whose digest was lost with its process.
+"""
+
+import datetime
+import logging
+from functools import partial
+from typing import Dict, List, Optional
+
+from sqlalchemy import and_
+
+from app.config.settings import RETRY
+from app.backend.pipeline.ingestion import (
+    IngestionPipeline,
+    apply_processing_result,
+    client_snapshot,
+    commit_batch,
+    email_snapshot,
+    load_emails,
+)
+from app.models.models import Client, Email
+
+logger = logging.getLogger(__name__)
+
+# Statuses of emails waiting for their next routing attempt
+RETRY_STATUSES = ("error", "deferred", "digest_pending")
+
+class RetryScheduler:
+    """Claims failed emails whose backoff has elapsed and routes them again"""
+    
+    def __init__(self, pipeline: IngestionPipeline, batch_size: Optional[int] = None,
+                 lease_seconds: Optional[int] = None):
+        """
+        Initialize the scheduler
+        
+        Args:
+            pipeline: Pipeline whose routing engine and workers run the retries
+            batch_size: Due emails claimed per run
+            lease_seconds: Time a claimed email is hidden from other schedulers
+        """
+        self.logger = logging.getLogger(__name__)
+        self.pipeline = pipeline
+        self.batch_size = batch_size or RETRY["batch_size"]
+        self.lease_seconds = lease_seconds or RETRY["lease_seconds"]
+    
+    def claim(self, db, now: Optional[datetime.datetime] = None) -> List[int]:
+        """
+        Claim up to batch_size due emails
+        
+        Claimed emails get next_attempt_at pushed out by the lease, so another
+        scheduler skips them, and a scheduler that dies mid-retry only delays
+        them. As in the job queue, rows are locked with FOR UPDATE SKIP LOCKED
+        on PostgreSQL and claimed with conditional UPDATEs on SQLite.
+        
+        Args:
+            db: Database session
+            now: Current time (defaults to utcnow)
+            
+        Returns:
+            Claimed email IDs, longest overdue first
+        """
+        now = now or datetime.datetime.utcnow()
+        leased_until = now + datetime.timedelta(seconds=self.lease_seconds)
+        due = and_(Email.status.in_(RETRY_STATUSES), Email.next_attempt_at <= now)
+        candidates = db.query(Email.id).filter(due).order_by(Email.next_attempt_at, Email.id)
+        
+        if db.get_bind().dialect.name == "postgresql":
+            email_ids = [email_id for (email_id,) in candidates.with_for_update(skip_locked=True).limit(self.batch_size)]
+            if email_ids:
+                db.query(Email).filter(Email.id.in_(email_ids)).update(
+                    {Email.next_attempt_at: leased_until}, synchronize_session=False
+                )
+            db.commit()
+            return email_ids
+        
+        # Over-fetch candidates since other schedulers may win some of them
+        claimed = []
+        for (email_id,) in candidates.limit(self.batch_size * 2).all():
+            updated = (
+                db.query(Email)
+                .filter(Email.id == email_id, due)
+                .update({Email.next_attempt_at: leased_until}, synchronize_session=False)
+            )
+            db.commit()
+            if updated:
+                claimed.append(email_id)
+                if len(claimed) >= self.batch_size:
+                    break
+        return claimed
+    
+    def load_work_items(self, db, email_ids: List[int]) -> List[Dict]:
+        """
+        Rebuild work items for claimed emails from their stored data
+        
+        Emails already classified keep their classification, so only the
+        routing step runs again. Emails whose client no longer exists fail
+        without a further retry.
+        
+        Args:
+            db: Database session
+            email_ids: Claimed email IDs
+            
+        Returns:
+            Work items for the pipeline
+        """
+        emails = load_emails(db, email_ids)
+        client_ids = {email.client_id for email in emails.values() if email.client_id}
+        clients = {c.id: c for c in db.query(Client).filter(Client.id.in_(client_ids)).all()}
+        
+        work = []
+        orphans = []
+        for email_id in email_ids:
+            email = emails.get(email_id)
+            if not email or email.status not in RETRY_STATUSES:
+                continue
+            client = clients.get(email.client_id)
+            if not client:
+                orphans.append(email)
+                continue
+            item = {
+                "email": email,
+                "email_data": email_snapshot(email, {"date": str(email.received_at)}),
+                "client_data": client_snapshot(client),
+                "thread": email.id
+            }
+            if email.classification and email.confidence_score is not None:
+                item["decision"] = {
+                    "classification": email.classification,
+                    "confidence": email.confidence_score,
+                    "classification_source": "stored",
+                    "needs_manual_review": False
+                }
+            work.append(item)
+        
+        commit_batch(db, [
+            partial(apply_processing_result, email, {
+                "success": False,
+                "action": "error",
+                "classification": email.classification,
+                "confidence": email.confidence_score,
+                "message": "Client not found",
+                "retryable": False
+            }, db, self.pipeline.log_sink)
+            for email in orphans
+        ])
+        return work
+    
+    def run(self, db, now: Optional[datetime.datetime] = None) -> Dict:
+        """
+        Retry the routing of all due emails, one claimed batch at a time
+        
+        Args:
+            db: Database session
+            now: Current time (defaults to utcnow)
+            
+        Returns:
+            Dict with the number of emails retried, processed and failed again
+        """
+        summary = {"retried": 0, "processed": 0, "errors": 0}
+        if not RETRY["enabled"]:
+            return summary
+        
+        while True:
+            email_ids = self.claim(db, now)
+            if not email_ids:
+                break
+            work = self.load_work_items(db, email_ids)
+            result = self.pipeline.execute(db, work)
+            summary["retried"] += len(work)
+            summary["processed"] += result["processed"]
+            summary["errors"] += result["errors"]
+            if len(email_ids) < self.batch_size:
+                break
+        
+        if summary["retried"]:
+            self.logger.info(f"Retried failed emails: {summary}")
+        return summary
@@ -0,0 +1,315 @@
+"""
+Durable database-backed job queue for Smart Inbox Application
+"""
+
+import datetime
+import logging
+from typing import Dict, List, Optional
+
+from sqlalchemy import and_, func, or_
+
+from app.config.settings import QUEUE
+from app.models.models import Job
+
+logger = logging.getLogger(__name__)
+
+class JobQueue:
+    """Job queue with leases and visibility timeouts stored in the jobs table"""
+    
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self.lease_seconds = QUEUE["lease_seconds"]
+        self.max_attempts = QUEUE["max_attempts"]
+        self.retry_delay = QUEUE["retry_delay"]
+        self.retention_hours = {"done": QUEUE["done_retention_hours"], "failed": QUEUE["failed_retention_hours"]}
+        self.purge_batch_size = QUEUE["purge_batch_size"]
+    
+    def enqueue(self, db, kind: str, payload: Optional[Dict] = None, priority: int = 0, delay: int = 0) -> Job:
+        """
+        Add a job to the queue
+        
+        Args:
+            db: Database session
+            kind: Job kind
+            payload: JSON payload for the job handler
+            priority: Higher priority jobs are claimed first
+            delay: Seconds before the job becomes claimable
+            
+        Returns:
+            Job record
+        """
+        job = Job(
+            kind=kind,
+            payload=payload or {},
+            priority=priority,
+            max_attempts=self.max_attempts,
+            available_at=datetime.datetime.utcnow() + datetime.timedelta(seconds=delay)
+        )
+        db.add(job)
+        db.commit()
+        return job
+    
+    def enqueue_once(self, db, kind: str, payload: Optional[Dict] = None, priority: int = 0) -> Job:
+        """
+        Add a job unless one of the same kind is already queued or running
+        
+        Args:
+            db: Database session
+            kind: Job kind
+            payload: JSON payload for the job handler
+            priority: Higher priority jobs are claimed first
+            
+        Returns:
+            The pending job or the new job
+        """
+        pending = (
+            db.query(Job)
+            .filter(Job.kind == kind, Job.status.in_(("queued", "leased")))
+            .order_by(Job.id)
+            .first()
+        )
+        return pending or self.enqueue(db, kind, payload, priority)
+    
+    def claim(self, db, worker_id: str, limit: int = 1) -> List[Job]:
+        """
+        Lease up to `limit` claimable jobs for a worker
+        
+        A job is claimable when it is queued and available, or when a previous
+        worker's lease has expired. On PostgreSQL, rows are locked with
+        FOR UPDATE SKIP LOCKED so concurrent workers never wait on or claim the
+        same job. SQLite has no row locks but serializes writers, so each
+        candidate is leased with a conditional UPDATE that only one worker wins.
+        
+        Args:
+            db: Database session
+            worker_id: Unique worker identifier
+            limit: Maximum number of jobs to claim
+            
+        Returns:
+            List of leased Job records
+        """
+        now = datetime.datetime.utcnow()
+        leased_until = now + datetime.timedelta(seconds=self.lease_seconds)
+        claimable = or_(
+            and_(Job.status == "queued", Job.available_at <= now),
+            and_(Job.status == "leased", Job.leased_until < now)
+        )
+        candidates = db.query(Job).filter(claimable).order_by(Job.priority.desc(), Job.id)
+        
+        if db.get_bind().dialect.name == "postgresql":
+            jobs = candidates.with_for_update(skip_locked=True).limit(limit).all()
+            for job in jobs:
+                job.status = "leased"
+                job.lease_owner = worker_id
+                job.leased_until = leased_until
+                job.attempts += 1
+            db.commit()
+            return jobs
+        
+        # Over-fetch candidates since other workers may win some of them
+        candidate_ids = [job_id for (job_id,) in candidates.with_entities(Job.id).limit(limit * 4).all()]
+        claimed_ids = []
+        for job_id in candidate_ids:
+            updated = (
+                db.query(Job)
+                .filter(Job.id == job_id, claimable)
+                .update({
+                    Job.status: "leased",
+                    Job.lease_owner: worker_id,
+                    Job.leased_until: leased_until,
+                    Job.attempts: Job.attempts + 1
+                }, synchronize_session=False)
+            )
+            db.commit()
+            if updated:
+                claimed_ids.append(job_id)
+                if len(claimed_ids) >= limit:
+                    break
+        
+        if not claimed_ids:
+            return []
+        jobs = {job.id: job for job in db.query(Job).filter(Job.id.in_(claimed_ids)).populate_existing().all()}
+        return [jobs[job_id] for job_id in claimed_ids]
+    
+    def extend_lease(self, db, job_id: int, worker_id: str) -> bool:
+        """
+        Extend a job's lease while it is still being worked on
+        
+        Args:
+            db: Database session
+            job_id: Leased job ID
+            worker_id: Worker holding the lease
+            
+        Returns:
+            False if the lease was lost to another worker
+        """
+        updated = (
+            db.query(Job)
+            .filter(Job.id == job_id, Job.status == "leased", Job.lease_owner == worker_id)
+            .update({
+                Job.leased_until: datetime.datetime.utcnow() + datetime.timedelta(seconds=self.lease_seconds)
+            }, synchronize_session=False)
+        )
+        db.commit()
+        return bool(updated)
+    
+    def complete(self, db, job: Job, worker_id: str) -> bool:
+        """
+        Mark a job as done
+        
+        Args:
+            db: Database session
+            job: Leased job
+            worker_id: Worker holding the lease
+            
+        Returns:
+            False if the lease was lost to another worker, whose state is kept
+        """
+        return self.finish(db, job.id, worker_id, {
+            Job.status: "done",
+            Job.leased_until: None,
+            Job.last_error: None
+        })
+    
+    def fail(self, db, job: Job, worker_id: str, error: str) -> bool:
+        """
+        Record a job failure, scheduling a retry with exponential backoff
+        until the job runs out of attempts
+        
+        Args:
+            db: Database session
+            job: Leased job
+            worker_id: Worker holding the lease
+            error: Error message
+            
+        Returns:
+            False if the lease was lost to another worker, whose state is kept
+        """
+        values = {Job.last_error: error, Job.leased_until: None}
+        if job.attempts >= job.max_attempts:
+            values[Job.status] = "failed"
+            message = f"Job {job.id} ({job.kind}) failed after {job.attempts} attempts: {error}"
+        else:
+            delay = self.retry_delay * 2 ** max(job.attempts - 1, 0)
+            values[Job.status] = "queued"
+            values[Job.available_at] = datetime.datetime.utcnow() + datetime.timedelta(seconds=delay)
+            message = f"Job {job.id} ({job.kind}) failed, retrying in {delay}s: {error}"
+        
+        if not self.finish(db, job.id, worker_id, values):
+            return False
+        if values[Job.status] == "failed":
+            self.logger.error(message)
+        else:
+            self.logger.warning(message)
+        return True
+    
+    def finish(self, db, job_id: int, worker_id: str, values: Dict) -> bool:
+        """
+        Update a job the worker still holds the lease on
+        
+        The UPDATE is conditional on the lease, like extend_lease, so a worker
+        whose lease expired and was taken over cannot overwrite the new owner.
+        
+        Args:
+            db: Database session
+            job_id: Leased job ID
+            worker_id: Worker holding the lease
+            values: Column values to set
+            
+        Returns:
+            False if the lease was lost to another worker
+        """
+        updated = (
+            db.query(Job)
+            .filter(Job.id == job_id, Job.status == "leased", Job.lease_owner == worker_id)
+            .update(values, synchronize_session=False)
+        )
+        db.commit()
+        if not updated:
+            self.logger.warning(f"Lost lease on job {job_id}; its outcome was not recorded")
+        return bool(updated)
+    
+    def purge(self, db, now: Optional[datetime.datetime] = None) -> int:
+        """
+        Delete done and failed jobs older than their retention, in batches
+        
+        Every sync enqueues jobs, so without purging the jobs table, and the
+        stats query over it, would grow without bound.
+        
+        Args:
+            db: Database session
+            now: Current time (defaults to utcnow)
+            
+        Returns:
+            Number of jobs deleted
+        """
+        now = now or datetime.datetime.utcnow()
+        deleted = 0
+        for status, hours in self.retention_hours.items():
+            cutoff = now - datetime.timedelta(hours=hours)
+            while True:
+                job_ids = [
+                    job_id for (job_id,) in
+                    db.query(Job.id).filter(Job.status == status, Job.updated_at < cutoff).limit(self.purge_batch_size)
+                ]
+                if not job_ids:
+                    break
+                deleted += db.query(Job).filter(Job.id.in_(job_ids)).delete(synchronize_session=False)
+                db.commit()
+                if len(job_ids) < self.purge_batch_size:
+                    break
+        
+        if deleted:
+            self.logger.info(f"Purged {deleted} finished jobs")
+        return deleted
+    
+    def stats(self, db) -> Dict[str, int]:
+        """
+        Count jobs per status
+        
+        Args:
+            db: Database session
+            
+        Returns:
+            Dict mapping status to job count
+        """
+        return dict(db.query(Job.status, func.count(Job.id)).group_by(Job.status).all())
+    
+    def payloads(self, db, kind: str, statuses) -> List[Dict]:
+        """
+        Get the payloads of the jobs of a kind in the given statuses
+        
+        Args:
+            db: Database session
+            kind: Job kind
+            statuses: Job statuses
+            
+        Returns:
+            List of job payloads
+        """
+        return [
+            payload or {} for (payload,) in
+            db.query(Job.payload).filter(Job.kind == kind, Job.status.in_(statuses))
+        ]
+    
+    def queued_by_priority(self, db, kind: str) -> Dict[int, int]:
+        """
+        Count queued jobs of a kind per priority
+        
+        Args:
+            db: Database session
+            kind: Job kind
+            
+        Returns:
+            Dict mapping priority to queued job count
+        """
+        return dict(
+            db.query(Job.priority, func.count(Job.id))
+            .filter(Job.kind == kind, Job.status == "queued")
+            .group_by(Job.priority)
+            .all()
+        )
+
+
+# Shared queue used by API routes and workers
+job_queue = JobQueue()
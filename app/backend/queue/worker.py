@@ -0,0 +1,302 @@
+"""
+Queue worker running ingestion pipeline jobs for Smart Inbox Application
+"""
+
+import datetime
+import logging
+import os
+import socket
+import threading
+import time
+from typing import Dict, List, Optional
+
+from app.config.settings import QUEUE
+from app.backend.email.email_handler import get_email_handler
+from app.backend.email.prefilter import EmailPrefilter
+from app.backend.email.raw_archive import raw_archive
+from app.backend.pipeline.ingestion import IngestionPipeline, group_by_thread
+from app.backend.pipeline.lanes import lane_for, lane_rank
+from app.backend.pipeline.retry import RetryScheduler
+from app.backend.queue.job_queue import job_queue
+from app.backend.retention.log_archive import run_retention
+from app.backend.routes.routing_engine import RoutingEngine
+from app.backend.routes.rule_table import routing_rule_table
+from app.models.models import Email, Job
+from app.utils.log_sink import audit_log
+
+logger = logging.getLogger(__name__)
+
+class QueueWorker:
+    """Worker claiming jobs from the durable queue and running them through the ingestion pipeline"""
+    
+    def __init__(self, session_factory, pipeline: Optional[IngestionPipeline] = None, worker_id: Optional[str] = None):
+        self.logger = logging.getLogger(__name__)
+        self.session_factory = session_factory
+        self.queue = job_queue
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.poll_interval = QUEUE["poll_interval"]
+        self.batch_size = QUEUE["batch_size"]
+        self.emails_per_job = QUEUE["emails_per_job"]
+        self.purge_interval = QUEUE["purge_interval"]
+        self.last_purge: Optional[float] = None
+        self.pipeline = pipeline or IngestionPipeline(RoutingEngine(), EmailPrefilter(), log_sink=audit_log, raw_archive=raw_archive)
+        self.retry_scheduler = RetryScheduler(self.pipeline)
+        self.stop_event = threading.Event()
+        self.handlers = {
+            "fetch_mailbox": self.fetch_mailbox,
+            "process_emails": self.process_emails,
+            "retry_emails": self.retry_emails,
+            "log_retention": self.log_retention
+        }
+    
+    def run(self, once: bool = False):
+        """
+        Claim and run jobs until stopped
+        
+        Args:
+            once: Return after the queue is drained instead of polling
+        """
+        self.logger.info(f"Queue worker {self.worker_id} started")
+        while not self.stop_event.is_set():
+            self.purge_jobs()
+            processed = self.run_batch()
+            if not processed:
+                if once:
+                    break
+                self.stop_event.wait(self.poll_interval)
+        self.logger.info(f"Queue worker {self.worker_id} stopped")
+    
+    def stop(self):
+        """Stop after the current job finishes"""
+        self.stop_event.set()
+    
+    def run_batch(self) -> int:
+        """
+        Run up to batch_size jobs
+        
+        Jobs are claimed one at a time, right before they run, so a job never
+        sits leased but unattended behind slow jobs until its lease expires
+        and another worker runs it again.
+        
+        Returns:
+            Number of jobs run
+        """
+        db = self.session_factory()
+        try:
+            count = 0
+            while count < self.batch_size and not self.stop_event.is_set():
+                jobs = self.queue.claim(db, self.worker_id)
+                if not jobs:
+                    break
+                self.run_job(db, jobs[0])
+                count += 1
+            return count
+        finally:
+            db.close()
+    
+    def purge_jobs(self):
+        """Delete old finished jobs at most once per purge interval"""
+        now = time.monotonic()
+        if self.last_purge is not None and now - self.last_purge < self.purge_interval:
+            return
+        self.last_purge = now
+        db = self.session_factory()
+        try:
+            self.queue.purge(db)
+        except Exception as e:
+            db.rollback()
+            self.logger.error(f"Failed to purge finished jobs: {str(e)}")
+        finally:
+            db.close()
+    
+    def run_job(self, db, job: Job):
+        """
+        Run a leased job, keeping its lease alive and recording the outcome
+        
+        Args:
+            db: Database session
+            job: Leased job
+        """
+        handler = self.handlers.get(job.kind)
+        if not handler:
+            self.queue.fail(db, job, self.worker_id, f"Unknown job kind: {job.kind}")
+            return
+        
+        heartbeat_stop = threading.Event()
+        heartbeat = threading.Thread(target=self.heartbeat, args=(job.id, heartbeat_stop), daemon=True)
+        heartbeat.start()
+        try:
+            self.prepare(db)
+            handler(db, job.payload or {})
+            self.queue.complete(db, job, self.worker_id)
+        except Exception as e:
+            db.rollback()
+            self.logger.error(f"Job {job.id} ({job.kind}) raised: {str(e)}")
+            self.queue.fail(db, job, self.worker_id, str(e))
+        finally:
+            heartbeat_stop.set()
+            heartbeat.join()
+    
+    def heartbeat(self, job_id: int, stop: threading.Event):
+        """
+        Extend a job's lease until the job finishes
+        
+        Args:
+            job_id: Leased job ID
+            stop: Set when the job finishes
+        """
+        interval = max(self.queue.lease_seconds / 3, 1)
+        while not stop.wait(interval):
+            db = self.session_factory()
+            try:
+                if not self.queue.extend_lease(db, job_id, self.worker_id):
+                    self.logger.warning(f"Lost lease on job {job_id}")
+                    return
+            except Exception as e:
+                self.logger.error(f"Failed to extend lease on job {job_id}: {str(e)}")
+            finally:
+                db.close()
+    
+    def prepare(self, db):
+        """Warm classification state and refresh the routing rule table"""
+        routing_engine = self.pipeline.routing_engine
+        if not routing_engine.warmed:
+            routing_engine.warm(db)
+        routing_rule_table.ensure_loaded(db)
+    
+    def fetch_mailbox(self, db, payload: Dict):
+        """
+        Receive emails, store and identify them, and enqueue their processing
+        
+        Emails stored by an earlier fetch that died before enqueueing their
+        processing are picked up first.
+        
+        Args:
+            db: Database session
+            payload: Job payload (unused)
+        """
+        self.recover_unqueued(db)
+        
+        emails = get_email_handler().receive_emails()
+        work, summary = self.pipeline.prepare(db, emails)
+        self.enqueue_work(db, work)
+        
+        self.logger.info(f"Fetched mailbox: {summary}")
+    
+    def recover_unqueued(self, db) -> int:
+        """
+        Enqueue the processing of stored emails that no job covers
+        
+        A fetch that stores emails (already marked seen in the mailbox) and
+        dies before enqueueing their process_emails jobs leaves them pending
+        without a routing action. Such emails older than a job lease, and
+        not in any queued, leased or failed job, are identified again and
+        enqueued. Emails of failed jobs are left until the job is purged.
+        
+        Args:
+            db: Database session
+            
+        Returns:
+            Number of emails enqueued
+        """
+        cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=self.queue.lease_seconds)
+        candidates = [
+            email_id for (email_id,) in
+            db.query(Email.id)
+            .filter(Email.status == "pending", Email.routing_action.is_(None), Email.received_at < cutoff)
+            .order_by(Email.id)
+        ]
+        if not candidates:
+            return 0
+        
+        covered = {
+            email_id
+            for job_payload in self.queue.payloads(db, "process_emails", ("queued", "leased", "failed"))
+            for thread in job_payload.get("threads", [])
+            for email_id in thread
+        }
+        email_ids = [email_id for email_id in candidates if email_id not in covered]
+        if not email_ids:
+            return 0
+        
+        work, _ = self.pipeline.identify(db, self.pipeline.load_stored_records(db, email_ids))
+        self.enqueue_work(db, work)
+        self.logger.warning(f"Enqueued {len(work)} stored emails that had no processing job")
+        return len(work)
+    
+    def enqueue_work(self, db, work: List[Dict]):
+        """
+        Enqueue process_emails jobs for identified work items
+        
+        Args:
+            db: Database session
+            work: Work items from the pipeline's prepare() or identify()
+        """
+        # Threads stay within one job so their emails are processed in order;
+        # jobs of higher priority lanes are claimed first
+        lanes = {}
+        for items in group_by_thread(work):
+            lanes.setdefault(lane_for(items[0]["client_data"].get("priority")), []).append(items)
+        for lane, lane_threads in lanes.items():
+            for threads in chunk_threads(lane_threads, self.emails_per_job):
+                self.queue.enqueue(db, "process_emails", {"threads": threads, "lane": lane}, priority=lane_rank(lane))
+    
+    def process_emails(self, db, payload: Dict):
+        """
+        Classify, route and persist stored emails
+        
+        Args:
+            db: Database session
+            payload: Job payload with email IDs grouped by thread
+        """
+        work = self.pipeline.load_work_items(db, payload.get("threads", []))
+        summary = self.pipeline.execute(db, work)
+        self.logger.info(f"Processed emails: {summary}")
+    
+    def retry_emails(self, db, payload: Dict):
+        """
+        Route failed emails again once their backoff has elapsed
+        
+        Args:
+            db: Database session
+            payload: Job payload (unused)
+        """
+        summary = self.retry_scheduler.run(db)
+        self.logger.info(f"Retried emails: {summary}")
+    
+    def log_retention(self, db, payload: Dict):
+        """
+        Archive and remove logs older than the retention window
+        
+        Args:
+            db: Database session
+            payload: Job payload (unused)
+        """
+        summary = run_retention(db.get_bind())
+        self.logger.info(f"Log retention: {summary}")
+
+
+def chunk_threads(threads: List[List[Dict]], size: int) -> List[List[List[int]]]:
+    """
+    Split thread groups of work items into job payloads of about `size` emails
+    
+    Args:
+        threads: Work items grouped by thread
+        size: Target number of emails per job
+        
+    Returns:
+        List of payload thread lists of email IDs
+    """
+    chunks = []
+    current = []
+    count = 0
+    for items in threads:
+        if current and count + len(items) > size:
+            chunks.append(current)
+            current = []
+            count = 0
+        current.append([item["email"].id for item in items])
+        count += len(items)
+    if current:
+        chunks.append(current)
+    return chunks
@@ -0,0 +1,428 @@
+"""
+Replay of stored emails through the decision pipeline for Smart Inbox Application
+
+Replay streams stored emails (optionally re-parsed from the raw message
+archive) through prefiltering, client identification, classification and
+routing decisions in a process pool, and reports where the decisions differ
+from the ones recorded. GitHub and SMTP calls are stubbed out and nothing is
+written to the database, so candidate rules, keyword lists and thresholds
+can be evaluated against historical traffic safely.
+"""
+
+import argparse
+import datetime
+import json
+import logging
+import os
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.backend.ai.classifier import CustomClassifier
+from app.backend.ai.sender_history import SenderHistory
+from app.backend.email.email_handler import ImapSmtpHandler
+from app.backend.email.prefilter import EmailPrefilter
+from app.backend.email.raw_archive import RawMessageArchive
+from app.backend.pipeline.ingestion import client_snapshot, match_client
+from app.backend.routes.routing_engine import RoutingEngine
+from app.backend.routes.rule_table import RoutingRuleTable
+from app.config.settings import RAW_ARCHIVE, REPLAY
+from app.models.models import Client, Email
+
+logger = logging.getLogger(__name__)
+
+# Fields compared between the recorded and the replayed decision
+DECISION_FIELDS = ("client_id", "classification", "action")
+
+REPLAY_COLUMNS = (
+    Email.id,
+    Email.sender,
+    Email.recipient,
+    Email.subject,
+    Email.body,
+    Email.attachments,
+    Email.received_at,
+    Email.client_id,
+    Email.classification,
+    Email.confidence_score,
+    Email.routing_action,
+)
+
+class ReplayRoutingEngine(RoutingEngine):
+    """Routing engine that decides like the live engine but performs no actions and learns nothing"""
+    
+    def __init__(self, ai_classifier, sender_history: SenderHistory, rule_table: RoutingRuleTable):
+        # The live constructor connects the email and GitHub handlers; replay needs neither
+        self.logger = logging.getLogger(__name__)
+        self.email_handler = None
+        self.github_handler = None
+        self.ai_classifier = ai_classifier
+        self.sender_history = sender_history
+        self.rule_table = rule_table
+        self.warmed = True
+    
+    def record_classification(self, email_data: Dict, classification: str, confidence: float, source: str):
+        """Replayed decisions do not feed the sender history or the classifier"""
+    
+    def create_github_issue(self, email_data: Dict, client_data: Dict, repository: str) -> Dict:
+        return {
+            "success": True,
+            "action": "github_issue",
+            "destination": repository,
+            "message": f"Would create a GitHub issue in {repository}"
+        }
+    
+    def forward_email(self, email_data: Dict, destination: str, message: str) -> Dict:
+        return {
+            "success": True,
+            "action": "email_forward",
+            "destination": destination,
+            "message": message
+        }
+
+class ReplayState:
+    """Decision state loaded once per worker process"""
+    
+    def __init__(self, db: Session, config: Dict[str, Any]):
+        """
+        Load clients, rules and sender history, applying the candidate changes in `config`
+        
+        Args:
+            db: Database session
+            config: Replay configuration (see run_replay)
+        """
+        self.config = config
+        self.classifier_mode = config.get("classifier", "local")
+        
+        classifier = CustomClassifier()
+        if config.get("keywords"):
+            classifier.keywords = {**classifier.keywords, **config["keywords"]}
+        if config.get("confidence_threshold") is not None:
+            classifier.confidence_threshold = config["confidence_threshold"]
+        
+        sender_history = SenderHistory()
+        sender_history.confidence_threshold = classifier.confidence_threshold
+        if config.get("sender_history", True):
+            sender_history.load(db)
+        else:
+            sender_history.enabled = False
+        
+        rule_table = RoutingRuleTable()
+        if config.get("rules") is None:
+            rule_table.load(db)
+        else:
+            rule_table.load_rules(
+                SimpleNamespace(**{"id": number, "active": True, "priority": 0, **rule})
+                for number, rule in enumerate(config["rules"], 1)
+            )
+        
+        self.engine = ReplayRoutingEngine(classifier, sender_history, rule_table)
+        self.prefilter = EmailPrefilter()
+        self.clients = db.query(Client).all()
+        db.expunge_all()
+        
+        self.raw_archive = None
+        if config.get("source") == "raw":
+            self.raw_archive = RawMessageArchive(config.get("raw_directory") or RAW_ARCHIVE["directory"], enabled=False)
+    
+    def email_data(self, row: Dict) -> Dict:
+        """Build the email data dict for a stored email, re-parsed from its raw message when available"""
+        email_data = {
+            "id": row["id"],
+            "sender": row["sender"],
+            "recipient": row["recipient"],
+            "subject": row["subject"],
+            "body": row["body"] or "",
+            "attachments": row["attachments"] or [],
+            "headers": {}
+        }
+        raw = self.raw_archive.get(row["id"]) if self.raw_archive else None
+        if raw is not None:
+            parsed = ImapSmtpHandler.parse_email(raw)
+            parsed.pop("message_id", None)
+            email_data.update(parsed)
+        return email_data
+    
+    def decide(self, row: Dict) -> Dict:
+        """
+        Replay the decision for one stored email
+        
+        Args:
+            row: Stored email columns
+            
+        Returns:
+            Replayed decision with client_id, classification, action, destination and rule_id
+        """
+        email_data = self.email_data(row)
+        
+        prefilter_result = self.prefilter.check(email_data)
+        if prefilter_result and prefilter_result["handling"] != "process":
+            action = "manual_review" if prefilter_result["handling"] == "manual_review" else "filtered"
+            return {"client_id": None, "classification": None, "action": action,
+                    "prefilter": prefilter_result["category"]}
+        
+        client = match_client(email_data, self.clients)
+        if not client:
+            return {"client_id": None, "classification": None, "action": "manual_review"}
+        
+        if self.classifier_mode == "recorded" and row["classification"] and row["confidence_score"] is not None:
+            confidence = row["confidence_score"]
+            decision = {
+                "classification": row["classification"],
+                "confidence": confidence,
+                "classification_source": "recorded",
+                "needs_manual_review": confidence < self.engine.ai_classifier.confidence_threshold
+            }
+        else:
+            decision = self.engine.decide(email_data)
+        
+        result = self.engine.route_decision(email_data, client_snapshot(client), decision)
+        rule = None
+        if result["action"] != "manual_review":
+            rule = self.engine.rule_table.match(client.id, decision["classification"])
+        return {
+            "client_id": client.id,
+            "classification": decision["classification"],
+            "action": result["action"],
+            "confidence": decision["confidence"],
+            "classification_source": decision["classification_source"],
+            "destination": result.get("destination"),
+            "rule_id": rule.id if rule else None
+        }
+
+# Per-process state of pool workers
+_state: Optional[ReplayState] = None
+
+def init_worker(database_url: str, config: Dict[str, Any]):
+    """Load the decision state in a pool worker from its own database connection"""
+    from app.utils.db import create_db_engine
+    
+    global _state
+    engine = create_db_engine(database_url, pool_size=1, max_overflow=0)
+    try:
+        with Session(engine) as db:
+            _state = ReplayState(db, config)
+    finally:
+        engine.dispose()
+
+def replay_chunk(rows: List[Dict], state: Optional[ReplayState] = None) -> List[Dict]:
+    """
+    Replay a chunk of stored emails
+    
+    Args:
+        rows: Stored email columns
+        state: Decision state (defaults to the worker's state)
+        
+    Returns:
+        Results with the recorded and replayed decision per email
+    """
+    state = state or _state
+    results = []
+    for row in rows:
+        recorded = {
+            "client_id": row["client_id"],
+            "classification": row["classification"],
+            "action": row["routing_action"]
+        }
+        try:
+            replayed = state.decide(row)
+            error = None
+        except Exception as e:
+            replayed = None
+            error = str(e)
+        results.append({"id": row["id"], "subject": row["subject"], "recorded": recorded,
+                        "replayed": replayed, "error": error})
+    return results
+
+def stream_emails(db: Session, config: Dict[str, Any], chunk_size: int) -> Iterator[List[Dict]]:
+    """
+    Stream decided emails in ID order, one chunk per query
+    
+    Args:
+        db: Database session
+        config: Replay configuration with optional start_date, end_date, client_id and limit
+        chunk_size: Emails per chunk
+        
+    Yields:
+        Lists of stored email columns
+    """
+    query = db.query(*REPLAY_COLUMNS).filter(Email.routing_action.isnot(None))
+    if config.get("start_date"):
+        query = query.filter(Email.received_at >= config["start_date"])
+    if config.get("end_date"):
+        query = query.filter(Email.received_at <= config["end_date"])
+    if config.get("client_id") is not None:
+        query = query.filter(Email.client_id == config["client_id"])
+    
+    remaining = config.get("limit")
+    last_id = 0
+    while remaining is None or remaining > 0:
+        size = chunk_size if remaining is None else min(chunk_size, remaining)
+        rows = query.filter(Email.id > last_id).order_by(Email.id).limit(size).all()
+        if not rows:
+            return
+        last_id = rows[-1].id
+        if remaining is not None:
+            remaining -= len(rows)
+        yield [row._asdict() for row in rows]
+
+class ReplayReport:
+    """Aggregated differences between recorded and replayed decisions"""
+    
+    def __init__(self, sample_size: int):
+        self.sample_size = sample_size
+        self.emails = 0
+        self.changed = 0
+        self.errors = 0
+        self.fields = Counter()
+        self.transitions = Counter()
+        self.actions = Counter()
+        self.samples = []
+    
+    def add(self, result: Dict):
+        self.emails += 1
+        if result["error"]:
+            self.errors += 1
+            return
+        recorded, replayed = result["recorded"], result["replayed"]
+        self.actions[replayed["action"]] += 1
+        changed = [field for field in DECISION_FIELDS if recorded[field] != replayed[field]]
+        if not changed:
+            return
+        self.changed += 1
+        self.fields.update(changed)
+        self.transitions[f"{recorded['action']} -> {replayed['action']}"] += 1
+        if len(self.samples) < self.sample_size:
+            self.samples.append({**result, "changed": changed})
+    
+    def to_dict(self, duration: float) -> Dict[str, Any]:
+        return {
+            "emails": self.emails,
+            "changed": self.changed,
+            "unchanged": self.emails - self.changed - self.errors,
+            "errors": self.errors,
+            "changed_fields": dict(self.fields),
+            "transitions": dict(self.transitions.most_common()),
+            "replayed_actions": dict(self.actions.most_common()),
+            "samples": self.samples,
+            "duration_seconds": round(duration, 3),
+            "emails_per_second": round(self.emails / duration, 1) if duration else None
+        }
+
+def run_replay(db: Session, config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Replay stored emails and report decisions that differ from the recorded ones
+    
+    Args:
+        db: Database session
+        config: Replay configuration:
+            start_date, end_date, client_id, limit: which emails to replay
+            source: "db" (stored fields) or "raw" (re-parse archived raw messages)
+            classifier: "local" (keyword classifier) or "recorded" (reuse stored classifications)
+            confidence_threshold: candidate manual-review threshold
+            keywords: candidate keyword lists per classification
+            rules: candidate routing rules replacing the active ones
+            sender_history: use sender history shortcuts (default True)
+            workers: worker processes (0 or 1 replays in this process)
+            
+    Returns:
+        Diff report
+    """
+    config = dict(config or {})
+    workers = config.get("workers")
+    if workers is None:
+        workers = REPLAY["workers"] or os.cpu_count() or 1
+    chunk_size = config.get("chunk_size") or REPLAY["chunk_size"]
+    report = ReplayReport(config.get("sample_size") or REPLAY["sample_size"])
+    
+    start = time.monotonic()
+    chunks = stream_emails(db, config, chunk_size)
+    if workers <= 1:
+        state = ReplayState(db, config)
+        for rows in chunks:
+            for result in replay_chunk(rows, state):
+                report.add(result)
+    else:
+        database_url = db.get_bind().url.render_as_string(hide_password=False)
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                 initargs=(database_url, config)) as executor:
+            # Keep a bounded number of chunks in flight so memory stays flat
+            pending = set()
+            for rows in chunks:
+                pending.add(executor.submit(replay_chunk, rows))
+                if len(pending) >= workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        for result in future.result():
+                            report.add(result)
+            for future in pending:
+                for result in future.result():
+                    report.add(result)
+    
+    summary = report.to_dict(time.monotonic() - start)
+    logger.info(f"Replayed {summary['emails']} emails, {summary['changed']} decisions changed")
+    return summary
+
+def parse_config(options: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert ISO date strings in a replay configuration to datetimes"""
+    config = dict(options)
+    for key in ("start_date", "end_date"):
+        if isinstance(config.get(key), str):
+            config[key] = datetime.datetime.fromisoformat(config[key])
+    return config
+
+def main():
+    from app.utils.db import SessionLocal
+    
+    parser = argparse.ArgumentParser(description="Replay stored emails and report changed routing decisions")
+    parser.add_argument("--start-date", help="Replay emails received at or after this ISO date")
+    parser.add_argument("--end-date", help="Replay emails received at or before this ISO date")
+    parser.add_argument("--client-id", type=int)
+    parser.add_argument("--limit", type=int)
+    parser.add_argument("--source", choices=["db", "raw"], default="db")
+    parser.add_argument("--classifier", choices=["local", "recorded"], default="local")
+    parser.add_argument("--confidence-threshold", type=float)
+    parser.add_argument("--rules", help="JSON file with candidate routing rules")
+    parser.add_argument("--keywords", help="JSON file with candidate keyword lists")
+    parser.add_argument("--no-sender-history", action="store_true")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--output", help="Write the report to this file instead of stdout")
+    args = parser.parse_args()
+    
+    config = parse_config({
+        "start_date": args.start_date,
+        "end_date": args.end_date,
+        "client_id": args.client_id,
+        "limit": args.limit,
+        "source": args.source,
+        "classifier": args.classifier,
+        "confidence_threshold": args.confidence_threshold,
+        "sender_history": not args.no_sender_history,
+        "workers": args.workers,
+    })
+    for key in ("rules", "keywords"):
+        path = getattr(args, key)
+        if path:
+            with open(path) as f:
+                config[key] = json.load(f)
+    
+    db = SessionLocal()
+    try:
+        report = run_replay(db, config)
+    finally:
+        db.close()
+    
+    output = json.dumps(report, indent=2, default=str)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
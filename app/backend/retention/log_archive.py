@@ -0,0 +1,346 @@
+"""
+Log retention and archival for Smart Inbox Application
+
+Logs are kept in monthly segments. On PostgreSQL the logs table is
+partitioned by month on timestamp, so an expired segment is exported and
+its partition dropped. On SQLite, which has no partitioning, an expired
+segment is exported and deleted in batches. Exported segments are gzip
+compressed JSONL files that search_archive() can still query.
+"""
+
+import datetime
+import glob
+import gzip
+import json
+import logging
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func, select, text
+
+from app.config.settings import LOG_RETENTION
+from app.models.models import Log
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_PATTERN = re.compile(r"^logs-(\d{4})-(\d{2})(?:\.\d+)?\.jsonl\.gz$")
+
+def month_start(value: datetime.datetime) -> datetime.datetime:
+    """Get the start of the month containing a timestamp"""
+    return datetime.datetime(value.year, value.month, 1)
+
+def next_month(value: datetime.datetime) -> datetime.datetime:
+    """Get the start of the month after the month starting at `value`"""
+    return datetime.datetime(value.year + value.month // 12, value.month % 12 + 1, 1)
+
+def partition_name(start: datetime.datetime) -> str:
+    """Name of the PostgreSQL partition holding the month starting at `start`"""
+    return f"logs_p{start:%Y%m}"
+
+def is_partitioned(connection) -> bool:
+    """Check whether the logs table is a PostgreSQL partitioned table"""
+    if connection.dialect.name != "postgresql":
+        return False
+    kind = connection.execute(text("SELECT relkind FROM pg_class WHERE oid = to_regclass('logs')")).scalar()
+    return kind == "p"
+
+def create_partition(connection, start: datetime.datetime):
+    """Create the monthly partition starting at `start` if it does not exist"""
+    connection.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {partition_name(start)} PARTITION OF logs "
+        f"FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{next_month(start):%Y-%m-%d}')"
+    ))
+
+def ensure_partitions(engine, now: Optional[datetime.datetime] = None) -> int:
+    """
+    Create the current and upcoming monthly partitions on PostgreSQL
+    
+    Rows outside every partition land in the default partition, so this
+    only has to run ahead of the calendar, not before each insert.
+    
+    Args:
+        engine: Database engine
+        now: Current time (defaults to utcnow)
+        
+    Returns:
+        Number of months covered
+    """
+    now = now or datetime.datetime.utcnow()
+    with engine.begin() as connection:
+        if not is_partitioned(connection):
+            return 0
+        start = month_start(now)
+        for _ in range(LOG_RETENTION["premake_months"] + 1):
+            create_partition(connection, start)
+            start = next_month(start)
+    return LOG_RETENTION["premake_months"] + 1
+
+def partition_logs(engine):
+    """
+    Convert the logs table to a table partitioned by month on PostgreSQL
+    
+    The existing rows are copied inside one transaction, so the table is
+    locked while the migration runs. Other databases are left unchanged.
+    
+    Args:
+        engine: Database engine
+    """
+    if engine.dialect.name != "postgresql":
+        return
+    
+    with engine.begin() as connection:
+        if is_partitioned(connection):
+            return
+        oldest = connection.execute(text("SELECT min(timestamp) FROM logs")).scalar()
+        
+        connection.execute(text("ALTER TABLE logs RENAME TO logs_legacy"))
+        connection.execute(text("CREATE TABLE logs (LIKE logs_legacy INCLUDING DEFAULTS) PARTITION BY RANGE (timestamp)"))
+        connection.execute(text("ALTER SEQUENCE logs_id_seq OWNED BY logs.id"))
+        connection.execute(text("CREATE TABLE logs_default PARTITION OF logs DEFAULT"))
+        
+        start = month_start(oldest or datetime.datetime.utcnow())
+        end = month_start(datetime.datetime.utcnow())
+        for _ in range(LOG_RETENTION["premake_months"]):
+            end = next_month(end)
+        while start <= end:
+            create_partition(connection, start)
+            start = next_month(start)
+        
+        connection.execute(text("INSERT INTO logs SELECT * FROM logs_legacy"))
+        connection.execute(text("DROP TABLE logs_legacy"))
+        
+        connection.execute(text("ALTER TABLE logs ADD FOREIGN KEY (email_id) REFERENCES emails (id)"))
+        connection.execute(text("CREATE INDEX ix_logs_id ON logs (id)"))
+        for index in Log.__table__.indexes:
+            index.create(bind=connection)
+
+def segment_path(archive_dir: str, start: datetime.datetime) -> str:
+    """
+    Get a new archive file path for a month
+    
+    A month archived again (rows that arrived late) gets a numbered file
+    next to the earlier one.
+    
+    Args:
+        archive_dir: Archive directory
+        start: Start of the month
+        
+    Returns:
+        Path that does not exist yet
+    """
+    base = os.path.join(archive_dir, f"logs-{start:%Y-%m}")
+    path = f"{base}.jsonl.gz"
+    number = 0
+    while os.path.exists(path):
+        number += 1
+        path = f"{base}.{number}.jsonl.gz"
+    return path
+
+def serialize_row(row) -> Dict:
+    """Convert a log row mapping to JSON-compatible values"""
+    return {
+        key: value.isoformat() if isinstance(value, datetime.datetime) else value
+        for key, value in row.items()
+    }
+
+def export_segment(engine, start: datetime.datetime, end: datetime.datetime, archive_dir: str) -> Tuple[Optional[str], int, Optional[int]]:
+    """
+    Write the logs of a time range to a compressed JSONL file
+    
+    The file is written under a temporary name and renamed once complete,
+    so a crash never leaves a partial segment behind.
+    
+    Args:
+        engine: Database engine
+        start: Range start (inclusive)
+        end: Range end (exclusive)
+        archive_dir: Archive directory
+        
+    Returns:
+        Tuple of (file path or None when the range is empty, row count, highest exported ID)
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    table = Log.__table__
+    query = (
+        select(table)
+        .where(table.c.timestamp >= start, table.c.timestamp < end)
+        .order_by(table.c.id)
+    )
+    
+    path = segment_path(archive_dir, start)
+    temp_path = f"{path}.tmp"
+    count = 0
+    max_id = None
+    with engine.connect() as connection, gzip.open(temp_path, "wt", encoding="utf-8") as archive:
+        result = connection.execution_options(stream_results=True, yield_per=1000).execute(query)
+        for row in result.mappings():
+            archive.write(json.dumps(serialize_row(row)) + "\n")
+            count += 1
+            max_id = row["id"]
+    
+    if not count:
+        os.remove(temp_path)
+        return None, 0, None
+    os.replace(temp_path, path)
+    return path, count, max_id
+
+def drop_segment(engine, start: datetime.datetime, end: datetime.datetime, max_id: int) -> int:
+    """
+    Remove an exported time range from the logs table
+    
+    The month's partition is detached and dropped when there is one; any
+    rows left for the range (such as rows in the default partition) are
+    deleted in batches of at most delete_batch_size rows.
+    
+    Args:
+        engine: Database engine
+        start: Range start (inclusive)
+        end: Range end (exclusive)
+        max_id: Highest exported ID; newer rows are kept for the next run
+        
+    Returns:
+        Number of rows deleted in batches
+    """
+    with engine.begin() as connection:
+        if is_partitioned(connection):
+            name = partition_name(start)
+            exists = connection.execute(text(f"SELECT to_regclass('{name}')")).scalar()
+            if exists:
+                connection.execute(text(f"LOCK TABLE {name} IN ACCESS EXCLUSIVE MODE"))
+            # Keep a partition that received rows after the export; the batched delete handles it
+            late = exists and connection.execute(text(f"SELECT 1 FROM {name} WHERE id > {int(max_id)} LIMIT 1")).scalar()
+            if exists and not late:
+                connection.execute(text(f"ALTER TABLE logs DETACH PARTITION {name}"))
+                connection.execute(text(f"DROP TABLE {name}"))
+    
+    table = Log.__table__
+    deleted = 0
+    while True:
+        batch = (
+            select(table.c.id)
+            .where(table.c.timestamp >= start, table.c.timestamp < end, table.c.id <= max_id)
+            .limit(LOG_RETENTION["delete_batch_size"])
+        )
+        with engine.begin() as connection:
+            result = connection.execute(table.delete().where(table.c.id.in_(batch.scalar_subquery())))
+        if not result.rowcount:
+            return deleted
+        deleted += result.rowcount
+
+def run_retention(engine, now: Optional[datetime.datetime] = None, archive_dir: Optional[str] = None) -> Dict:
+    """
+    Archive and remove every month that is entirely past the retention window
+    
+    Args:
+        engine: Database engine
+        now: Current time (defaults to utcnow)
+        archive_dir: Archive directory (defaults to the configured one)
+        
+    Returns:
+        Summary with the archived segments and row counts
+    """
+    now = now or datetime.datetime.utcnow()
+    archive_dir = archive_dir or LOG_RETENTION["archive_dir"]
+    cutoff = month_start(now - datetime.timedelta(days=LOG_RETENTION["retention_days"]))
+    
+    with engine.connect() as connection:
+        oldest = connection.execute(select(func.min(Log.__table__.c.timestamp))).scalar()
+    
+    summary = {"segments": [], "archived": 0}
+    start = month_start(oldest) if oldest else cutoff
+    while start < cutoff:
+        end = next_month(start)
+        path, count, max_id = export_segment(engine, start, end, archive_dir)
+        if path:
+            drop_segment(engine, start, end, max_id)
+            summary["segments"].append(os.path.basename(path))
+            summary["archived"] += count
+            logger.info(f"Archived {count} logs from {start:%Y-%m} to {path}")
+        start = end
+    
+    ensure_partitions(engine, now)
+    return summary
+
+def archived_months(archive_dir: str) -> Dict[datetime.datetime, List[str]]:
+    """
+    List archive files by month
+    
+    Args:
+        archive_dir: Archive directory
+        
+    Returns:
+        Month start -> archive file paths
+    """
+    months = {}
+    for path in glob.glob(os.path.join(archive_dir, "logs-*.jsonl.gz")):
+        match = SEGMENT_PATTERN.match(os.path.basename(path))
+        if match:
+            start = datetime.datetime(int(match.group(1)), int(match.group(2)), 1)
+            months.setdefault(start, []).append(path)
+    return months
+
+def search_archive(filters: Dict, limit: int, before: Optional[Tuple[datetime.datetime, int]] = None,
+                   archive_dir: Optional[str] = None) -> List[Dict]:
+    """
+    Search archived logs, newest first
+    
+    Only the months overlapping the requested date range are read, newest
+    month first, stopping once `limit` rows are found.
+    
+    Args:
+        filters: Optional email_id, action, status, start_date and end_date
+        limit: Maximum number of rows
+        before: Only rows sorting before this (timestamp, id) key
+        archive_dir: Archive directory (defaults to the configured one)
+        
+    Returns:
+        Archived log dicts ordered by (timestamp, id) descending
+    """
+    archive_dir = archive_dir or LOG_RETENTION["archive_dir"]
+    start_date = filters.get("start_date")
+    end_date = filters.get("end_date")
+    if before and (end_date is None or before[0] < end_date):
+        end_date = before[0]
+    
+    matches = []
+    for start, paths in sorted(archived_months(archive_dir).items(), reverse=True):
+        if len(matches) >= limit:
+            break
+        if end_date and start > end_date:
+            continue
+        if start_date and next_month(start) <= start_date:
+            break
+        for path in paths:
+            with gzip.open(path, "rt", encoding="utf-8") as archive:
+                for line in archive:
+                    row = json.loads(line)
+                    row["timestamp"] = datetime.datetime.fromisoformat(row["timestamp"]) if row["timestamp"] else None
+                    if row_matches(row, filters, before):
+                        row["archived"] = True
+                        matches.append(row)
+    
+    matches.sort(key=lambda row: (row["timestamp"], row["id"]), reverse=True)
+    return matches[:limit]
+
+def row_matches(row: Dict, filters: Dict, before: Optional[Tuple[datetime.datetime, int]]) -> bool:
+    """Check an archived row against the log filters and the page cursor"""
+    timestamp = row["timestamp"]
+    if timestamp is None:
+        return False
+    for field in ("email_id", "action", "status"):
+        if filters.get(field) is not None and row.get(field) != filters[field]:
+            return False
+    if filters.get("start_date") and timestamp < filters["start_date"]:
+        return False
+    if filters.get("end_date") and timestamp > filters["end_date"]:
+        return False
+    if before and (timestamp, row["id"]) >= tuple(before):
+        return False
+    return True
+
+if __name__ == "__main__":
+    from app.utils.db import engine
+    
+    logging.basicConfig(level=logging.INFO)
+    print(f"Log retention: {run_retention(engine)}")
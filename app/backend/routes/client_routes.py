@@ -2,13 +2,14 @@
 Client routes for Smart Inbox Application
 """
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
 from typing import List, Dict, Any
-import json
 
 from app.models.models import Client, RoutingRule
-from app.utils.db import get_db
+from app.backend.routes.rule_table import routing_rule_table
+from app.utils.db import get_db, get_read_db
+from app.utils.pagination import keyset_page
 
 router = APIRouter(
     prefix="/clients",
@@ -17,15 +18,34 @@ router = APIRouter(
 )
 
 @router.get("/", response_model=List[Dict[str, Any]])
-async def get_clients(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def get_clients(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: str = None,
+    db: Session = Depends(get_read_db)
+):
     """
     Get list of clients
+    
+    Pages are keyed on id: pass the X-Next-Cursor response header as
+    `cursor` to get the next page. `skip` is kept for older clients.
     """
-    clients = db.query(Client).offset(skip).limit(limit).all()
+    # Legacy offset pagination
+    if skip and not cursor:
+        return db.query(Client).offset(skip).limit(limit).all()
+    
+    try:
+        clients, next_cursor = keyset_page(db.query(Client), [Client.id], cursor, limit, descending=False)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return clients
 
 @router.post("/", response_model=Dict[str, Any])
-async def create_client(client_data: Dict[str, Any], db: Session = Depends(get_db)):
+def create_client(client_data: Dict[str, Any], db: Session = Depends(get_db)):
     """
     Create a new client
     """
@@ -43,7 +63,7 @@ async def create_client(client_data: Dict[str, Any], db: Session = Depends(get_d
     return client
 
 @router.get("/{client_id}", response_model=Dict[str, Any])
-async def get_client(client_id: int, db: Session = Depends(get_db)):
+def get_client(client_id: int, db: Session = Depends(get_db)):
     """
     Get details of a specific client
     """
@@ -53,7 +73,7 @@ async def get_client(client_id: int, db: Session = Depends(get_db)):
     return client
 
 @router.put("/{client_id}", response_model=Dict[str, Any])
-async def update_client(client_id: int, client_data: Dict[str, Any], db: Session = Depends(get_db)):
+def update_client(client_id: int, client_data: Dict[str, Any], db: Session = Depends(get_db)):
     """
     Update client details
     """
@@ -76,7 +96,7 @@ async def update_client(client_id: int, client_data: Dict[str, Any], db: Session
     return client
 
 @router.delete("/{client_id}", response_model=Dict[str, Any])
-async def delete_client(client_id: int, db: Session = Depends(get_db)):
+def delete_client(client_id: int, db: Session = Depends(get_db)):
     """
     Delete a client
     """
@@ -95,10 +115,14 @@ async def delete_client(client_id: int, db: Session = Depends(get_db)):
     db.delete(client)
     db.commit()
     
+    # Drop the client's rules from the compiled decision table
+    if rules:
+        routing_rule_table.load(db)
+    
     return {"status": "success", "message": "Client deleted successfully"}
 
 @router.get("/{client_id}/routing-rules", response_model=List[Dict[str, Any]])
-async def get_client_routing_rules(client_id: int, db: Session = Depends(get_db)):
+def get_client_routing_rules(client_id: int, db: Session = Depends(get_db)):
     """
     Get routing rules for a specific client
     """
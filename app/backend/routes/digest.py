@@ -0,0 +1,232 @@
+"""
+Digest batching of outbound forwards and GitHub issues for Smart Inbox Application
+
+When a destination runs out of rate limit tokens during a burst, the
+routing engine hands further emails for it to a DigestBuffer instead of
+deferring them. Buffered emails are sent together once the destination's
+window has elapsed or the digest is full: one forwarded digest email per
+contact, or one comment (or one new issue) per GitHub repository. A storm
+therefore costs one outbound call per destination and window.
+
+The buffer itself only lives in memory. Buffered emails are stored with
+status "digest_pending" and a next_attempt_at past the window, and are
+only marked processed once their digest was sent, so emails of a digest
+lost with the process are routed again by the retry scheduler.
+"""
+
+import datetime
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.config.settings import RETRY, ROUTING
+from app.backend.pipeline.ingestion import apply_digest_result, load_emails
+from app.utils.db import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Statuses of emails whose routing is finished elsewhere; their digest entries are dropped
+SETTLED_STATUSES = ("processed", "dead_letter", "filtered")
+
+class Digest:
+    """Emails buffered for one destination"""
+    
+    def __init__(self, kind: str, destination: str):
+        self.kind = kind
+        self.destination = destination
+        self.entries: "OrderedDict[int, Tuple[Dict, Dict, float]]" = OrderedDict()  # Email ID -> (email_data, client_data, added at)
+        self.started = time.monotonic()
+
+class DigestBuffer:
+    """Per-destination buffers of emails, flushed by a background thread"""
+    
+    def __init__(self, send: Callable[[Digest], Dict], window: Optional[float] = None,
+                 max_items: Optional[int] = None, session_factory: Optional[Callable] = None):
+        """
+        Initialize the buffer
+        
+        Args:
+            send: Sends a digest, returning a result with success, reference and message
+            window: Seconds a digest collects emails before it is sent
+            max_items: Emails after which a digest is sent without waiting
+            session_factory: Creates the database sessions used to record sent digests
+        """
+        self.send = send
+        self.window = window or ROUTING["digest"]["window"]
+        self.max_items = max_items or ROUTING["digest"]["max_items"]
+        self.session_factory = session_factory or SessionLocal
+        # Buffered emails are left to the retry scheduler after this long
+        self.hold_seconds = self.window + RETRY["lease_seconds"]
+        self.digests: "OrderedDict[Tuple[str, str], Digest]" = OrderedDict()
+        self.condition = threading.Condition()
+        self.flush_lock = threading.Lock()
+        self.thread: Optional[threading.Thread] = None
+        self.stopping = False
+    
+    def add(self, kind: str, destination: str, email_data: Dict, client_data: Dict) -> Dict:
+        """
+        Add an email to the digest of its destination
+        
+        Args:
+            kind: "email_forward" or "github_issue"
+            destination: Email address or repository
+            email_data: Email data dictionary
+            client_data: Client data dictionary
+            
+        Returns:
+            Routing result for the email, with status "digest_pending"
+        """
+        with self.condition:
+            key = (kind, destination.lower())
+            digest = self.digests.get(key)
+            if digest is None:
+                digest = self.digests[key] = Digest(kind, destination)
+            # An email routed again by the retry scheduler replaces its earlier entry
+            digest.entries.pop(email_data["id"], None)
+            digest.entries[email_data["id"]] = (email_data, client_data, time.monotonic())
+            count = len(digest.entries)
+            if self.thread is None and not self.stopping:
+                self.thread = threading.Thread(target=self.run, name="routing-digest", daemon=True)
+                self.thread.start()
+            if count >= self.max_items:
+                self.condition.notify()
+        
+        return {
+            "success": True,
+            "action": kind,
+            "destination": destination,
+            "status": "digest_pending",
+            "retry_after": self.hold_seconds,
+            "message": f"Added to digest for {destination} ({count} emails)"
+        }
+    
+    def due(self, force: bool = False) -> List[Digest]:
+        """Remove and return the digests whose window has elapsed or that are full"""
+        now = time.monotonic()
+        with self.condition:
+            keys = [
+                key for key, digest in self.digests.items()
+                if force or now - digest.started >= self.window or len(digest.entries) >= self.max_items
+            ]
+            return [self.digests.pop(key) for key in keys]
+    
+    def flush(self, force: bool = False) -> int:
+        """
+        Send due digests and record the outcome on their emails
+        
+        Only emails already stored as "digest_pending" are sent; emails whose
+        routing result is not stored yet stay buffered for the next flush.
+        Emails of a digest that fails to send are scheduled for a retry.
+        
+        Args:
+            force: Send every digest regardless of its window
+            
+        Returns:
+            Number of emails sent
+        """
+        sent = 0
+        with self.flush_lock:
+            for digest in self.due(force):
+                db = self.session_factory()
+                try:
+                    sent += self.flush_digest(db, digest)
+                except Exception as e:
+                    db.rollback()
+                    logger.error(f"Error sending digest to {digest.destination}: {str(e)}")
+                    self.requeue(digest)
+                finally:
+                    db.close()
+        return sent
+    
+    def flush_digest(self, db, digest: Digest) -> int:
+        """
+        Send one digest with the emails that are ready and record the result
+        
+        Args:
+            db: Database session
+            digest: Digest taken from the buffer
+            
+        Returns:
+            Number of emails sent
+        """
+        emails = load_emails(db, list(digest.entries))
+        now = time.monotonic()
+        waiting = Digest(digest.kind, digest.destination)
+        waiting.started = digest.started  # Sent with the next flush once stored
+        ready = []
+        for email_id, entry in digest.entries.items():
+            email = emails.get(email_id)
+            if email is None or email.status in SETTLED_STATUSES:
+                continue
+            if email.status == "digest_pending":
+                ready.append(email)
+            elif now - entry[2] < self.hold_seconds:
+                waiting.entries[email_id] = entry
+        if waiting.entries:
+            self.requeue(waiting)
+        if not ready:
+            return 0
+        
+        digest.entries = OrderedDict((email.id, digest.entries[email.id]) for email in ready)
+        try:
+            result = self.send(digest)
+        except Exception as e:
+            logger.error(f"Error sending digest to {digest.destination}: {str(e)}")
+            result = {"success": False, "message": f"Error sending digest: {str(e)}"}
+        apply_digest_result(db, ready, result, datetime.datetime.utcnow())
+        return len(ready) if result["success"] else 0
+    
+    def requeue(self, digest: Digest):
+        """Put the entries of a digest back in front of the destination's buffer"""
+        with self.condition:
+            key = (digest.kind, digest.destination.lower())
+            current = self.digests.get(key)
+            if current is not None:
+                for email_id, entry in current.entries.items():
+                    digest.entries.setdefault(email_id, entry)
+            self.digests[key] = digest
+    
+    def run(self):
+        """Background loop flushing digests as their windows elapse"""
+        while True:
+            with self.condition:
+                if not self.stopping:
+                    self.condition.wait(min(self.window, 1.0))
+                stopping = self.stopping
+            self.flush()
+            if stopping:
+                return
+    
+    def close(self, timeout: float = 5):
+        """
+        Stop the background thread and send every buffered digest
+        
+        Args:
+            timeout: Seconds to wait for the background thread
+        """
+        with self.condition:
+            self.stopping = True
+            thread = self.thread
+            self.condition.notify()
+        if thread is not None:
+            thread.join(timeout)
+        self.flush(force=True)
+        with self.condition:
+            left = sum(len(digest.entries) for digest in self.digests.values())
+            self.digests.clear()
+            self.thread = None
+            self.stopping = False
+        if left:
+            logger.warning(f"{left} emails buffered for digests were not sent; the retry scheduler will route them")
+    
+    def pending(self) -> Dict[str, int]:
+        """
+        Count buffered emails per destination
+        
+        Returns:
+            "kind:destination" -> buffered emails
+        """
+        with self.condition:
+            return {f"{digest.kind}:{digest.destination}": len(digest.entries) for digest in self.digests.values()}
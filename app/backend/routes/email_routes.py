@@ -2,14 +2,26 @@
 Email routes for Smart Inbox Application
 """
 
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy.orm import Session, undefer_group
 from typing import List, Dict, Any
+import datetime
 
-from app.models.models import Email
+from app.models.models import Email, Client, Log
 from app.backend.email.email_handler import get_email_handler
+from app.backend.email.poller import MailboxPoller
+from app.backend.email.prefilter import EmailPrefilter
+from app.backend.email.raw_archive import raw_archive
+from app.backend.pipeline.ingestion import IngestionPipeline, apply_routing_result
+from app.backend.pipeline.retry import RetryScheduler
+from app.backend.queue.job_queue import job_queue
+from app.backend.search.email_search import search_emails
 from app.backend.routes.routing_engine import RoutingEngine
-from app.utils.db import get_db
+from app.backend.routes.rule_table import routing_rule_table
+from app.config.settings import QUEUE
+from app.utils.db import get_db, get_read_db, engine, SessionLocal
+from app.utils.log_sink import audit_log
+from app.utils.pagination import keyset_page
 
 router = APIRouter(
     prefix="/emails",
@@ -17,50 +29,138 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
-# Initialize routing engine
+# Initialize routing engine and ingestion pipeline
 routing_engine = RoutingEngine()
+ingestion_pipeline = IngestionPipeline(routing_engine, EmailPrefilter(), log_sink=audit_log, raw_archive=raw_archive)
+retry_scheduler = RetryScheduler(ingestion_pipeline)
+
+# Mailbox poller, syncing from whichever process holds the mailbox lock
+def sync_mailbox(db: Session):
+    """
+    Fetch the mailbox and retry failed emails inline, or hand both to queue workers
+    """
+    if QUEUE["enabled"]:
+        job_queue.enqueue_once(db, "fetch_mailbox")
+        job_queue.enqueue_once(db, "retry_emails")
+    else:
+        process_incoming_emails(db)
+        retry_failed_emails(db)
+
+mailbox_poller = MailboxPoller(SessionLocal, engine, sync_mailbox)
+
+# Columns returned by list endpoints; bodies are only returned by GET /emails/{id}
+EMAIL_LIST_COLUMNS = (
+    Email.id,
+    Email.message_id,
+    Email.sender,
+    Email.recipient,
+    Email.subject,
+    Email.received_at,
+    Email.client_id,
+    Email.classification,
+    Email.confidence_score,
+    Email.routing_action,
+    Email.action_reference,
+    Email.status,
+    Email.error_message,
+    Email.processed_at,
+)
+
+RECEIVE_MESSAGES = {
+    "started": "Email reception process started",
+    "coalesced": "Email reception already running, a follow-up sync is scheduled",
+    "leader_elsewhere": "Email reception is handled by another instance",
+}
 
 @router.get("/", response_model=List[Dict[str, Any]])
-async def get_emails(
+def get_emails(
+    response: Response,
     skip: int = 0, 
     limit: int = 100, 
     status: str = None,
-    db: Session = Depends(get_db)
+    cursor: str = None,
+    db: Session = Depends(get_read_db)
 ):
     """
     Get list of emails with optional filtering
+    
+    Pages are keyed on (received_at, id): pass the X-Next-Cursor response
+    header as `cursor` to get the next page. `skip` is kept for older clients.
+    Served from a read replica when configured; for a few seconds after a
+    client's write (or with X-Read-Primary) it is served from the primary.
     """
-    query = db.query(Email)
+    query = db.query(*EMAIL_LIST_COLUMNS)
     
     if status:
         query = query.filter(Email.status == status)
     
-    emails = query.order_by(Email.received_at.desc()).offset(skip).limit(limit).all()
-    return emails
+    # Legacy offset pagination
+    if skip and not cursor:
+        emails = query.order_by(Email.received_at.desc()).offset(skip).limit(limit).all()
+        return [email._asdict() for email in emails]
+    
+    try:
+        emails, next_cursor = keyset_page(query, [Email.received_at, Email.id], cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return [email._asdict() for email in emails]
+
+@router.get("/search", response_model=List[Dict[str, Any]])
+def search(
+    q: str,
+    client_id: int = None,
+    classification: str = None,
+    start_date: datetime.datetime = None,
+    end_date: datetime.datetime = None,
+    limit: int = 20,
+    offset: int = 0,
+    db: Session = Depends(get_read_db)
+):
+    """
+    Full-text search over email subject, sender and body
+    
+    Results are ranked by relevance and include a snippet with the matches
+    wrapped in <mark> tags. Declared before /{email_id} so "search" is not
+    taken for an ID.
+    """
+    return search_emails(db, q, client_id, classification, start_date, end_date, limit, offset)
 
 @router.get("/{email_id}", response_model=Dict[str, Any])
-async def get_email(email_id: int, db: Session = Depends(get_db)):
+def get_email(email_id: int, db: Session = Depends(get_db)):
     """
     Get details of a specific email
     """
-    email = db.query(Email).filter(Email.id == email_id).first()
+    email = db.query(Email).options(undefer_group("content")).filter(Email.id == email_id).first()
     if not email:
         raise HTTPException(status_code=404, detail="Email not found")
     return email
 
+@router.get("/{email_id}/raw")
+def get_raw_email(email_id: int):
+    """
+    Download the original RFC822 message of an email
+    """
+    raw = raw_archive.get(email_id)
+    if raw is None:
+        raise HTTPException(status_code=404, detail="Raw message not archived")
+    return Response(content=raw, media_type="message/rfc822")
+
 @router.post("/receive", response_model=Dict[str, Any])
-async def receive_email(background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+def receive_email():
     """
     Webhook for receiving emails
     """
     # This endpoint will be called by external services or scheduled tasks
-    # It will trigger the email reception process in the background
-    background_tasks.add_task(process_incoming_emails, db)
+    # It wakes the mailbox poller; concurrent calls coalesce into one sync
+    sync_status = mailbox_poller.trigger()
     
-    return {"status": "success", "message": "Email reception process started"}
+    return {"status": "success", "message": RECEIVE_MESSAGES[sync_status], "sync": sync_status}
 
 @router.put("/{email_id}/manual-review", response_model=Dict[str, Any])
-async def update_email_after_review(
+def update_email_after_review(
     email_id: int, 
     review_data: Dict[str, Any],
     db: Session = Depends(get_db)
@@ -68,14 +168,14 @@ async def update_email_after_review(
     """
     Update email after manual review
     """
-    email = db.query(Email).filter(Email.id == email_id).first()
+    email = db.query(Email).options(undefer_group("content")).filter(Email.id == email_id).first()
     if not email:
         raise HTTPException(status_code=404, detail="Email not found")
     
     # Update email with review data
     email.classification = review_data.get("classification")
+    email.classification_source = "manual"
     email.client_id = review_data.get("client_id")
-    email.status = "processed"
     
     # Process the email based on the manual review
     client = db.query(Client).filter(Client.id == email.client_id).first()
@@ -83,6 +183,7 @@ async def update_email_after_review(
         raise HTTPException(status_code=404, detail="Client not found")
     
     # Route the email based on the manual classification
+    routing_rule_table.ensure_loaded(db)
     routing_result = routing_engine.route_email(
         email_data={
             "id": email.id,
@@ -103,21 +204,29 @@ async def update_email_after_review(
         classification=email.classification
     )
     
-    # Update email with routing result
-    email.routing_action = routing_result.get("action")
-    email.action_reference = routing_result.get("reference")
-    email.processed_at = datetime.datetime.utcnow()
+    # Manual classifications are ground truth for the sender history and classifier
+    routing_engine.record_classification(
+        {"id": email.id, "sender": email.sender, "body": email.body},
+        email.classification,
+        1.0,
+        "manual"
+    )
+    
+    # Store the routing result as ingestion does, so rate-limited, digest and
+    # failed routings are routed again by the retry scheduler
+    details = f"Manual review completed. Classification: {email.classification}"
+    details += apply_routing_result(email, routing_result)
     
-    # Add log entry
-    log = Log(
+    # Add log entry; reviewers expect it in the email's history right away
+    audit_log.write(
+        db,
+        critical=True,
         email_id=email.id,
         action="manual_review",
-        details=f"Manual review completed. Classification: {email.classification}",
+        details=details,
         status="success" if routing_result.get("success") else "failure",
         error=routing_result.get("message") if not routing_result.get("success") else None
     )
-    
-    db.add(log)
     db.commit()
     
     return {
@@ -126,106 +235,56 @@ async def update_email_after_review(
         "routing_result": routing_result
     }
 
-# Background task for processing incoming emails
-async def process_incoming_emails(db: Session):
+@router.post("/{email_id}/retry", response_model=Dict[str, Any])
+def retry_email(email_id: int, db: Session = Depends(get_db)):
+    """
+    Schedule a failed or dead-lettered email for an immediate retry with a fresh attempt budget
+    """
+    email = db.query(Email).filter(Email.id == email_id).first()
+    if not email:
+        raise HTTPException(status_code=404, detail="Email not found")
+    if email.status not in ("error", "dead_letter"):
+        raise HTTPException(status_code=409, detail=f"Email has status '{email.status}', only failed emails are retried")
+    
+    email.status = "error"
+    email.routing_attempts = 0
+    email.next_attempt_at = datetime.datetime.utcnow()
+    audit_log.write(
+        db,
+        critical=True,
+        email_id=email.id,
+        action="retry",
+        details="Retry requested",
+        status="success"
+    )
+    db.commit()
+    
+    return {"status": "success", "email_id": email.id, "next_attempt_at": email.next_attempt_at}
+
+# Mailbox sync for processing incoming emails
+def process_incoming_emails(db: Session):
     """
     Process incoming emails from configured email services
+    
+    Runs on the mailbox poller thread with its own session, so only one
+    process fetches the mailbox at a time.
     """
     email_handler = get_email_handler()
     
     try:
+        # Warm sender history and classifier state once per process
+        if not routing_engine.warmed:
+            routing_engine.warm(db)
+        routing_rule_table.ensure_loaded(db)
+        
         # Receive emails
         emails = email_handler.receive_emails()
         
-        for email_data in emails:
-            # Check if email already exists
-            existing_email = db.query(Email).filter(Email.message_id == email_data["message_id"]).first()
-            if existing_email:
-                continue
-            
-            # Create new email record
-            email = Email(
-                message_id=email_data["message_id"],
-                sender=email_data["sender"],
-                recipient=email_data["recipient"],
-                subject=email_data["subject"],
-                body=email_data["body"],
-                attachments=email_data.get("attachments", []),
-                received_at=datetime.datetime.utcnow(),
-                status="pending"
-            )
-            
-            db.add(email)
-            db.commit()
-            
-            # Identify client
-            client = identify_client(email_data, db)
-            
-            if client:
-                email.client_id = client.id
-                
-                # Process email with routing engine
-                result = routing_engine.process_email(
-                    email_data={
-                        "id": email.id,
-                        "sender": email.sender,
-                        "recipient": email.recipient,
-                        "subject": email.subject,
-                        "body": email.body,
-                        "attachments": email.attachments
-                    },
-                    client_data={
-                        "id": client.id,
-                        "name": client.name,
-                        "github_repository": client.github_repository,
-                        "technical_contact": client.technical_contact,
-                        "commercial_contact": client.commercial_contact,
-                        "administrative_contact": client.administrative_contact
-                    }
-                )
-                
-                # Update email with processing result
-                email.classification = result.get("classification")
-                email.confidence_score = result.get("confidence")
-                email.routing_action = result.get("action")
-                email.action_reference = result.get("reference")
-                
-                if result.get("action") == "manual_review":
-                    email.status = "pending"
-                else:
-                    email.status = "processed" if result.get("success") else "error"
-                    email.error_message = result.get("message") if not result.get("success") else None
-                    email.processed_at = datetime.datetime.utcnow()
-                
-                # Add log entry
-                log = Log(
-                    email_id=email.id,
-                    action="processing",
-                    details=f"Email processed. Classification: {email.classification}, Action: {email.routing_action}",
-                    status="success" if result.get("success") else "failure",
-                    error=result.get("message") if not result.get("success") else None
-                )
-                
-                db.add(log)
-            else:
-                # No client identified, mark for manual review
-                email.status = "pending"
-                email.routing_action = "manual_review"
-                
-                # Add log entry
-                log = Log(
-                    email_id=email.id,
-                    action="client_identification",
-                    details="No client identified for this email",
-                    status="failure",
-                    error="Unable to identify client"
-                )
-                
-                db.add(log)
-            
-            db.commit()
+        ingestion_pipeline.run(db, emails)
     
     except Exception as e:
+        db.rollback()
+        
         # Log error
         log = Log(
             action="email_reception",
@@ -237,29 +296,26 @@ async def process_incoming_emails(db: Session):
         db.add(log)
         db.commit()
 
-# Helper function to identify client
-def identify_client(email_data, db):
-    """
-    Identify client based on email data
+def retry_failed_emails(db: Session):
     """
-    # Get all clients
-    clients = db.query(Client).all()
+    Route failed emails again once their backoff has elapsed
     
-    # Check by email domain
-    sender_domain = email_data["sender"].split('@')[-1]
-    for client in clients:
-        # Check domains
-        if client.domains and sender_domain in client.domains:
-            return client
+    Runs after each mailbox sync on the poller thread.
+    """
+    try:
+        if not routing_engine.warmed:
+            routing_engine.warm(db)
+        routing_rule_table.ensure_loaded(db)
+        retry_scheduler.run(db)
+    except Exception as e:
+        db.rollback()
         
-        # Check authorized emails
-        if client.authorized_emails and email_data["sender"] in client.authorized_emails:
-            return client
+        log = Log(
+            action="retry",
+            details="Error retrying failed emails",
+            status="failure",
+            error=str(e)
+        )
         
-        # Check signature patterns
-        if client.signature_patterns and email_data["body"]:
-            for pattern in client.signature_patterns:
-                if re.search(pattern, email_data["body"]):
-                    return client
-    
-    return None
+        db.add(log)
+        db.commit()
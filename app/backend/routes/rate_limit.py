@@ -0,0 +1,71 @@
+"""
+Per-destination rate limits for outbound routing calls for Smart Inbox Application
+"""
+
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+class TokenBucket:
+    """Token bucket allowing bursts of `burst` calls and `rate` calls per second on average"""
+    
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def try_acquire(self) -> float:
+        """
+        Take a token if one is available
+        
+        Returns:
+            0 if a token was taken, otherwise seconds until the next token
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+class RateLimiter:
+    """Token buckets per (kind, destination), created on first use"""
+    
+    def __init__(self, limits: Dict[str, Dict[str, float]]):
+        """
+        Args:
+            limits: Kind -> {"rate": tokens per second, "burst": bucket size};
+                kinds without an entry are not limited
+        """
+        self.limits = limits
+        self._buckets: Dict[Tuple[str, str], TokenBucket] = {}
+        self._lock = threading.Lock()
+    
+    def bucket(self, kind: str, destination: str) -> Optional[TokenBucket]:
+        limit = self.limits.get(kind)
+        if not limit:
+            return None
+        key = (kind, destination.lower())
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(limit["rate"], limit["burst"])
+            return bucket
+    
+    def try_acquire(self, kind: str, destination: str) -> float:
+        """
+        Take a token for a call to a destination without waiting
+        
+        Args:
+            kind: Kind of call, e.g. "email_forward"
+            destination: Email address or repository the call goes to
+            
+        Returns:
+            0 if the call may go ahead, otherwise seconds until the next token
+        """
+        bucket = self.bucket(kind, destination)
+        return bucket.try_acquire() if bucket is not None else 0.0
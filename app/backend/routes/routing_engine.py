@@ -3,11 +3,18 @@ Email routing module for Smart Inbox Application
 """
 
 import logging
+import threading
+import time
 from typing import Dict, Optional, Tuple
 
 from app.backend.email.email_handler import get_email_handler
 from app.backend.github.github_handler import GitHubHandler
 from app.backend.ai.classifier import get_ai_classifier
+from app.backend.ai.sender_history import SenderHistory
+from app.backend.routes.digest import Digest, DigestBuffer
+from app.backend.routes.rate_limit import RateLimiter
+from app.backend.routes.rule_table import CompiledRule, routing_rule_table
+from app.config.settings import ROUTING
 
 logger = logging.getLogger(__name__)
 
@@ -19,6 +26,24 @@ class RoutingEngine:
         self.email_handler = get_email_handler()
         self.github_handler = GitHubHandler()
         self.ai_classifier = get_ai_classifier()
+        self.sender_history = SenderHistory()
+        self.rule_table = routing_rule_table
+        self.warmed = False
+        self.rate_limiter = RateLimiter(ROUTING["rate_limits"])
+        self.digest = DigestBuffer(self.send_digest) if ROUTING["digest"]["enabled"] else None
+        self.recent_issues = {}  # Repository -> (issue number, issue URL, creation time) for digest comments
+        self._issues_lock = threading.Lock()
+    
+    def warm(self, db):
+        """
+        Load classification history from stored emails
+        
+        Args:
+            db: Database session
+        """
+        self.sender_history.load(db)
+        self.ai_classifier.load_history(db)
+        self.warmed = True
     
     def process_email(self, email_data: Dict, client_data: Dict) -> Dict:
         """
@@ -32,35 +57,11 @@ class RoutingEngine:
             Dict with processing results
         """
         try:
-            # Step 1: Classify email
-            classification, confidence = self.classify_email(email_data['body'])
-            
-            # Step 2: Determine if manual review is needed
-            needs_manual_review = confidence < self.ai_classifier.confidence_threshold
+            # Step 1 and 2: Classify email and determine if manual review is needed
+            decision = self.decide(email_data)
             
             # Step 3: Route email based on classification
-            if needs_manual_review:
-                result = {
-                    "success": True,
-                    "action": "manual_review",
-                    "classification": classification,
-                    "confidence": confidence,
-                    "message": "Email flagged for manual review due to low confidence"
-                }
-            else:
-                # Route based on classification
-                routing_result = self.route_email(email_data, client_data, classification)
-                result = {
-                    "success": routing_result["success"],
-                    "action": routing_result["action"],
-                    "classification": classification,
-                    "confidence": confidence,
-                    "destination": routing_result.get("destination"),
-                    "reference": routing_result.get("reference"),
-                    "message": routing_result.get("message")
-                }
-            
-            return result
+            return self.route_decision(email_data, client_data, decision)
         except Exception as e:
             self.logger.error(f"Error processing email: {str(e)}")
             return {
@@ -69,6 +70,80 @@ class RoutingEngine:
                 "message": f"Error processing email: {str(e)}"
             }
     
+    def decide(self, email_data: Dict) -> Dict:
+        """
+        Classify email and determine whether it needs manual review
+        
+        Args:
+            email_data: Email data dictionary
+            
+        Returns:
+            Dict with classification, confidence, classification_source and needs_manual_review
+        """
+        # Skip the classifier for senders with a stable history
+        prediction = self.sender_history.predict(email_data.get('sender', ''))
+        if prediction:
+            classification, confidence = prediction
+            source = "sender_history"
+        else:
+            result = self.classify_email(email_data['body'])
+            classification, confidence = result
+            # Nearest-neighbour votes and fallback guesses name their own source
+            source = getattr(result, "source", "classifier")
+        
+        needs_manual_review = confidence < self.ai_classifier.confidence_threshold
+        
+        # Only primary classifier outcomes feed the history and the classifier,
+        # so a sender's record expires and is re-checked after max_age_days and
+        # neighbour votes are not indexed as labels
+        if source == "classifier" and not needs_manual_review:
+            self.record_classification(email_data, classification, confidence, source)
+        
+        return {
+            "classification": classification,
+            "confidence": confidence,
+            "classification_source": source,
+            "needs_manual_review": needs_manual_review
+        }
+    
+    def route_decision(self, email_data: Dict, client_data: Dict, decision: Dict) -> Dict:
+        """
+        Route email according to a classification decision
+        
+        Args:
+            email_data: Email data dictionary
+            client_data: Client data dictionary
+            decision: Result of decide()
+            
+        Returns:
+            Dict with processing results
+        """
+        if decision["needs_manual_review"]:
+            return {
+                "success": True,
+                "action": "manual_review",
+                "classification": decision["classification"],
+                "confidence": decision["confidence"],
+                "classification_source": decision["classification_source"],
+                "message": "Email flagged for manual review due to low confidence"
+            }
+        
+        # Route based on classification
+        routing_result = self.route_email(email_data, client_data, decision["classification"])
+        return {
+            "success": routing_result["success"],
+            "action": routing_result["action"],
+            "classification": decision["classification"],
+            "confidence": decision["confidence"],
+            "classification_source": decision["classification_source"],
+            "destination": routing_result.get("destination"),
+            "reference": routing_result.get("reference"),
+            "message": routing_result.get("message"),
+            "retryable": routing_result.get("retryable", True),
+            "status": routing_result.get("status"),
+            "retry_after": routing_result.get("retry_after")
+        }
+    
     def classify_email(self, email_body: str) -> Tuple[str, float]:
         """
         Classify email content
@@ -81,10 +156,26 @@ class RoutingEngine:
         """
         return self.ai_classifier.classify_email(email_body)
     
+    def record_classification(self, email_data: Dict, classification: str, confidence: float, source: str):
+        """
+        Record a trusted classification outcome for the sender history and classifier
+        
+        Args:
+            email_data: Email data dictionary
+            classification: Email classification
+            confidence: Confidence score (1.0 for manual review)
+            source: Classification source, "classifier" or "manual"
+        """
+        self.sender_history.record(email_data.get('sender', ''), classification, confidence)
+        self.ai_classifier.learn(email_data.get('body') or '', classification, email_data.get('id'), source)
+    
     def route_email(self, email_data: Dict, client_data: Dict, classification: str) -> Dict:
         """
         Route email based on classification and client data
         
+        Active routing rules for the client and classification take precedence;
+        without a matching rule, the client's configured contacts are used.
+        
         Args:
             email_data: Email data dictionary
             client_data: Client data dictionary
@@ -93,6 +184,10 @@ class RoutingEngine:
         Returns:
             Dict with routing results
         """
+        rule = self.rule_table.match(client_data.get("id"), classification)
+        if rule:
+            return self.apply_rule(rule, email_data, client_data)
+        
         if classification == "technical":
             # Create GitHub issue
             repository = client_data.get("github_repository")
@@ -101,95 +196,233 @@ class RoutingEngine:
                 return {
                     "success": False,
                     "action": "error",
-                    "message": f"No GitHub repository configured for client {client_data['name']}"
+                    "message": f"No GitHub repository configured for client {client_data['name']}",
+                    "retryable": False  # Needs a configuration change, not a retry
                 }
             
-            # Format issue from email
-            issue_data = self.github_handler.format_issue_from_email(email_data, client_data['name'])
-            
-            # Create issue
-            issue_result = self.github_handler.create_issue(
-                title=issue_data["title"],
-                body=issue_data["body"],
-                repository=repository
-            )
-            
-            if issue_result["success"]:
-                return {
-                    "success": True,
-                    "action": "github_issue",
-                    "destination": repository,
-                    "reference": issue_result["issue_url"],
-                    "message": f"Created GitHub issue #{issue_result['issue_number']} in {repository}"
-                }
-            else:
-                return {
-                    "success": False,
-                    "action": "error",
-                    "message": f"Failed to create GitHub issue: {issue_result.get('error')}"
-                }
+            return self.create_github_issue(email_data, client_data, repository)
         
-        elif classification == "commercial":
-            # Forward to commercial contact
-            contact = client_data.get("commercial_contact")
+        elif classification in ("commercial", "administrative"):
+            # Forward to the client's contact for this classification
+            contact = client_data.get(f"{classification}_contact")
             if not contact:
-                self.logger.warning(f"No commercial contact configured for client {client_data['name']}")
+                self.logger.warning(f"No {classification} contact configured for client {client_data['name']}")
                 return {
                     "success": False,
                     "action": "error",
-                    "message": f"No commercial contact configured for client {client_data['name']}"
+                    "message": f"No {classification} contact configured for client {client_data['name']}",
+                    "retryable": False
                 }
             
-            # Forward email
-            forward_result = self.email_handler.forward_email(email_data, contact)
+            return self.forward_email(
+                email_data,
+                contact,
+                f"Forwarded email to {classification} contact: {contact}"
+            )
+        
+        else:
+            # Unknown classification
+            self.logger.warning(f"Unknown classification: {classification}")
+            return {
+                "success": False,
+                "action": "error",
+                "message": f"Unknown classification: {classification}",
+                "retryable": False
+            }
+    
+    def apply_rule(self, rule: CompiledRule, email_data: Dict, client_data: Dict) -> Dict:
+        """
+        Route email according to a compiled routing rule
+        
+        Args:
+            rule: Matching routing rule
+            email_data: Email data dictionary
+            client_data: Client data dictionary
             
-            if forward_result:
-                return {
-                    "success": True,
-                    "action": "email_forward",
-                    "destination": contact,
-                    "message": f"Forwarded email to commercial contact: {contact}"
-                }
-            else:
-                return {
-                    "success": False,
-                    "action": "error",
-                    "message": f"Failed to forward email to {contact}"
-                }
+        Returns:
+            Dict with routing results, including the applied rule_id
+        """
+        if rule.action == "github_issue":
+            result = self.create_github_issue(email_data, client_data, rule.destination)
+        else:
+            result = self.forward_email(
+                email_data,
+                rule.destination,
+                f"Forwarded email to {rule.destination} (routing rule {rule.id})"
+            )
         
-        elif classification == "administrative":
-            # Forward to administrative contact
-            contact = client_data.get("administrative_contact")
-            if not contact:
-                self.logger.warning(f"No administrative contact configured for client {client_data['name']}")
-                return {
-                    "success": False,
-                    "action": "error",
-                    "message": f"No administrative contact configured for client {client_data['name']}"
-                }
+        result["rule_id"] = rule.id
+        return result
+    
+    def create_github_issue(self, email_data: Dict, client_data: Dict, repository: str) -> Dict:
+        """
+        Create a GitHub issue from an email
+        
+        Args:
+            email_data: Email data dictionary
+            client_data: Client data dictionary
+            repository: Repository in format 'owner/repo'
             
-            # Forward email
-            forward_result = self.email_handler.forward_email(email_data, contact)
+        Returns:
+            Dict with routing results
+        """
+        limited = self.limit("github_issue", repository, email_data, client_data)
+        if limited:
+            return limited
+        
+        # Format issue from email
+        issue_data = self.github_handler.format_issue_from_email(email_data, client_data['name'])
+        
+        # Create issue
+        issue_result = self.github_handler.create_issue(
+            title=issue_data["title"],
+            body=issue_data["body"],
+            repository=repository
+        )
+        
+        if issue_result["success"]:
+            with self._issues_lock:
+                self.recent_issues[repository] = (issue_result["issue_number"], issue_result["issue_url"], time.monotonic())
+            return {
+                "success": True,
+                "action": "github_issue",
+                "destination": repository,
+                "reference": issue_result["issue_url"],
+                "message": f"Created GitHub issue #{issue_result['issue_number']} in {repository}"
+            }
+        else:
+            return {
+                "success": False,
+                "action": "error",
+                "message": f"Failed to create GitHub issue: {issue_result.get('error')}"
+            }
+    
+    def forward_email(self, email_data: Dict, destination: str, message: str) -> Dict:
+        """
+        Forward an email to a destination address
+        
+        Args:
+            email_data: Email data dictionary
+            destination: Destination email address
+            message: Result message on success
             
-            if forward_result:
-                return {
-                    "success": True,
-                    "action": "email_forward",
-                    "destination": contact,
-                    "message": f"Forwarded email to administrative contact: {contact}"
-                }
-            else:
-                return {
-                    "success": False,
-                    "action": "error",
-                    "message": f"Failed to forward email to {contact}"
-                }
+        Returns:
+            Dict with routing results
+        """
+        limited = self.limit("email_forward", destination, email_data)
+        if limited:
+            return limited
         
+        forward_result = self.email_handler.forward_email(email_data, destination)
+        
+        if forward_result:
+            return {
+                "success": True,
+                "action": "email_forward",
+                "destination": destination,
+                "message": message
+            }
         else:
-            # Unknown classification
-            self.logger.warning(f"Unknown classification: {classification}")
             return {
                 "success": False,
                 "action": "error",
-                "message": f"Unknown classification: {classification}"
+                "message": f"Failed to forward email to {destination}"
             }
+    
+    def limit(self, kind: str, destination: str, email_data: Dict, client_data: Optional[Dict] = None) -> Optional[Dict]:
+        """
+        Apply the destination's rate limit to an outbound call
+        
+        Args:
+            kind: "email_forward" or "github_issue"
+            destination: Email address or repository
+            email_data: Email data dictionary
+            client_data: Client data dictionary
+            
+        Returns:
+            None if the call may go ahead, otherwise the routing result: the
+            email is added to the destination's digest when digests are
+            enabled, or else deferred until the destination has tokens again.
+            Neither waits, so a throttled email does not hold a route slot.
+        """
+        wait_time = self.rate_limiter.try_acquire(kind, destination)
+        if not wait_time:
+            return None
+        if self.digest is not None:
+            return self.digest.add(kind, destination, email_data, client_data)
+        
+        self.logger.info(f"Rate limit reached for {kind} to {destination}, deferring email")
+        return {
+            "success": False,
+            "action": kind,
+            "destination": destination,
+            "status": "deferred",
+            "retry_after": wait_time,
+            "message": f"Rate limit reached for {destination}"
+        }
+    
+    def send_digest(self, digest: Digest) -> Dict:
+        """
+        Send the buffered emails of one destination with a single call
+        
+        Forwards are sent as one digest email. Issues are added as one
+        comment to the issue last created in the repository within the
+        digest window, or else opened as one new issue.
+        
+        Args:
+            digest: Buffered emails of a destination
+            
+        Returns:
+            Dict with success, destination, reference and message
+        """
+        entries = list(digest.entries.values())
+        count = len(entries)
+        sections = []
+        for email_data, client_data, _ in entries:
+            if digest.kind == "github_issue":
+                sections.append(self.github_handler.format_issue_from_email(email_data, client_data["name"])["body"])
+            else:
+                sections.append(f"From: {email_data['sender']}\nSubject: {email_data['subject']}\n\n{email_data['body']}")
+        
+        if digest.kind == "email_forward":
+            sent = self.email_handler.forward_email({
+                "sender": ", ".join(dict.fromkeys(email_data["sender"] for email_data, _, _ in entries)),
+                "subject": f"Digest of {count} emails",
+                "body": "\n\n----------\n\n".join(sections)
+            }, digest.destination)
+            reference = None
+            message = None if sent else f"Failed to forward digest to {digest.destination}"
+        else:
+            body = "\n\n---\n\n".join(sections)
+            with self._issues_lock:
+                recent = self.recent_issues.get(digest.destination)
+            if recent and time.monotonic() - recent[2] < self.digest.window:
+                result = self.github_handler.add_issue_comment(digest.destination, recent[0], body)
+                reference = result.get("comment_url")
+            else:
+                client_name = entries[0][1]["name"]
+                result = self.github_handler.create_issue(
+                    title=f"[{client_name}] Digest of {count} emails",
+                    body=body,
+                    repository=digest.destination
+                )
+                reference = result.get("issue_url")
+                if result["success"]:
+                    with self._issues_lock:
+                        self.recent_issues[digest.destination] = (result["issue_number"], result["issue_url"], time.monotonic())
+            sent = result["success"]
+            message = None if sent else f"Failed to send GitHub digest: {result.get('error', 'Unknown error')}"
+        
+        if sent:
+            self.logger.info(f"Sent digest of {count} emails to {digest.destination}")
+        return {
+            "success": sent,
+            "destination": digest.destination,
+            "reference": reference,
+            "message": message
+        }
+    
+    def close(self):
+        """Send buffered digests"""
+        if self.digest is not None:
+            self.digest.close()
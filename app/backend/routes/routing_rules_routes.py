@@ -7,6 +7,7 @@ from sqlalchemy.orm import Session
 from typing import List, Dict, Any
 
 from app.models.models import RoutingRule, Client
+from app.backend.routes.rule_table import routing_rule_table
 from app.utils.db import get_db
 
 router = APIRouter(
@@ -16,7 +17,7 @@ router = APIRouter(
 )
 
 @router.get("/", response_model=List[Dict[str, Any]])
-async def get_routing_rules(
+def get_routing_rules(
     skip: int = 0, 
     limit: int = 100, 
     client_id: int = None,
@@ -38,7 +39,7 @@ async def get_routing_rules(
     return rules
 
 @router.post("/", response_model=Dict[str, Any])
-async def create_routing_rule(rule_data: Dict[str, Any], db: Session = Depends(get_db)):
+def create_routing_rule(rule_data: Dict[str, Any], db: Session = Depends(get_db)):
     """
     Create a new routing rule
     """
@@ -53,10 +54,14 @@ async def create_routing_rule(rule_data: Dict[str, Any], db: Session = Depends(g
     db.commit()
     db.refresh(rule)
     
+    # Hot-swap this process's decision table; other processes see the bumped
+    # rules version on their next ensure_loaded
+    routing_rule_table.load(db)
+    
     return rule
 
 @router.get("/{rule_id}", response_model=Dict[str, Any])
-async def get_routing_rule(rule_id: int, db: Session = Depends(get_db)):
+def get_routing_rule(rule_id: int, db: Session = Depends(get_db)):
     """
     Get details of a specific routing rule
     """
@@ -66,7 +71,7 @@ async def get_routing_rule(rule_id: int, db: Session = Depends(get_db)):
     return rule
 
 @router.put("/{rule_id}", response_model=Dict[str, Any])
-async def update_routing_rule(rule_id: int, rule_data: Dict[str, Any], db: Session = Depends(get_db)):
+def update_routing_rule(rule_id: int, rule_data: Dict[str, Any], db: Session = Depends(get_db)):
     """
     Update routing rule
     """
@@ -87,10 +92,14 @@ async def update_routing_rule(rule_id: int, rule_data: Dict[str, Any], db: Sessi
     db.commit()
     db.refresh(rule)
     
+    # Hot-swap this process's decision table; other processes see the bumped
+    # rules version on their next ensure_loaded
+    routing_rule_table.load(db)
+    
     return rule
 
 @router.delete("/{rule_id}", response_model=Dict[str, Any])
-async def delete_routing_rule(rule_id: int, db: Session = Depends(get_db)):
+def delete_routing_rule(rule_id: int, db: Session = Depends(get_db)):
     """
     Delete a routing rule
     """
@@ -101,10 +110,14 @@ async def delete_routing_rule(rule_id: int, db: Session = Depends(get_db)):
     db.delete(rule)
     db.commit()
     
+    # Hot-swap this process's decision table; other processes see the bumped
+    # rules version on their next ensure_loaded
+    routing_rule_table.load(db)
+    
     return {"status": "success", "message": "Routing rule deleted successfully"}
 
 @router.put("/{rule_id}/toggle-active", response_model=Dict[str, Any])
-async def toggle_rule_active_status(rule_id: int, db: Session = Depends(get_db)):
+def toggle_rule_active_status(rule_id: int, db: Session = Depends(get_db)):
     """
     Toggle active status of a routing rule
     """
@@ -117,6 +130,10 @@ async def toggle_rule_active_status(rule_id: int, db: Session = Depends(get_db))
     db.commit()
     db.refresh(rule)
     
+    # Hot-swap this process's decision table; other processes see the bumped
+    # rules version on their next ensure_loaded
+    routing_rule_table.load(db)
+    
     return {
         "status": "success", 
         "rule_id": rule.id, 
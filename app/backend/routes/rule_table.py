@@ -0,0 +1,141 @@
+"""
+Compiled routing rule decision table for Smart Inbox Application
+"""
+
+import logging
+import threading
+import time
+from collections import namedtuple
+from typing import Dict, Iterable, Optional, Tuple
+
+from app.config.settings import ROUTING
+
+logger = logging.getLogger(__name__)
+
+CompiledRule = namedtuple("CompiledRule", ["id", "client_id", "classification", "action", "destination", "priority"])
+
+SUPPORTED_ACTIONS = ("github_issue", "email_forward")
+
+class RoutingRuleTable:
+    """In-memory decision table of active routing rules keyed by (client_id, classification)"""
+    
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self.refresh_interval = ROUTING["rule_table_refresh"]
+        self.loaded_at = None
+        self.version = None
+        self._table = {}
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def compile(rules: Iterable) -> Dict[Tuple[int, str], Tuple[CompiledRule, ...]]:
+        """
+        Compile routing rules into a decision table
+        
+        Args:
+            rules: RoutingRule rows
+            
+        Returns:
+            Dict mapping (client_id, classification) to active rules, highest priority first
+        """
+        table = {}
+        for rule in rules:
+            if not rule.active or rule.action not in SUPPORTED_ACTIONS:
+                continue
+            compiled = CompiledRule(
+                id=rule.id,
+                client_id=rule.client_id,
+                classification=rule.classification,
+                action=rule.action,
+                destination=rule.destination,
+                priority=rule.priority or 0
+            )
+            table.setdefault((rule.client_id, rule.classification), []).append(compiled)
+        
+        return {
+            key: tuple(sorted(entries, key=lambda r: (-r.priority, r.id)))
+            for key, entries in table.items()
+        }
+    
+    def load(self, db):
+        """
+        Rebuild the table from the database and swap it in atomically
+        
+        Args:
+            db: Database session
+        """
+        from app.models.models import RoutingRule
+        
+        with self._lock:
+            # Read before the rules, so a change committed in between triggers another reload
+            version = self.read_version(db)
+            rules = db.query(RoutingRule).filter(RoutingRule.active == True).all()
+            table = self.load_rules(rules)
+            self.version = version
+        
+        self.logger.info(f"Loaded {len(rules)} active routing rules into {len(table)} decision table entries")
+    
+    def load_rules(self, rules: Iterable) -> Dict[Tuple[int, str], Tuple[CompiledRule, ...]]:
+        """
+        Compile rules and swap them in atomically
+        
+        Args:
+            rules: RoutingRule rows or objects with the same attributes
+            
+        Returns:
+            The new decision table
+        """
+        table = self.compile(rules)
+        # Readers see either the old or the new table, never a partial one
+        self._table = table
+        self.loaded_at = time.monotonic()
+        return table
+    
+    def read_version(self, db):
+        """
+        Read the shared routing rules version, bumped by every rule change
+        
+        Args:
+            db: Database session
+            
+        Returns:
+            Current version (0 before the first change)
+        """
+        from app.models.counters import RULES_VERSION
+        from app.models.models import Counter
+        
+        return db.query(Counter.value).filter(Counter.name == RULES_VERSION).scalar() or 0
+    
+    def ensure_loaded(self, db):
+        """
+        Load the table if it has never been loaded, if another process changed
+        the rules since, or if it is older than the refresh interval
+        
+        The version check costs one lookup in the small counters table; the
+        refresh interval still covers rules changed by bulk updates, which
+        bypass the counters hook.
+        
+        Args:
+            db: Database session
+        """
+        if (self.loaded_at is None or self.read_version(db) != self.version
+                or time.monotonic() - self.loaded_at > self.refresh_interval):
+            self.load(db)
+    
+    def match(self, client_id: Optional[int], classification: str) -> Optional[CompiledRule]:
+        """
+        Find the highest-priority active rule for a client and classification
+        
+        Args:
+            client_id: Client ID
+            classification: Email classification
+            
+        Returns:
+            CompiledRule or None if no rule applies
+        """
+        rules = self._table.get((client_id, classification))
+        return rules[0] if rules else None
+
+
+# Shared decision table, hot-swapped when routing rules change
+routing_rule_table = RoutingRuleTable()
@@ -2,15 +2,21 @@
 System routes for Smart Inbox Application
 """
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
 from typing import List, Dict, Any
 import datetime
 
-from app.models.models import Log, Email, Client, RoutingRule
+from app.models.models import Log
+from app.models.counters import read_counters, rebuild_counters
 from app.backend.email.email_handler import get_email_handler
 from app.backend.github.github_handler import GitHubHandler
-from app.utils.db import get_db
+from app.backend.pipeline.lanes import lane_rank
+from app.backend.queue.job_queue import job_queue
+from app.backend.retention.log_archive import run_retention, search_archive
+from app.config.settings import QUEUE
+from app.utils.db import get_db, get_read_db
+from app.utils.pagination import decode_cursor, encode_cursor, keyset_page
 
 router = APIRouter(
     prefix="/system",
@@ -19,7 +25,8 @@ router = APIRouter(
 )
 
 @router.get("/logs", response_model=List[Dict[str, Any]])
-async def get_logs(
+def get_logs(
+    response: Response,
     skip: int = 0, 
     limit: int = 100, 
     email_id: int = None,
@@ -27,10 +34,17 @@ async def get_logs(
     status: str = None,
     start_date: datetime.datetime = None,
     end_date: datetime.datetime = None,
-    db: Session = Depends(get_db)
+    cursor: str = None,
+    include_archived: bool = False,
+    db: Session = Depends(get_read_db)
 ):
     """
     Get system logs with filtering options
+    
+    Pages are keyed on (timestamp, id): pass the X-Next-Cursor response
+    header as `cursor` to get the next page. `skip` is kept for older clients.
+    With `include_archived`, logs moved out by the retention job are searched
+    as well; this reads archive files from disk and is slower.
     """
     query = db.query(Log)
     
@@ -49,34 +63,79 @@ async def get_logs(
     if end_date:
         query = query.filter(Log.timestamp <= end_date)
     
-    logs = query.order_by(Log.timestamp.desc()).offset(skip).limit(limit).all()
+    if include_archived:
+        filters = {"email_id": email_id, "action": action, "status": status,
+                   "start_date": start_date, "end_date": end_date}
+        return get_logs_with_archive(query, filters, cursor, limit, response)
+    
+    # Legacy offset pagination
+    if skip and not cursor:
+        return query.order_by(Log.timestamp.desc()).offset(skip).limit(limit).all()
+    
+    try:
+        logs, next_cursor = keyset_page(query, [Log.timestamp, Log.id], cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return logs
 
+def get_logs_with_archive(query, filters: Dict[str, Any], cursor: str, limit: int, response: Response) -> List[Dict[str, Any]]:
+    """
+    Merge a page of hot logs with archived logs in (timestamp, id) order
+    """
+    try:
+        before = decode_cursor(cursor, 2) if cursor else None
+        hot, hot_cursor = keyset_page(query, [Log.timestamp, Log.id], cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    rows = [{column.key: getattr(log, column.key) for column in Log.__table__.columns} for log in hot]
+    rows += search_archive(filters, limit + 1, before=before)
+    rows.sort(key=lambda row: (row["timestamp"], row["id"]), reverse=True)
+    
+    if len(rows) > limit or hot_cursor:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor([rows[-1]["timestamp"], rows[-1]["id"]])
+    return rows
+
 @router.get("/stats", response_model=Dict[str, Any])
-async def get_system_stats(db: Session = Depends(get_db)):
+def get_system_stats(db: Session = Depends(get_read_db)):
     """
     Get system statistics
+    
+    Counts come from the incrementally maintained counters table, so the
+    cost does not grow with the number of emails.
     """
+    counters = read_counters(db)
+    
     # Count total emails
-    total_emails = db.query(Email).count()
+    total_emails = counters.get("emails", 0)
     
     # Count processed emails
-    processed_emails = db.query(Email).filter(Email.status == "processed").count()
+    processed_emails = counters.get("emails.status:processed", 0)
     
     # Count pending review emails
-    pending_review = db.query(Email).filter(
-        Email.status == "pending", 
-        Email.routing_action == "manual_review"
-    ).count()
+    pending_review = counters.get("emails.status_action:pending:manual_review", 0)
     
     # Count error emails
-    error_emails = db.query(Email).filter(Email.status == "error").count()
+    error_emails = counters.get("emails.status:error", 0)
+    
+    # Count emails that used up their retries
+    dead_letter_emails = counters.get("emails.status:dead_letter", 0)
+    
+    # Count emails waiting for a destination's rate limit
+    deferred_emails = counters.get("emails.status:deferred", 0)
+    
+    # Count emails buffered for a digest that was not sent yet
+    digest_pending_emails = counters.get("emails.status:digest_pending", 0)
     
     # Count clients
-    client_count = db.query(Client).count()
+    client_count = counters.get("clients", 0)
     
     # Count active routing rules
-    active_rules = db.query(RoutingRule).filter(RoutingRule.active == True).count()
+    active_rules = counters.get("routing_rules.active", 0)
     
     # Calculate success rate
     success_rate = 0
@@ -91,14 +150,71 @@ async def get_system_stats(db: Session = Depends(get_db)):
         "processed_emails": processed_emails,
         "pending_review": pending_review,
         "error_emails": error_emails,
+        "dead_letter_emails": dead_letter_emails,
+        "deferred_emails": deferred_emails,
+        "digest_pending_emails": digest_pending_emails,
         "client_count": client_count,
         "active_rules": active_rules,
         "success_rate": round(success_rate, 2),
+        "job_queue": job_queue.stats(db),
+        "lanes": get_lane_depths(db),
         "recent_activity": recent_logs
     }
 
+def get_lane_depths(db: Session) -> Dict[str, Dict[str, int]]:
+    """
+    Queue depth per priority lane: conversations queued and in flight in this
+    process's pipeline, and process_emails jobs waiting for queue workers
+    """
+    from app.backend.routes.email_routes import ingestion_pipeline
+    
+    depths = ingestion_pipeline.lane_depths()
+    queued_jobs = job_queue.queued_by_priority(db, "process_emails")
+    for name, counts in depths.items():
+        counts["queued_jobs"] = queued_jobs.get(lane_rank(name), 0)
+    return depths
+
+@router.post("/rebuild-counters", response_model=Dict[str, Any])
+def rebuild_stats_counters(db: Session = Depends(get_db)):
+    """
+    Recompute the statistics counters from the email, client and rule tables
+    """
+    counters = rebuild_counters(db)
+    return {"status": "success", "counters": counters}
+
+@router.post("/log-retention", response_model=Dict[str, Any])
+def run_log_retention(db: Session = Depends(get_db)):
+    """
+    Archive and remove logs older than the retention window
+    
+    Runs on a queue worker when the queue is enabled, otherwise inline.
+    """
+    if QUEUE["enabled"]:
+        job = job_queue.enqueue_once(db, "log_retention")
+        return {"status": "queued", "job_id": job.id}
+    
+    summary = run_retention(db.get_bind())
+    return {"status": "success", **summary}
+
+@router.post("/replay", response_model=Dict[str, Any])
+def replay_emails(options: Dict[str, Any], db: Session = Depends(get_read_db)):
+    """
+    Replay stored emails with candidate rules, keywords or threshold and report changed decisions
+    
+    No GitHub issues are created, no emails are forwarded and nothing is written.
+    """
+    # Imported here: the replay engine imports the routing engine from this package
+    from app.backend.replay.replay import parse_config, run_replay
+    
+    try:
+        config = parse_config(options)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid replay options: {str(e)}")
+    
+    return {"status": "success", **run_replay(db, config)}
+
 @router.post("/test-connection", response_model=Dict[str, Any])
-async def test_connections():
+def test_connections():
     """
     Test connections to email and GitHub APIs
     """
@@ -135,20 +251,24 @@ async def test_connections():
     }
 
 @router.post("/initialize-database", response_model=Dict[str, Any])
-async def initialize_database(db: Session = Depends(get_db)):
+def initialize_database(db: Session = Depends(get_db)):
     """
     Initialize database with tables
     """
     from app.models.models import Base
     from app.utils.db import engine
+    from app.utils.migrations import run_migrations
     
     try:
         Base.metadata.create_all(bind=engine)
         
+        # Bring tables created by earlier versions up to date
+        migrations = run_migrations(engine)
+        
         # Add a log entry
         log = Log(
             action="system_initialization",
-            details="Database initialized",
+            details=f"Database initialized, migrations applied: {', '.join(migrations) or 'none'}",
             status="success"
         )
         
@@ -157,7 +277,8 @@ async def initialize_database(db: Session = Depends(get_db)):
         
         return {
             "status": "success",
-            "message": "Database initialized successfully"
+            "message": "Database initialized successfully",
+            "migrations": migrations
         }
     except Exception as e:
         return {
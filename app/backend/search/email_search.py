@@ -0,0 +1,175 @@
+"""
+Full-text email search for Smart Inbox Application
+
+Subject, sender and body are indexed by the database itself and the index
+is kept up to date on every insert, update and delete: an external-content
+FTS5 table maintained by triggers on SQLite, and a generated tsvector
+column with a GIN index on PostgreSQL.
+"""
+
+import datetime
+import logging
+import re
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+
+from app.config.settings import SEARCH
+
+logger = logging.getLogger(__name__)
+
+SNIPPET_START = "<mark>"
+SNIPPET_END = "</mark>"
+
+SQLITE_INDEX = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS emails_fts USING fts5(
+        subject, sender, body, content='emails', content_rowid='id'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS emails_fts_insert AFTER INSERT ON emails BEGIN
+        INSERT INTO emails_fts(rowid, subject, sender, body) VALUES (new.id, new.subject, new.sender, new.body);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS emails_fts_delete AFTER DELETE ON emails BEGIN
+        INSERT INTO emails_fts(emails_fts, rowid, subject, sender, body) VALUES ('delete', old.id, old.subject, old.sender, old.body);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS emails_fts_update AFTER UPDATE OF subject, sender, body ON emails BEGIN
+        INSERT INTO emails_fts(emails_fts, rowid, subject, sender, body) VALUES ('delete', old.id, old.subject, old.sender, old.body);
+        INSERT INTO emails_fts(rowid, subject, sender, body) VALUES (new.id, new.subject, new.sender, new.body);
+    END""",
+]
+
+# Result columns shared by both backends
+RESULT_COLUMNS = "e.id, e.subject, e.sender, e.received_at, e.client_id, e.classification, e.status"
+
+def install_search_index(engine):
+    """
+    Create the full-text index and index the existing emails
+    
+    Safe to run repeatedly; existing emails are only indexed when the index
+    is first created.
+    
+    Args:
+        engine: Database engine
+    """
+    if engine.dialect.name == "postgresql":
+        language = SEARCH["language"]
+        with engine.begin() as connection:
+            connection.execute(text(
+                "ALTER TABLE emails ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+                f"setweight(to_tsvector('{language}', coalesce(subject, '')), 'A') || "
+                "setweight(to_tsvector('simple', coalesce(sender, '')), 'B') || "
+                f"setweight(to_tsvector('{language}', coalesce(body, '')), 'C')"
+                ") STORED"
+            ))
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            connection.execute(text(
+                "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_emails_search_vector ON emails USING gin (search_vector)"
+            ))
+        return
+    
+    with engine.begin() as connection:
+        exists = connection.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'emails_fts'"
+        )).scalar()
+        for statement in SQLITE_INDEX:
+            connection.execute(text(statement))
+        if not exists:
+            connection.execute(text("INSERT INTO emails_fts(emails_fts) VALUES ('rebuild')"))
+            logger.info("Built the email full-text index")
+
+def fts5_query(query: str) -> str:
+    """
+    Turn free text into an FTS5 query matching all of its words
+    
+    Words are quoted so that FTS5 operators and punctuation in user input
+    cannot break the query; a trailing `*` keeps prefix matching.
+    
+    Args:
+        query: User search text
+        
+    Returns:
+        FTS5 MATCH expression, empty when the text has no words
+    """
+    terms = []
+    for word, prefix in re.findall(r"(\w+)(\*?)", query):
+        terms.append(f'"{word}"{prefix}')
+    return " ".join(terms)
+
+def filter_clauses(params: Dict[str, Any], client_id: Optional[int], classification: Optional[str],
+                   start_date: Optional[datetime.datetime], end_date: Optional[datetime.datetime]) -> str:
+    """Build the SQL filters on the emails table and add their parameters"""
+    clauses = []
+    if client_id is not None:
+        clauses.append("e.client_id = :client_id")
+        params["client_id"] = client_id
+    if classification:
+        clauses.append("e.classification = :classification")
+        params["classification"] = classification
+    if start_date:
+        clauses.append("e.received_at >= :start_date")
+        params["start_date"] = start_date
+    if end_date:
+        clauses.append("e.received_at <= :end_date")
+        params["end_date"] = end_date
+    return "".join(f" AND {clause}" for clause in clauses)
+
+def search_emails(db, query: str, client_id: Optional[int] = None, classification: Optional[str] = None,
+                  start_date: Optional[datetime.datetime] = None, end_date: Optional[datetime.datetime] = None,
+                  limit: int = 20, offset: int = 0) -> List[Dict[str, Any]]:
+    """
+    Search emails by subject, sender and body
+    
+    Args:
+        db: Database session
+        query: Search text; all words must match
+        client_id: Only emails of this client
+        classification: Only emails with this classification
+        start_date: Only emails received at or after this time
+        end_date: Only emails received at or before this time
+        limit: Maximum number of results
+        offset: Number of results to skip
+        
+    Returns:
+        Best matches first, with a relevance score (higher is better) and a
+        snippet where matches are wrapped in <mark> tags
+    """
+    params = {"limit": min(limit, SEARCH["max_limit"]), "offset": offset}
+    filters = filter_clauses(params, client_id, classification, start_date, end_date)
+    weights = SEARCH["weights"]
+    tokens = SEARCH["snippet_tokens"]
+    
+    if db.get_bind().dialect.name == "postgresql":
+        params["query"] = query
+        top = max(weights.values())
+        # ts_rank weights are ordered {D, C, B, A}: unused, body, sender, subject
+        rank_weights = f"{{0, {weights['body'] / top}, {weights['sender'] / top}, {weights['subject'] / top}}}"
+        statement = text(
+            f"SELECT m.*, ts_headline('{SEARCH['language']}', coalesce(b.body, m.subject, ''), m.q, "
+            f"'StartSel={SNIPPET_START}, StopSel={SNIPPET_END}, MaxWords={tokens * 2}, MinWords={tokens // 2}') AS snippet "
+            f"FROM (SELECT {RESULT_COLUMNS}, ts_rank_cd('{rank_weights}', e.search_vector, q) AS score, q "
+            f"FROM emails e, websearch_to_tsquery('{SEARCH['language']}', :query) q "
+            f"WHERE e.search_vector @@ q{filters} "
+            "ORDER BY score DESC, e.id DESC LIMIT :limit OFFSET :offset) m "
+            "JOIN emails b ON b.id = m.id "
+            "ORDER BY m.score DESC, m.id DESC"
+        )
+    else:
+        params["query"] = fts5_query(query)
+        if not params["query"]:
+            return []
+        statement = text(
+            f"SELECT {RESULT_COLUMNS}, "
+            f"-bm25(emails_fts, {weights['subject']}, {weights['sender']}, {weights['body']}) AS score, "
+            f"snippet(emails_fts, -1, '{SNIPPET_START}', '{SNIPPET_END}', '…', {tokens}) AS snippet "
+            "FROM emails_fts JOIN emails e ON e.id = emails_fts.rowid "
+            f"WHERE emails_fts MATCH :query{filters} "
+            "ORDER BY score DESC, e.id DESC LIMIT :limit OFFSET :offset"
+        )
+    
+    results = []
+    for row in db.execute(statement, params).mappings():
+        result = {key: row[key] for key in ("id", "subject", "sender", "received_at", "client_id",
+                                            "classification", "status", "score", "snippet")}
+        if isinstance(result["received_at"], str):
+            result["received_at"] = datetime.datetime.fromisoformat(result["received_at"])
+        results.append(result)
+    return results
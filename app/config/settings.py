@@ -16,6 +16,27 @@ EMAIL_SETTINGS = {
     "check_interval": 60,  # seconds
 }
 
+# Mailbox poller settings (one process polls each mailbox)
+POLLER = {
+    "enabled": True,  # Start the poller with the API; queue workers only run the jobs it enqueues
+    "election_interval": 10,  # Seconds between leadership attempts by standby processes
+    "lock_dir": None,  # Directory for mailbox lock files on SQLite; None puts them next to the database file
+}
+
+# Prefilter settings for automated and bulk mail
+PREFILTER = {
+    "enabled": True,
+    # Handling per category: "filter" (store with status 'filtered'),
+    # "manual_review" (queue for review) or "process" (classify as usual)
+    "handling": {
+        "bounce": "filter",
+        "auto_reply": "filter",
+        "mailing_list": "filter",
+        "bulk": "filter",
+    },
+    "bounce_senders": ["mailer-daemon", "postmaster"],
+}
+
 # Gmail API settings
 GMAIL_API = {
     "credentials_file": "credentials.json",
@@ -32,6 +53,8 @@ GITHUB_API = {
     "access_token": "",  # To be set via environment variable
     "default_repo": "owner/repository",  # Default repository for issues
     "issue_labels": ["client-email", "auto-generated"],
+    "repo_cache_ttl": 600,  # Seconds a repository handle and its known labels are reused
+    "label_color": "ededed",  # Color of labels created for issues
 }
 
 # AI Classification settings
@@ -40,6 +63,131 @@ AI_SETTINGS = {
     "api_key": "",  # To be set via environment variable
     "model": "gpt-3.5-turbo",
     "confidence_threshold": 0.7,  # Minimum confidence score to avoid manual review
+    "request_timeout": 10,  # Strict per-call deadline in seconds
+    "max_concurrent_requests": 8,  # Worker threads for API calls
+    "circuit_breaker": {
+        "failure_threshold": 5,  # Consecutive failed or slow calls before opening
+        "slow_call_threshold": 8,  # Calls slower than this (seconds) count as failures
+        "reset_timeout": 30,  # Seconds before a half-open probe is allowed
+    },
+    "hedge_requests": False,  # Fire a second request when the first exceeds p95 latency
+    "nearest_neighbour": {
+        "enabled": False,  # Vote over similar labelled emails before calling the classifier
+        "index_path": "data/knn_index.bin",
+        "k": 15,
+        "min_similarity": 0.1,
+        "max_terms_per_doc": 200,
+        "save_every": 500,  # Persist the index after this many new labelled emails
+    },
+}
+
+# Ingestion pipeline settings
+PIPELINE = {
+    "classify_workers": 8,  # Concurrent classification calls
+    "route_workers": 4,  # Concurrent GitHub/SMTP routing calls
+    "persist_batch_size": 100,  # Processing results committed per transaction
+    # Priority lanes, most urgent first; a client goes to the first lane whose
+    # min_priority its Client.priority reaches, the last lane takes the rest.
+    # Lanes share workers in proportion to their weight.
+    "lanes": {
+        "high": {"min_priority": 10, "weight": 8},
+        "normal": {"min_priority": 0, "weight": 3},
+        "low": {"min_priority": None, "weight": 1},
+    },
+    "client_concurrency": 4,  # Conversations of one client processed at once
+}
+
+# Replay (what-if reprocessing) settings
+REPLAY = {
+    "workers": None,  # Worker processes; None uses one per CPU
+    "chunk_size": 500,  # Emails sent to a worker at a time
+    "sample_size": 50,  # Changed decisions listed in the report
+}
+
+# Buffered audit log settings
+AUDIT_LOG = {
+    "buffered": True,  # Write pipeline log rows in background bulk inserts
+    "batch_size": 200,  # Buffered rows that trigger a flush
+    "flush_interval_ms": 500,  # Longest time a row waits in the buffer
+    "max_buffer": 10000,  # Writers flush inline beyond this many buffered rows
+}
+
+# Durable job queue settings
+QUEUE = {
+    "enabled": False,  # Run ingestion on queue workers instead of API background tasks
+    "lease_seconds": 300,  # Visibility timeout; a job whose lease expires is claimed again
+    "poll_interval": 2,  # Seconds a worker sleeps when the queue is empty
+    "batch_size": 4,  # Jobs run per poll, claimed one at a time
+    "max_attempts": 5,
+    "retry_delay": 30,  # Base retry delay in seconds, doubled per attempt
+    "emails_per_job": 50,  # Stored emails per process_emails job
+    "done_retention_hours": 24,  # Finished jobs are deleted after this long
+    "failed_retention_hours": 168,  # Failed jobs are kept longer for inspection
+    "purge_interval": 600,  # Seconds between purges of old jobs by each worker
+    "purge_batch_size": 1000,  # Jobs deleted per transaction
+}
+
+# Retry settings for emails whose routing failed
+RETRY = {
+    "enabled": True,
+    "max_attempts": 5,  # Failed attempts before an email is dead-lettered
+    "base_delay": 60,  # Seconds before the first retry, doubled per attempt
+    "max_delay": 3600,  # Upper bound on the delay between attempts
+    "jitter": 0.5,  # Fraction of the delay randomized so retries spread out
+    "batch_size": 50,  # Due emails claimed per scheduler run
+    "lease_seconds": 300,  # Claimed emails are not claimed again before this
+}
+
+# Routing settings
+ROUTING = {
+    "rule_table_refresh": 60,  # Seconds before the compiled rule table is reloaded from the database
+    # Outbound calls per destination (contact address or repository): tokens per second and burst size
+    "rate_limits": {
+        "email_forward": {"rate": 0.2, "burst": 10},
+        "github_issue": {"rate": 0.1, "burst": 5},
+    },
+    # Over the rate limit, collect a destination's emails into one digest instead of failing them
+    "digest": {
+        "enabled": False,
+        "window": 300,  # Seconds a digest collects emails before it is sent
+        "max_items": 50,  # Emails after which a digest is sent right away
+    },
+}
+
+# Sender history settings (skip classification for predictable senders)
+SENDER_HISTORY = {
+    "enabled": True,
+    "window": 20,  # Number of recent classifications kept per sender
+    "min_samples": 5,  # Minimum history before the sender's record is trusted
+    "dominance": 0.9,  # Share of the window the top classification must hold
+    "max_age_days": 30,  # History older than this is not used
+    "max_senders": 50000,  # Least recently seen senders are evicted beyond this
+}
+
+# Raw message archive settings
+RAW_ARCHIVE = {
+    "enabled": True,  # Keep the original RFC822 bytes of fetched emails
+    "directory": "data/raw",  # Append-only segment files and their offset index
+    "segment_size": 256 * 1024 * 1024,  # Bytes per segment file before starting a new one
+    "codec": "zstd",  # zstd when the zstandard package is installed, zlib otherwise
+    "compression_level": 6,
+    "fsync": True,  # Sync segment and index files after each append batch
+}
+
+# Email full-text search settings
+SEARCH = {
+    "language": "english",  # PostgreSQL text search configuration for subject and body
+    "weights": {"subject": 10.0, "sender": 5.0, "body": 1.0},  # Relative rank of matches per field
+    "snippet_tokens": 16,  # Words around the match in result snippets
+    "max_limit": 100,  # Largest page a search may request
+}
+
+# Log retention settings
+LOG_RETENTION = {
+    "retention_days": 90,  # Logs older than this are archived and removed from the logs table
+    "archive_dir": "data/archive/logs",  # Compressed JSONL segments, one or more per month
+    "premake_months": 3,  # Future monthly partitions created ahead on PostgreSQL
+    "delete_batch_size": 5000,  # Rows deleted per transaction when no partition can be dropped
 }
 
 # Database settings
@@ -55,9 +203,23 @@ DATABASE = {
         "name": "smart_inbox",
         "user": "postgres",
         "password": "",  # To be set via environment variable
+        "replicas": [],  # Read replica URLs, overridden by the comma-separated DB_REPLICA_URLS variable
     },
 }
 
+# Database connection pool and SQLite tuning
+DATABASE_ENGINE = {
+    "pool_size": 10,  # Persistent connections per process
+    "max_overflow": 20,  # Extra connections opened under burst load
+    "pool_timeout": 30,  # Seconds to wait for a free connection
+    "pool_recycle": 1800,  # Reconnect connections older than this (seconds)
+    "pool_pre_ping": True,  # Test connections before use to drop stale ones
+    "sqlite_journal_mode": "WAL",  # Readers do not block on the writer
+    "sqlite_synchronous": "NORMAL",  # Safe with WAL, avoids an fsync per commit
+    "sqlite_busy_timeout": 5000,  # Milliseconds to wait for a lock before failing
+    "read_primary_seconds": 5,  # Reads stay on the primary this long after a client's write (covers replica lag)
+}
+
 # Logging settings
 LOGGING = {
     "level": "INFO",
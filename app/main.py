@@ -2,15 +2,11 @@
 Main application entry point for the Smart Inbox Application
 """
 
-import os
 import logging
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
 
-from app.config.settings import API, DATABASE, LOGGING
+from app.config.settings import API, LOGGING, POLLER
 
 # Configure logging
 logging.basicConfig(
@@ -34,43 +30,46 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],  # Pagination cursor for list endpoints
 )
 
-# Database setup
-def get_db_url():
-    """Get database URL based on environment"""
-    env = os.getenv("ENVIRONMENT", "development")
-    db_config = DATABASE[env]
-    
-    if db_config["engine"] == "sqlite":
-        return f"sqlite:///{db_config['name']}"
-    elif db_config["engine"] == "postgresql":
-        password = os.getenv("DB_PASSWORD", db_config.get("password", ""))
-        return f"postgresql://{db_config['user']}:{password}@{db_config['host']}:{db_config['port']}/{db_config['name']}"
-    else:
-        raise ValueError(f"Unsupported database engine: {db_config['engine']}")
-
-# Create database engine and session
-engine = create_engine(get_db_url())
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-# Dependency to get database session
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# Database engine, sessions and the get_db dependency are shared with the routes
+from app.utils.db import engine, SessionLocal, get_db, ReadPrimaryMiddleware
+
+# Serve a client's reads from the primary right after it wrote
+app.add_middleware(ReadPrimaryMiddleware)
 
 # Import and include routers
 # These imports are placed here to avoid circular imports
 from app.backend.routes import email_routes, client_routes, routing_rules_routes, system_routes
+from app.utils.log_sink import audit_log
 
 app.include_router(email_routes.router, prefix=API["prefix"])
 app.include_router(client_routes.router, prefix=API["prefix"])
 app.include_router(routing_rules_routes.router, prefix=API["prefix"])
 app.include_router(system_routes.router, prefix=API["prefix"])
 
+@app.on_event("startup")
+def start_mailbox_poller():
+    """Start contending for the mailbox poller leadership"""
+    if POLLER["enabled"]:
+        email_routes.mailbox_poller.start()
+
+@app.on_event("shutdown")
+def stop_mailbox_poller():
+    """Stop polling and hand leadership to another process"""
+    email_routes.mailbox_poller.stop(timeout=5)
+
+@app.on_event("shutdown")
+def send_routing_digests():
+    """Send emails buffered for digests before exiting"""
+    email_routes.routing_engine.close()
+
+@app.on_event("shutdown")
+def flush_audit_log():
+    """Write buffered audit log rows before exiting"""
+    audit_log.close()
+
 @app.get("/")
 async def root():
     """Root endpoint for health check"""
@@ -0,0 +1,195 @@
+"""
+Incrementally maintained row counters for Smart Inbox Application
+
+Counts used by the dashboard are kept in the counters table and adjusted in
+the same transaction as the rows they count, from an after_flush hook on
+every ORM session. Bulk query.update()/query.delete() statements on counted
+models bypass the hook; run rebuild_counters() after using them. The same
+hook bumps the routing rules version that rule tables check for changes.
+"""
+
+import logging
+from collections import Counter as Tally
+from typing import Dict, List
+
+from sqlalchemy import event, func, inspect, text
+from sqlalchemy.orm import Session
+
+from app.models.models import Client, Counter, Email, RoutingRule
+
+logger = logging.getLogger(__name__)
+
+def email_counter_names(status, routing_action) -> List[str]:
+    """Counters an email with the given status and routing action contributes to"""
+    return ["emails", f"emails.status:{status}", f"emails.status_action:{status}:{routing_action or ''}"]
+
+def client_counter_names() -> List[str]:
+    """Counters a client contributes to"""
+    return ["clients"]
+
+def routing_rule_counter_names(active) -> List[str]:
+    """Counters a routing rule contributes to"""
+    return ["routing_rules.active"] if active else []
+
+# Bumped on every routing rule change, so each process's rule table can tell it is stale
+RULES_VERSION = "routing_rules.version"
+
+# Counted model -> (attributes the counter names depend on, counter name function)
+COUNTED_MODELS = {
+    Email: (("status", "routing_action"), email_counter_names),
+    Client: ((), client_counter_names),
+    RoutingRule: (("active",), routing_rule_counter_names),
+}
+
+def _load_previous_value(target, value, oldvalue, initiator):
+    """No-op set listener; registering it with active_history loads the old value on assignment"""
+
+# Without active history, assigning to an expired attribute loses the previous value
+for _model, (_attrs, _names) in COUNTED_MODELS.items():
+    for _attr in _attrs:
+        event.listen(getattr(_model, _attr), "set", _load_previous_value, active_history=True)
+
+def _new_value(obj, attr):
+    value = getattr(obj, attr)
+    if value is None:
+        # Python-side column defaults may not be set on the instance yet
+        default = obj.__table__.c[attr].default
+        if default is not None and default.is_scalar:
+            return default.arg
+    return value
+
+def _old_value(obj, attr):
+    history = inspect(obj).attrs[attr].history
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(obj, attr)
+
+def flush_deltas(session: Session) -> Tally:
+    """
+    Compute counter changes for the pending inserts, updates and deletes
+    
+    Args:
+        session: Session being flushed (still in pre-flush state)
+        
+    Returns:
+        Counter name -> delta
+    """
+    deltas = Tally()
+    for obj in session.new:
+        spec = COUNTED_MODELS.get(type(obj))
+        if spec:
+            attrs, names = spec
+            deltas.update(names(*[_new_value(obj, attr) for attr in attrs]))
+    
+    for obj in session.dirty:
+        spec = COUNTED_MODELS.get(type(obj))
+        if not spec or not spec[0] or not session.is_modified(obj, include_collections=False):
+            continue
+        attrs, names = spec
+        deltas.subtract(names(*[_old_value(obj, attr) for attr in attrs]))
+        deltas.update(names(*[getattr(obj, attr) for attr in attrs]))
+    
+    for obj in session.deleted:
+        spec = COUNTED_MODELS.get(type(obj))
+        if spec:
+            attrs, names = spec
+            deltas.subtract(names(*[_old_value(obj, attr) for attr in attrs]))
+    
+    if rules_changed(session):
+        deltas[RULES_VERSION] += 1
+    
+    return Tally({name: delta for name, delta in deltas.items() if delta})
+
+def rules_changed(session: Session) -> bool:
+    """Whether the flush inserts, updates or deletes any routing rule"""
+    if any(isinstance(obj, RoutingRule) for obj in session.new | session.deleted):
+        return True
+    return any(
+        isinstance(obj, RoutingRule) and session.is_modified(obj, include_collections=False)
+        for obj in session.dirty
+    )
+
+def apply_deltas(connection, deltas: Dict[str, int]):
+    """
+    Add deltas to the counters table with a single upsert
+    
+    Args:
+        connection: Connection of the flushing transaction
+        deltas: Counter name -> delta
+    """
+    if not deltas:
+        return
+    
+    table = Counter.__table__
+    # Sorted so concurrent transactions lock counter rows in the same order
+    rows = [{"name": name, "value": deltas[name]} for name in sorted(deltas)]
+    dialect = connection.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        statement = insert(table).values(rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.name],
+            set_={"value": table.c.value + statement.excluded.value}
+        )
+        connection.execute(statement)
+        return
+    
+    for row in rows:
+        updated = connection.execute(
+            table.update().where(table.c.name == row["name"]).values(value=table.c.value + row["value"])
+        )
+        if not updated.rowcount:
+            connection.execute(table.insert().values(**row))
+
+@event.listens_for(Session, "after_flush")
+def update_counters(session, flush_context):
+    """Adjust counters within the transaction that changed the counted rows"""
+    apply_deltas(session.connection(), flush_deltas(session))
+
+def read_counters(db) -> Dict[str, int]:
+    """
+    Read all counters with one query over the small counters table
+    
+    Args:
+        db: Database session
+        
+    Returns:
+        Counter name -> value
+    """
+    return dict(db.query(Counter.name, Counter.value).all())
+
+def rebuild_counters(db) -> Dict[str, int]:
+    """
+    Recompute all counters from the counted tables
+    
+    On PostgreSQL the counters table is locked first, so writers committing
+    meanwhile wait and then apply their deltas on top of the rebuilt values.
+    
+    Args:
+        db: Database session
+        
+    Returns:
+        Counter name -> value
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("LOCK TABLE counters IN EXCLUSIVE MODE"))
+    
+    counts = Tally()
+    rows = db.query(Email.status, Email.routing_action, func.count(Email.id)).group_by(Email.status, Email.routing_action)
+    for status, routing_action, count in rows:
+        for name in email_counter_names(status, routing_action):
+            counts[name] += count
+    counts["clients"] = db.query(func.count(Client.id)).scalar()
+    counts["routing_rules.active"] = db.query(func.count(RoutingRule.id)).filter(RoutingRule.active == True).scalar()
+    # Not a count; kept so rule tables loaded before the rebuild do not miss later changes
+    counts[RULES_VERSION] = db.query(Counter.value).filter(Counter.name == RULES_VERSION).scalar() or 0
+    
+    db.query(Counter).delete(synchronize_session=False)
+    db.add_all([Counter(name=name, value=value) for name, value in counts.items()])
+    db.commit()
+    
+    logger.info(f"Rebuilt {len(counts)} counters")
+    return dict(counts)
@@ -2,12 +2,11 @@
 Database models for the Smart Inbox Application
 """
 
-from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, DateTime, Text, JSON
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, DateTime, Text, JSON, Index
+from sqlalchemy.orm import relationship, deferred
 import datetime
 
-Base = declarative_base()
+from app.utils.db import Base
 
 class Client(Base):
     """Client model for storing client information"""
@@ -22,6 +21,7 @@ class Client(Base):
     technical_contact = Column(String(255), nullable=True)  # Email for technical issues
     commercial_contact = Column(String(255), nullable=True)  # Email for commercial issues
     administrative_contact = Column(String(255), nullable=True)  # Email for administrative issues
+    priority = Column(Integer, default=0, nullable=False, server_default='0')  # Processing lane, higher is more urgent
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
     
@@ -42,22 +42,33 @@ class Email(Base):
     sender = Column(String(255), nullable=False)
     recipient = Column(String(255), nullable=False)
     subject = Column(String(512), nullable=True)
-    body = Column(Text, nullable=True)
+    body = deferred(Column(Text, nullable=True), group="content")  # Loaded only when accessed or undeferred
     attachments = Column(JSON, nullable=True)  # List of attachment filenames or references
     received_at = Column(DateTime, default=datetime.datetime.utcnow)
     client_id = Column(Integer, ForeignKey('clients.id'), nullable=True)
     classification = Column(String(50), nullable=True)  # technical, commercial, administrative
     confidence_score = Column(Float, nullable=True)
-    routing_action = Column(String(50), nullable=True)  # github_issue, email_forward, manual_review
+    classification_source = Column(String(50), nullable=True)  # classifier, sender_history, manual
+    routing_action = Column(String(50), nullable=True)  # github_issue, email_forward, manual_review, filtered
     action_reference = Column(String(255), nullable=True)  # GitHub issue URL or forwarded email ID
-    status = Column(String(50), default='pending')  # pending, processed, error
+    status = Column(String(50), default='pending')  # pending, processed, error, deferred, digest_pending, filtered, dead_letter
     error_message = Column(Text, nullable=True)
     processed_at = Column(DateTime, nullable=True)
+    routing_attempts = Column(Integer, default=0, nullable=False, server_default='0')  # Failed routing attempts
+    next_attempt_at = Column(DateTime, nullable=True)  # When a failed email is retried; None if not scheduled
     
     # Relationships
     client = relationship("Client", back_populates="emails")
     logs = relationship("Log", back_populates="email", cascade="all, delete-orphan")
     
+    __table_args__ = (
+        Index('ix_emails_received_at', 'received_at'),  # Unfiltered email list
+        Index('ix_emails_status_received_at', 'status', 'received_at'),  # Email list by status
+        Index('ix_emails_status_routing_action', 'status', 'routing_action'),  # System stats counts
+        Index('ix_emails_status_next_attempt_at', 'status', 'next_attempt_at'),  # Due retries
+        Index('ix_emails_status_processed_at', 'status', 'processed_at'),  # Nearest-neighbour index top-up
+    )
+    
     def __repr__(self):
         return f"<Email(id={self.id}, subject='{self.subject}', classification='{self.classification}')>"
 
@@ -79,6 +90,10 @@ class RoutingRule(Base):
     # Relationships
     client = relationship("Client", back_populates="routing_rules")
     
+    __table_args__ = (
+        Index('ix_routing_rules_client_active_priority', 'client_id', 'active', 'priority'),
+    )
+    
     def __repr__(self):
         return f"<RoutingRule(id={self.id}, client_id={self.client_id}, classification='{self.classification}')>"
 
@@ -98,10 +113,54 @@ class Log(Base):
     # Relationships
     email = relationship("Email", back_populates="logs")
     
+    __table_args__ = (
+        Index('ix_logs_timestamp', 'timestamp'),  # Unfiltered log list
+        Index('ix_logs_email_id', 'email_id'),
+        Index('ix_logs_action_status_timestamp', 'action', 'status', 'timestamp'),
+    )
+    
     def __repr__(self):
         return f"<Log(id={self.id}, action='{self.action}', status='{self.status}')>"
 
 
+class Job(Base):
+    """Job model for the durable processing queue"""
+    __tablename__ = 'jobs'
+    
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(50), nullable=False)  # fetch_mailbox, process_emails
+    payload = Column(JSON, nullable=True)
+    status = Column(String(20), default='queued', nullable=False)  # queued, leased, done, failed
+    priority = Column(Integer, default=0, nullable=False)  # Higher runs first
+    attempts = Column(Integer, default=0, nullable=False)
+    max_attempts = Column(Integer, default=5, nullable=False)
+    available_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)  # Not claimable before this
+    leased_until = Column(DateTime, nullable=True)  # Lease expiry; expired leases are claimable again
+    lease_owner = Column(String(255), nullable=True)  # Worker ID holding the lease
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+    
+    __table_args__ = (
+        Index('ix_jobs_claim', 'status', 'available_at'),
+        Index('ix_jobs_status_updated_at', 'status', 'updated_at'),  # Purge of finished jobs
+    )
+    
+    def __repr__(self):
+        return f"<Job(id={self.id}, kind='{self.kind}', status='{self.status}')>"
+
+
+class Counter(Base):
+    """Counter model for incrementally maintained row counts (see app.models.counters)"""
+    __tablename__ = 'counters'
+    
+    name = Column(String(255), primary_key=True)  # e.g. emails, emails.status:processed
+    value = Column(Integer, default=0, nullable=False)
+    
+    def __repr__(self):
+        return f"<Counter(name='{self.name}', value={self.value})>"
+
+
 class User(Base):
     """User model for admin interface authentication"""
     __tablename__ = 'users'
@@ -116,3 +175,7 @@ class User(Base):
     
     def __repr__(self):
         return f"<User(id={self.id}, username='{self.username}')>"
+
+
+# Keep counters in step with row changes on every flush
+from app.models import counters  # noqa: E402,F401
@@ -2,25 +2,32 @@
 Main initialization file for utils package
 """
 
-from app.utils.db import get_db, engine, SessionLocal, Base
+from app.utils.db import get_db, get_read_db, engine, SessionLocal, Base
 from app.utils.helpers import (
     extract_domain_from_email,
+    extract_email_address,
     match_pattern_in_text,
     format_github_issue_body,
     sanitize_input,
     validate_email,
     validate_github_repo
 )
+from app.utils.pagination import encode_cursor, decode_cursor, keyset_page
 
 __all__ = [
     'get_db',
+    'get_read_db',
     'engine',
     'SessionLocal',
     'Base',
     'extract_domain_from_email',
+    'extract_email_address',
     'match_pattern_in_text',
     'format_github_issue_body',
     'sanitize_input',
     'validate_email',
-    'validate_github_repo'
+    'validate_github_repo',
+    'encode_cursor',
+    'decode_cursor',
+    'keyset_page'
 ]
@@ -1,43 +1,236 @@
 """
 Database utilities for Smart Inbox Application
+
+The whole process shares the single engine, session factory and declarative
+base defined here. Reporting reads can be served by read replicas through
+get_read_db; writes always use the primary through get_db.
 """
 
-from sqlalchemy import create_engine
+from typing import Any, Dict, List, Optional
+import itertools
+import threading
+
+from fastapi import Request
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from starlette.datastructures import MutableHeaders
 import os
 
-from app.config.settings import DATABASE
+from app.config.settings import DATABASE, DATABASE_ENGINE
+
+def get_database_url(env: Optional[str] = None) -> str:
+    """
+    Build the database URL for an environment
+    
+    Args:
+        env: Environment name (defaults to the ENVIRONMENT variable)
+        
+    Returns:
+        SQLAlchemy database URL
+    """
+    env = env or os.getenv("ENVIRONMENT", "development")
+    db_config = DATABASE[env]
+    
+    if db_config["engine"] == "sqlite":
+        return f"sqlite:///{db_config['name']}"
+    elif db_config["engine"] == "postgresql":
+        password = os.getenv("DB_PASSWORD", db_config.get("password", ""))
+        return f"postgresql://{db_config['user']}:{password}@{db_config['host']}:{db_config['port']}/{db_config['name']}"
+    else:
+        raise ValueError(f"Unsupported database engine: {db_config['engine']}")
+
+def get_replica_urls(env: Optional[str] = None) -> List[str]:
+    """
+    Get the read replica URLs for an environment
+    
+    Args:
+        env: Environment name (defaults to the ENVIRONMENT variable)
+        
+    Returns:
+        Replica database URLs, empty when reads go to the primary
+    """
+    env = env or os.getenv("ENVIRONMENT", "development")
+    urls = os.getenv("DB_REPLICA_URLS")
+    if urls is not None:
+        return [url.strip() for url in urls.split(",") if url.strip()]
+    return list(DATABASE[env].get("replicas", []))
 
-# Determine environment
-env = os.getenv("ENVIRONMENT", "development")
-db_config = DATABASE[env]
+def set_sqlite_pragmas(engine, settings: Dict[str, Any]):
+    """
+    Apply journal mode, synchronous level and busy timeout on every new SQLite connection
+    
+    Args:
+        engine: SQLite engine
+        settings: Engine settings (see DATABASE_ENGINE)
+    """
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute(f"PRAGMA journal_mode={settings['sqlite_journal_mode']}")
+            cursor.execute(f"PRAGMA synchronous={settings['sqlite_synchronous']}")
+            cursor.execute(f"PRAGMA busy_timeout={int(settings['sqlite_busy_timeout'])}")
+        finally:
+            cursor.close()
 
-# Create database URL
-if db_config["engine"] == "sqlite":
-    SQLALCHEMY_DATABASE_URL = f"sqlite:///{db_config['name']}"
-elif db_config["engine"] == "postgresql":
-    password = os.getenv("DB_PASSWORD", db_config.get("password", ""))
-    SQLALCHEMY_DATABASE_URL = f"postgresql://{db_config['user']}:{password}@{db_config['host']}:{db_config['port']}/{db_config['name']}"
-else:
-    raise ValueError(f"Unsupported database engine: {db_config['engine']}")
+def create_db_engine(url: str, **overrides):
+    """
+    Create a database engine with the configured pool and SQLite tuning
+    
+    Args:
+        url: Database URL
+        **overrides: Values replacing DATABASE_ENGINE settings
+        
+    Returns:
+        SQLAlchemy engine
+    """
+    settings = {**DATABASE_ENGINE, **overrides}
+    database_url = make_url(url)
+    
+    if database_url.get_backend_name() != "sqlite":
+        return create_engine(
+            url,
+            pool_size=settings["pool_size"],
+            max_overflow=settings["max_overflow"],
+            pool_timeout=settings["pool_timeout"],
+            pool_recycle=settings["pool_recycle"],
+            pool_pre_ping=settings["pool_pre_ping"],
+        )
+    
+    # In-memory databases use a per-thread pool that takes no sizing options
+    in_memory = database_url.database in (None, "", ":memory:")
+    pool_options = {} if in_memory else {
+        "pool_size": settings["pool_size"],
+        "max_overflow": settings["max_overflow"],
+        "pool_timeout": settings["pool_timeout"],
+    }
+    engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False},
+        pool_pre_ping=settings["pool_pre_ping"],
+        **pool_options
+    )
+    set_sqlite_pragmas(engine, settings)
+    return engine
 
-# Create engine
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False} if db_config["engine"] == "sqlite" else {}
-)
+# Create the process-wide engine
+SQLALCHEMY_DATABASE_URL = get_database_url()
+engine = create_db_engine(SQLALCHEMY_DATABASE_URL)
 
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+class ReadOnlySession(Session):
+    """Session for replica reads that refuses to flush changes"""
+    
+    def flush(self, objects=None):
+        if self.new or self.dirty or self.deleted:
+            raise RuntimeError("Read-only session cannot write; use get_db for writes")
+        super().flush(objects)
+
+class ReadSessionRouter:
+    """Hands out read-only sessions bound to the replicas in round-robin order"""
+    
+    def __init__(self, replica_urls: List[str], primary_factory: sessionmaker):
+        """
+        Initialize the router
+        
+        Args:
+            replica_urls: Replica database URLs
+            primary_factory: Session factory used when there are no replicas
+        """
+        self.primary_factory = primary_factory
+        self.factories = [
+            sessionmaker(bind=create_db_engine(url), class_=ReadOnlySession, autocommit=False, autoflush=False)
+            for url in replica_urls
+        ]
+        self._order = itertools.cycle(range(len(self.factories)))
+        self._lock = threading.Lock()
+    
+    def __call__(self) -> Session:
+        """Open a session on the next replica, or on the primary without replicas"""
+        if not self.factories:
+            return self.primary_factory()
+        with self._lock:
+            index = next(self._order)
+        return self.factories[index]()
+
+ReadSessionLocal = ReadSessionRouter(get_replica_urls(), SessionLocal)
+
+# Header a client sends to read from the primary right after its own write
+READ_PRIMARY_HEADER = "X-Read-Primary"
+
+# Cookie set on responses to requests that wrote, so the client's next reads see its writes
+READ_PRIMARY_COOKIE = "read_primary"
+
 # Create base class for models
 Base = declarative_base()
 
 # Dependency to get database session
-def get_db():
+def get_db(request: Request = None):
     db = SessionLocal()
+    if request is not None:
+        db.info["request_state"] = request.state
+    try:
+        yield db
+    finally:
+        db.close()
+
+@event.listens_for(Session, "after_flush")
+def mark_request_wrote(session, flush_context):
+    """Remember that the request owning the session wrote to the primary"""
+    state = session.info.get("request_state")
+    if state is not None:
+        state.wrote_primary = True
+
+# Dependency to get a read-only session for list and reporting endpoints
+def get_read_db(request: Request):
+    if request.headers.get(READ_PRIMARY_HEADER) or request.cookies.get(READ_PRIMARY_COOKIE):
+        db = SessionLocal()
+    else:
+        db = ReadSessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+class ReadPrimaryMiddleware:
+    """
+    ASGI middleware pinning a client's reads to the primary after it wrote
+    
+    Responses to requests whose get_db session flushed changes set a cookie
+    that lasts for the replica lag, and get_read_db serves requests carrying
+    it from the primary, so lists reloaded right after a write include it.
+    """
+    
+    def __init__(self, app, max_age: Optional[int] = None):
+        """
+        Initialize the middleware
+        
+        Args:
+            app: ASGI application to wrap
+            max_age: Seconds reads stay on the primary after a write
+        """
+        self.app = app
+        self.max_age = max_age or DATABASE_ENGINE["read_primary_seconds"]
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        # Shared with request.state, which get_db hands to the session
+        state = scope.setdefault("state", {})
+        
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start" and state.get("wrote_primary"):
+                headers = MutableHeaders(scope=message)
+                headers.append(
+                    "set-cookie",
+                    f"{READ_PRIMARY_COOKIE}=1; Max-Age={self.max_age}; Path=/; HttpOnly; SameSite=lax"
+                )
+            await send(message)
+        
+        await self.app(scope, receive, send_with_cookie)
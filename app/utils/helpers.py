@@ -4,6 +4,7 @@ Utility functions for Smart Inbox Application
 
 import re
 import logging
+from email.utils import parseaddr
 from typing import Dict, List, Optional
 
 logger = logging.getLogger(__name__)
@@ -23,6 +24,18 @@ def extract_domain_from_email(email: str) -> Optional[str]:
     except:
         return None
 
+def extract_email_address(sender: str) -> str:
+    """
+    Extract the bare, lowercased address from a From header value
+    
+    Args:
+        sender: Header value, e.g. 'Jane Doe <jane@example.com>'
+        
+    Returns:
+        Address such as 'jane@example.com', or '' if none found
+    """
+    return parseaddr(sender or '')[1].strip().lower()
+
 def match_pattern_in_text(pattern: str, text: str) -> bool:
     """
     Check if pattern matches in text
@@ -0,0 +1,177 @@
+"""
+Buffered audit log sink for Smart Inbox Application
+
+Log rows written through a LogSink are held on the session until it
+commits, then queued in memory and written by a background thread in bulk
+inserts. Rows from a rolled back transaction are discarded, so the audit
+log still only records changes that were committed.
+"""
+
+import atexit
+import datetime
+import logging
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.config.settings import AUDIT_LOG
+from app.models.models import Log
+
+logger = logging.getLogger(__name__)
+
+# Session.info key holding the log rows of the open transaction
+PENDING_KEY = "audit_log_pending"
+
+class LogSink:
+    """Queue of committed log rows flushed in bulk every N rows or M milliseconds"""
+    
+    def __init__(self, batch_size: Optional[int] = None, flush_interval_ms: Optional[int] = None,
+                 max_buffer: Optional[int] = None, enabled: Optional[bool] = None):
+        """
+        Initialize the sink
+        
+        Args:
+            batch_size: Buffered rows that trigger a flush
+            flush_interval_ms: Longest time a row waits in the buffer
+            max_buffer: Buffered rows beyond which writers flush inline
+            enabled: Buffer rows; when False every row is added to the caller's session
+        """
+        self.batch_size = batch_size or AUDIT_LOG["batch_size"]
+        self.flush_interval = (flush_interval_ms or AUDIT_LOG["flush_interval_ms"]) / 1000.0
+        self.max_buffer = max_buffer or AUDIT_LOG["max_buffer"]
+        self.enabled = AUDIT_LOG["buffered"] if enabled is None else enabled
+        self.buffer: List[Tuple[object, Dict]] = []
+        self.condition = threading.Condition()
+        self.flush_lock = threading.Lock()
+        self.thread: Optional[threading.Thread] = None
+        self.stopping = False
+    
+    def write(self, db: Session, critical: bool = False, **fields):
+        """
+        Record a log entry
+        
+        Args:
+            db: Session whose transaction the entry belongs to
+            critical: Insert the row in the session's own transaction instead of buffering it
+            **fields: Log column values
+        """
+        if critical or not self.enabled:
+            db.add(Log(**fields))
+            return
+        fields.setdefault("timestamp", datetime.datetime.utcnow())
+        if not db.in_transaction():
+            # Tie the row to a transaction so a rollback discards it
+            db.begin()
+        db.info.setdefault(PENDING_KEY, []).append((self, fields))
+    
+    def submit(self, bind, rows: List[Dict]):
+        """
+        Queue committed log rows for the background writer
+        
+        Args:
+            bind: Engine the rows are inserted with
+            rows: Log column values
+        """
+        with self.condition:
+            self.buffer.extend((bind, row) for row in rows)
+            size = len(self.buffer)
+            if self.thread is None and not self.stopping:
+                self.thread = threading.Thread(target=self.run, name="audit-log-sink", daemon=True)
+                self.thread.start()
+            if size >= self.batch_size:
+                self.condition.notify()
+        
+        # Backpressure when the writer falls behind
+        if size > self.max_buffer:
+            self.flush()
+    
+    def flush(self) -> int:
+        """
+        Insert all buffered rows
+        
+        Returns:
+            Number of rows written
+        """
+        with self.flush_lock:
+            with self.condition:
+                pending, self.buffer = self.buffer, []
+            if not pending:
+                return 0
+            
+            by_bind = defaultdict(list)
+            for bind, row in pending:
+                by_bind[bind].append(row)
+            
+            written = 0
+            for bind, rows in by_bind.items():
+                try:
+                    with bind.begin() as connection:
+                        connection.execute(Log.__table__.insert(), rows)
+                    written += len(rows)
+                except Exception as e:
+                    logger.error(f"Error writing {len(rows)} audit log rows: {str(e)}")
+                    self.requeue(bind, rows)
+            return written
+    
+    def requeue(self, bind, rows: List[Dict]):
+        """Put rows from a failed flush back in the buffer, dropping the oldest beyond max_buffer"""
+        with self.condition:
+            self.buffer[:0] = [(bind, row) for row in rows]
+            overflow = len(self.buffer) - self.max_buffer
+            if overflow > 0:
+                del self.buffer[:overflow]
+                logger.error(f"Audit log buffer full, dropped {overflow} rows")
+    
+    def run(self):
+        """Background loop flushing when a batch fills or the interval elapses"""
+        while True:
+            with self.condition:
+                if not self.stopping and len(self.buffer) < self.batch_size:
+                    self.condition.wait(self.flush_interval)
+                stopping = self.stopping
+            self.flush()
+            if stopping:
+                return
+    
+    def close(self, timeout: float = 5):
+        """
+        Stop the background writer and flush the remaining rows
+        
+        Args:
+            timeout: Seconds to wait for the background writer
+        """
+        with self.condition:
+            self.stopping = True
+            thread = self.thread
+            self.condition.notify()
+        if thread is not None:
+            thread.join(timeout)
+        self.flush()
+        with self.condition:
+            self.thread = None
+            self.stopping = False
+
+@event.listens_for(Session, "after_commit")
+def submit_pending_logs(session):
+    """Hand the log rows of a committed transaction to their sinks"""
+    pending = session.info.pop(PENDING_KEY, None)
+    if not pending:
+        return
+    by_sink = defaultdict(list)
+    for sink, row in pending:
+        by_sink[sink].append(row)
+    bind = session.get_bind()
+    for sink, rows in by_sink.items():
+        sink.submit(bind, rows)
+
+@event.listens_for(Session, "after_soft_rollback")
+def discard_pending_logs(session, previous_transaction):
+    """Drop the log rows of a rolled back transaction"""
+    session.info.pop(PENDING_KEY, None)
+
+# Process-wide sink, flushed on shutdown
+audit_log = LogSink()
+atexit.register(audit_log.close)
@@ -0,0 +1,188 @@
+"""
+Versioned schema migrations for Smart Inbox Application
+"""
+
+import datetime
+import logging
+from typing import Callable, List, Tuple
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import CreateIndex
+
+logger = logging.getLogger(__name__)
+
+metadata = MetaData()
+
+schema_migrations = Table(
+    "schema_migrations",
+    metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String(255), nullable=False),
+    Column("applied_at", DateTime, default=datetime.datetime.utcnow),
+)
+
+def create_missing_indexes(engine, table_names: List[str]):
+    """
+    Create model indexes missing from existing tables
+    
+    On PostgreSQL the indexes are built CONCURRENTLY so large tables stay
+    writable while the migration runs.
+    
+    Args:
+        engine: Database engine
+        table_names: Tables whose declared indexes should exist
+    """
+    from app.models.models import Base
+    
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    for table_name in table_names:
+        if table_name not in existing_tables:
+            continue
+        existing = {index["name"] for index in inspector.get_indexes(table_name)}
+        for index in Base.metadata.tables[table_name].indexes:
+            if index.name in existing:
+                continue
+            logger.info(f"Creating index {index.name} on {table_name}")
+            if engine.dialect.name == "postgresql":
+                columns = ", ".join(column.name for column in index.columns)
+                with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+                    connection.execute(text(
+                        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index.name} ON {table_name} ({columns})"
+                    ))
+            else:
+                with engine.begin() as connection:
+                    connection.execute(CreateIndex(index, if_not_exists=True))
+
+def add_missing_columns(engine, table_name: str, column_names: List[str]):
+    """
+    Add model columns missing from an existing table
+    
+    Args:
+        engine: Database engine
+        table_name: Table to alter
+        column_names: Columns that should exist
+    """
+    from app.models.models import Base
+    
+    inspector = inspect(engine)
+    if table_name not in inspector.get_table_names():
+        return
+    existing = {column["name"] for column in inspector.get_columns(table_name)}
+    table = Base.metadata.tables[table_name]
+    for name in column_names:
+        if name in existing:
+            continue
+        column = table.c[name]
+        definition = f"{name} {column.type.compile(dialect=engine.dialect)}"
+        if column.server_default is not None:
+            definition += f" DEFAULT {column.server_default.arg}"
+        if not column.nullable:
+            definition += " NOT NULL"
+        logger.info(f"Adding column {name} to {table_name}")
+        with engine.begin() as connection:
+            connection.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {definition}"))
+
+def add_secondary_indexes(engine):
+    """Indexes for email list, system stats, log search and rule lookups"""
+    create_missing_indexes(engine, ["emails", "logs", "routing_rules"])
+
+def add_counters(engine):
+    """Counters table for /system/stats, seeded from the existing rows"""
+    from sqlalchemy.orm import Session
+    from app.models.counters import rebuild_counters
+    from app.models.models import Counter
+    
+    Counter.__table__.create(bind=engine, checkfirst=True)
+    with Session(engine) as db:
+        rebuild_counters(db)
+
+def partition_logs(engine):
+    """Logs partitioned by month on PostgreSQL, so retention drops whole partitions"""
+    from app.backend.retention.log_archive import partition_logs as convert
+    
+    convert(engine)
+
+def add_email_search(engine):
+    """Full-text index over email subject, sender and body"""
+    from app.backend.search.email_search import install_search_index
+    
+    install_search_index(engine)
+
+def add_email_retry(engine):
+    """Retry attempt count and schedule for emails whose routing failed"""
+    add_missing_columns(engine, "emails", ["routing_attempts", "next_attempt_at"])
+    create_missing_indexes(engine, ["emails"])
+
+def add_client_priority(engine):
+    """Client priority selecting the ingestion pipeline lane"""
+    add_missing_columns(engine, "clients", ["priority"])
+
+def add_job_purge_index(engine):
+    """Index for purging finished jobs past their retention"""
+    create_missing_indexes(engine, ["jobs"])
+
+def add_classification_source(engine):
+    """Source of each email's classification, so learning reads only trusted outcomes"""
+    add_missing_columns(engine, "emails", ["classification_source"])
+
+def add_processed_at_index(engine):
+    """Index for topping up the nearest-neighbour index with recently processed emails"""
+    create_missing_indexes(engine, ["emails"])
+
+# Ordered (version, name, migration) entries; append only
+MIGRATIONS: List[Tuple[int, str, Callable]] = [
+    (1, "secondary_indexes", add_secondary_indexes),
+    (2, "counters", add_counters),
+    (3, "partitioned_logs", partition_logs),
+    (4, "email_search", add_email_search),
+    (5, "email_retry", add_email_retry),
+    (6, "client_priority", add_client_priority),
+    (7, "job_purge_index", add_job_purge_index),
+    (8, "classification_source", add_classification_source),
+    (9, "processed_at_index", add_processed_at_index),
+]
+
+def applied_versions(engine) -> set:
+    """Get the versions already recorded in schema_migrations"""
+    with engine.connect() as connection:
+        return set(connection.execute(select(schema_migrations.c.version)).scalars())
+
+def run_migrations(engine) -> List[str]:
+    """
+    Apply pending migrations in version order
+    
+    Migrations are idempotent, so a migration interrupted before it was
+    recorded is safely re-run.
+    
+    Args:
+        engine: Database engine
+        
+    Returns:
+        Names of the migrations applied
+    """
+    metadata.create_all(bind=engine)
+    done = applied_versions(engine)
+    applied = []
+    for version, name, migration in MIGRATIONS:
+        if version in done:
+            continue
+        logger.info(f"Applying migration {version}: {name}")
+        migration(engine)
+        try:
+            with engine.begin() as connection:
+                connection.execute(schema_migrations.insert().values(version=version, name=name))
+        except IntegrityError:
+            # Another process applied and recorded it concurrently
+            continue
+        applied.append(name)
+    return applied
+
+if __name__ == "__main__":
+    from app.models.models import Base
+    from app.utils.db import engine
+    
+    logging.basicConfig(level=logging.INFO)
+    Base.metadata.create_all(bind=engine)
+    print(f"Applied migrations: {run_migrations(engine) or 'none'}")
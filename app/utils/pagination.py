@@ -0,0 +1,89 @@
+"""
+Keyset (cursor) pagination utilities for Smart Inbox Application
+"""
+
+import base64
+import datetime
+import json
+from typing import Any, List, Optional, Tuple
+
+from sqlalchemy import tuple_
+
+def encode_cursor(values: List[Any]) -> str:
+    """
+    Encode the sort key of the last row of a page as an opaque cursor
+    
+    Args:
+        values: Sort key values (datetimes are stored in ISO format)
+        
+    Returns:
+        URL-safe cursor string
+    """
+    payload = [
+        {"dt": value.isoformat()} if isinstance(value, datetime.datetime) else value
+        for value in values
+    ]
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """
+    Decode a cursor created by encode_cursor
+    
+    Args:
+        cursor: Cursor string
+        size: Expected number of sort key values
+        
+    Returns:
+        Sort key values
+        
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values = [
+            datetime.datetime.fromisoformat(value["dt"]) if isinstance(value, dict) else value
+            for value in payload
+        ]
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if len(values) != size:
+        raise ValueError("Invalid cursor")
+    return values
+
+def keyset_page(query, columns: List, cursor: Optional[str], limit: int, descending: bool = True) -> Tuple[List, Optional[str]]:
+    """
+    Fetch one page of a query ordered by a unique sort key
+    
+    Rows are located by comparing the sort key with the cursor, so with an
+    index on the key every page costs the same as the first, and rows
+    inserted meanwhile do not shift later pages.
+    
+    Args:
+        query: SQLAlchemy query without ordering or limit
+        columns: Sort key columns, ending with a unique column such as the ID
+        cursor: Cursor from the previous page, or None for the first page
+        limit: Page size
+        descending: Sort newest first
+        
+    Returns:
+        Tuple of (rows, next_cursor or None on the last page)
+        
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    key = tuple_(*columns)
+    if cursor:
+        values = decode_cursor(cursor, len(columns))
+        query = query.filter(key < tuple_(*values) if descending else key > tuple_(*values))
+    
+    order = [column.desc() if descending else column.asc() for column in columns]
+    rows = query.order_by(*order).limit(limit + 1).all()
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, column.key) for column in columns])
+    return rows, next_cursor
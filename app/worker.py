@@ -0,0 +1,46 @@
+"""
+Queue worker entry point for the Smart Inbox Application
+"""
+
+import argparse
+import logging
+import signal
+
+from app.config.settings import LOGGING
+
+# Configure logging
+logging.basicConfig(
+    level=getattr(logging, LOGGING["level"]),
+    format=LOGGING["format"],
+    filename=LOGGING["file"]
+)
+logger = logging.getLogger(__name__)
+
+def start():
+    """Start a queue worker; run one per process, on as many hosts as needed"""
+    from app.backend.queue.worker import QueueWorker
+    from app.utils.db import SessionLocal
+    from app.utils.log_sink import audit_log
+    
+    parser = argparse.ArgumentParser(description="Smart Inbox queue worker")
+    parser.add_argument("--once", action="store_true", help="Exit when the queue is empty")
+    args = parser.parse_args()
+    
+    worker = QueueWorker(SessionLocal)
+    
+    def handle_signal(signum, frame):
+        logger.info(f"Received signal {signum}, stopping after the current job")
+        worker.stop()
+    
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+    
+    logger.info(f"Starting Smart Inbox queue worker {worker.worker_id}")
+    try:
+        worker.run(once=args.once)
+    finally:
+        worker.pipeline.routing_engine.close()
+        audit_log.close()
+
+if __name__ == "__main__":
+    start()
@@ -0,0 +1,95 @@
+"""
+Concurrent request latency load test for the Smart Inbox API
+
+Runs concurrent clients against a database-backed endpoint while probing a
+lightweight endpoint, and reports latency percentiles for both. When route
+handlers block the event loop, probe latency climbs with the load; when
+they run in the threadpool, probes stay fast.
+
+Usage:
+    python scripts/load_test.py --base-url http://localhost:8000 \
+        --path "/api/emails/?limit=500" --concurrency 16 --duration 20
+"""
+
+import argparse
+import threading
+import time
+import urllib.error
+import urllib.request
+from typing import Dict, List
+
+def percentile(samples: List[float], p: float) -> float:
+    """Nearest-rank percentile of latency samples in seconds"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(p / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+def request(url: str, timeout: float) -> bool:
+    """Issue a GET request and read the full response"""
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            response.read()
+            return 200 <= response.status < 300
+    except (urllib.error.URLError, OSError):
+        return False
+
+def run_client(url: str, deadline: float, timeout: float, results: Dict, lock: threading.Lock, pause: float = 0.0):
+    """Request a URL in a loop until the deadline, recording latencies"""
+    while time.monotonic() < deadline:
+        start = time.monotonic()
+        ok = request(url, timeout)
+        elapsed = time.monotonic() - start
+        with lock:
+            results["latencies"].append(elapsed)
+            if not ok:
+                results["errors"] += 1
+        if pause:
+            time.sleep(pause)
+
+def report(name: str, results: Dict, duration: float):
+    """Print latency percentiles for one endpoint"""
+    latencies = results["latencies"]
+    print(
+        f"{name:<6} requests={len(latencies):<6} errors={results['errors']:<4} "
+        f"rps={len(latencies) / duration:7.1f} "
+        f"p50={percentile(latencies, 50) * 1000:8.1f}ms "
+        f"p95={percentile(latencies, 95) * 1000:8.1f}ms "
+        f"max={max(latencies, default=0) * 1000:8.1f}ms"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Smart Inbox API concurrent latency test")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--path", default="/api/emails/?limit=500", help="Database-backed endpoint under load")
+    parser.add_argument("--probe-path", default="/", help="Lightweight endpoint probed during the load")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    args = parser.parse_args()
+    
+    deadline = time.monotonic() + args.duration
+    lock = threading.Lock()
+    load = {"latencies": [], "errors": 0}
+    probe = {"latencies": [], "errors": 0}
+    
+    threads = [
+        threading.Thread(target=run_client, args=(args.base_url + args.path, deadline, args.timeout, load, lock))
+        for _ in range(args.concurrency)
+    ]
+    threads.append(threading.Thread(
+        target=run_client,
+        args=(args.base_url + args.probe_path, deadline, args.timeout, probe, lock, 0.05)
+    ))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    print(f"{args.concurrency} clients on {args.path}, probing {args.probe_path} for {args.duration:.0f}s")
+    report("load", load, args.duration)
+    report("probe", probe, args.duration)
+
+if __name__ == "__main__":
+    main()
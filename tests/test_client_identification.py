@@ -11,7 +11,7 @@ import json
 # Add parent directory to path to import app modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app.backend.routes.email_routes import identify_client
+from app.backend.pipeline.ingestion import identify_client
 from app.models.models import Client
 
 class TestClientIdentification(unittest.TestCase):
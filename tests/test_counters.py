@@ -0,0 +1,103 @@
+"""
+Test script for incrementally maintained counters
+"""
+
+import os
+import sys
+import unittest
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# Add parent directory to path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.models import Base, Client, Email, RoutingRule
+from app.models.counters import read_counters, rebuild_counters
+
+class TestCounters(unittest.TestCase):
+    """Test cases for counters kept in step with row changes"""
+    
+    def setUp(self):
+        """Set up an in-memory database"""
+        engine = create_engine(
+            "sqlite://",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool
+        )
+        Base.metadata.create_all(bind=engine)
+        self.db = sessionmaker(bind=engine)()
+    
+    def tearDown(self):
+        """Clean up after tests"""
+        self.db.close()
+    
+    def add_email(self, i, **kwargs):
+        email = Email(message_id=f"<{i}@example.com>", sender="a@example.com", recipient="b@example.com", **kwargs)
+        self.db.add(email)
+        return email
+    
+    def assertCountersMatchRebuild(self):
+        counters = {name: value for name, value in read_counters(self.db).items() if value}
+        rebuilt = {name: value for name, value in rebuild_counters(self.db).items() if value}
+        self.assertEqual(counters, rebuilt)
+    
+    def test_inserts_updates_and_deletes(self):
+        """Test that counters follow status changes within transactions"""
+        client = Client(name="Acme")
+        self.db.add(client)
+        self.db.add(RoutingRule(client=client, classification="technical", action="github_issue", destination="o/r"))
+        emails = [self.add_email(i) for i in range(5)]
+        self.db.commit()
+        
+        counters = read_counters(self.db)
+        self.assertEqual(counters["emails"], 5)
+        self.assertEqual(counters["emails.status:pending"], 5)
+        self.assertEqual(counters["clients"], 1)
+        self.assertEqual(counters["routing_rules.active"], 1)
+        
+        emails[0].status = "processed"
+        emails[0].routing_action = "email_forward"
+        emails[1].routing_action = "manual_review"
+        emails[2].status = "error"
+        self.db.delete(emails[3])
+        client.routing_rules[0].active = False
+        self.db.commit()
+        
+        counters = read_counters(self.db)
+        self.assertEqual(counters["emails"], 4)
+        self.assertEqual(counters["emails.status:pending"], 2)
+        self.assertEqual(counters["emails.status:processed"], 1)
+        self.assertEqual(counters["emails.status:error"], 1)
+        self.assertEqual(counters["emails.status_action:pending:manual_review"], 1)
+        self.assertEqual(counters["routing_rules.active"], 0)
+        self.assertCountersMatchRebuild()
+    
+    def test_rollback_discards_changes(self):
+        """Test that counters roll back with the rows they count"""
+        self.add_email(1)
+        self.db.commit()
+        
+        self.add_email(2)
+        self.db.flush()
+        self.assertEqual(read_counters(self.db)["emails"], 2)
+        self.db.rollback()
+        
+        self.assertEqual(read_counters(self.db)["emails"], 1)
+    
+    def test_rebuild_matches_existing_rows(self):
+        """Test that a rebuild seeds counters for rows written before tracking"""
+        for i in range(3):
+            self.add_email(i, status="processed")
+        self.db.commit()
+        self.db.execute(Base.metadata.tables["counters"].delete())
+        self.db.commit()
+        
+        counters = rebuild_counters(self.db)
+        self.assertEqual(counters["emails"], 3)
+        self.assertEqual(counters["emails.status:processed"], 3)
+        self.assertEqual(read_counters(self.db)["emails.status:processed"], 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,155 @@
+"""
+Test script for the shared database engine factory
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+from starlette.requests import Request
+
+# Add parent directory to path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models import models
+from app.utils import db
+
+class TestDatabaseEngine(unittest.TestCase):
+    """Test cases for engine pooling and SQLite tuning"""
+    
+    def setUp(self):
+        """Set up a file database in a temporary directory"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.engine = db.create_db_engine(f"sqlite:///{os.path.join(self.tmpdir.name, 'test.db')}")
+    
+    def tearDown(self):
+        """Clean up after tests"""
+        self.engine.dispose()
+        self.tmpdir.cleanup()
+    
+    def test_sqlite_pragmas(self):
+        """Test WAL mode, synchronous level and busy timeout on new connections"""
+        with self.engine.connect() as connection:
+            self.assertEqual(connection.execute(text("PRAGMA journal_mode")).scalar(), "wal")
+            self.assertEqual(connection.execute(text("PRAGMA synchronous")).scalar(), 1)  # NORMAL
+            self.assertEqual(connection.execute(text("PRAGMA busy_timeout")).scalar(), 5000)
+    
+    def test_pool_settings(self):
+        """Test pool sizing from settings and overrides"""
+        self.assertEqual(self.engine.pool.size(), db.DATABASE_ENGINE["pool_size"])
+        engine = db.create_db_engine("sqlite://", pool_size=3)
+        with engine.connect() as connection:
+            self.assertEqual(connection.execute(text("SELECT 1")).scalar(), 1)
+        engine.dispose()
+    
+    def test_reader_not_blocked_by_writer(self):
+        """Test that a read completes while a write transaction is open"""
+        models.Base.metadata.create_all(bind=self.engine)
+        with self.engine.connect() as writer:
+            writer.execute(text("BEGIN EXCLUSIVE"))
+            writer.execute(models.Client.__table__.insert().values(name="Acme"))
+            with self.engine.connect() as reader:
+                reader.execute(text("PRAGMA busy_timeout=0"))
+                self.assertEqual(reader.execute(text("SELECT count(*) FROM clients")).scalar(), 0)
+            writer.execute(text("COMMIT"))
+    
+    def test_single_declarative_base(self):
+        """Test that the models share the declarative base of the db module"""
+        self.assertIs(models.Base, db.Base)
+
+class TestReadReplicas(unittest.TestCase):
+    """Test cases for read replica routing"""
+    
+    def setUp(self):
+        """Set up a primary and two replica file databases"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.urls = [f"sqlite:///{os.path.join(self.tmpdir.name, name)}" for name in ("primary.db", "r1.db", "r2.db")]
+        self.engines = [db.create_db_engine(url) for url in self.urls]
+        for name, engine in zip(("primary", "r1", "r2"), self.engines):
+            models.Base.metadata.create_all(bind=engine)
+            with engine.begin() as connection:
+                connection.execute(models.Client.__table__.insert().values(name=name))
+        self.primary = sessionmaker(bind=self.engines[0])
+        self.router = db.ReadSessionRouter(self.urls[1:], self.primary)
+    
+    def tearDown(self):
+        """Clean up after tests"""
+        for factory in self.router.factories:
+            factory.kw["bind"].dispose()
+        for engine in self.engines:
+            engine.dispose()
+        self.tmpdir.cleanup()
+    
+    def read_name(self, session):
+        try:
+            return session.query(models.Client.name).scalar()
+        finally:
+            session.close()
+    
+    def test_round_robin(self):
+        """Test that read sessions alternate between the replicas"""
+        names = [self.read_name(self.router()) for _ in range(4)]
+        self.assertEqual(names, ["r1", "r2", "r1", "r2"])
+    
+    def test_no_replicas_uses_primary(self):
+        """Test that reads fall back to the primary without replicas"""
+        router = db.ReadSessionRouter([], self.primary)
+        self.assertEqual(self.read_name(router()), "primary")
+    
+    def test_read_session_refuses_writes(self):
+        """Test that a replica session cannot flush changes"""
+        session = self.router()
+        session.add(models.Client(name="Acme"))
+        with self.assertRaises(RuntimeError):
+            session.commit()
+        session.close()
+    
+    def test_read_primary_header(self):
+        """Test that clients can ask to read their own writes from the primary"""
+        request = Request({"type": "http", "headers": [(db.READ_PRIMARY_HEADER.lower().encode(), b"1")]})
+        dependency = db.get_read_db(request)
+        session = next(dependency)
+        self.assertIs(session.get_bind(), db.engine)
+        dependency.close()
+    
+    def call_app(self, write: bool):
+        """Run a request through ReadPrimaryMiddleware, writing with get_db if asked"""
+        messages = []
+        
+        async def endpoint(scope, receive, send):
+            dependency = db.get_db(Request(scope))
+            session = next(dependency)
+            if write:
+                session.add(models.Client(name="Acme"))
+                session.commit()
+            dependency.close()
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+        
+        async def send(message):
+            messages.append(message)
+        
+        with patch.object(db, "SessionLocal", self.primary):
+            asyncio.run(db.ReadPrimaryMiddleware(endpoint, max_age=5)({"type": "http", "headers": []}, None, send))
+        return [value.decode() for name, value in messages[0]["headers"] if name == b"set-cookie"]
+    
+    def test_reads_follow_writes_to_primary(self):
+        """Test that a write pins the client's next reads to the primary"""
+        self.assertEqual(self.call_app(write=False), [])
+        cookies = self.call_app(write=True)
+        self.assertEqual(len(cookies), 1)
+        self.assertTrue(cookies[0].startswith(f"{db.READ_PRIMARY_COOKIE}=1; Max-Age=5"))
+        
+        request = Request({"type": "http", "headers": [(b"cookie", cookies[0].split(";")[0].encode())]})
+        dependency = db.get_read_db(request)
+        session = next(dependency)
+        self.assertIs(session.get_bind(), db.engine)
+        dependency.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+"""
+Test script for full-text email search
+"""
+
+import datetime
+import os
+import sys
+import unittest
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# Add parent directory to path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.models import Base, Client, Email
+from app.backend.search.email_search import fts5_query, install_search_index, search_emails
+
+class TestEmailSearch(unittest.TestCase):
+    """Test cases for the incrementally maintained search index"""
+    
+    def setUp(self):
+        """Set up an in-memory database with an email indexed at creation"""
+        self.engine = create_engine(
+            "sqlite://",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool
+        )
+        Base.metadata.create_all(bind=self.engine)
+        self.db = sessionmaker(bind=self.engine)()
+        self.db.add_all([Client(id=1, name="Acme"), Client(id=2, name="Globex")])
+        self.add_email(1, "Invoice for March", "billing@acmecorp.com", "Please find the invoice attached.", 1, "administrative")
+        self.db.commit()
+        install_search_index(self.engine)
+    
+    def tearDown(self):
+        """Clean up after tests"""
+        self.db.close()
+    
+    def add_email(self, i, subject, sender, body, client_id, classification, received_at=None):
+        self.db.add(Email(
+            id=i, message_id=f"<{i}@example.com>", sender=sender, recipient="support@example.com",
+            subject=subject, body=body, client_id=client_id, classification=classification,
+            received_at=received_at or datetime.datetime(2024, 3, i)
+        ))
+    
+    def test_existing_and_new_emails_indexed(self):
+        """Test that emails stored before and after the index was created are found"""
+        self.add_email(2, "Server down", "ops@globex.com", "The invoice service is down since noon.", 2, "technical")
+        self.db.commit()
+        
+        results = search_emails(self.db, "invoice")
+        # The subject match outranks the body-only match
+        self.assertEqual([result["id"] for result in results], [1, 2])
+        self.assertIn("<mark>", results[0]["snippet"])
+        self.assertGreater(results[0]["score"], results[1]["score"])
+    
+    def test_filters(self):
+        """Test filtering results by client, classification and date"""
+        self.add_email(2, "Invoice question", "ops@globex.com", "Which invoice?", 2, "commercial", datetime.datetime(2024, 3, 20))
+        self.db.commit()
+        
+        self.assertEqual([r["id"] for r in search_emails(self.db, "invoice", client_id=2)], [2])
+        self.assertEqual([r["id"] for r in search_emails(self.db, "invoice", classification="administrative")], [1])
+        self.assertEqual([r["id"] for r in search_emails(self.db, "invoice", start_date=datetime.datetime(2024, 3, 10))], [2])
+    
+    def test_updates_and_deletes_maintained(self):
+        """Test that the index follows updates and deletes"""
+        email = self.db.get(Email, 1)
+        email.subject = "Quote for April"
+        self.db.commit()
+        self.assertEqual([r["id"] for r in search_emails(self.db, "quote")], [1])
+        self.assertEqual([r["id"] for r in search_emails(self.db, "march")], [])
+        
+        self.db.delete(email)
+        self.db.commit()
+        self.assertEqual(search_emails(self.db, "quote"), [])
+    
+    def test_query_sanitized(self):
+        """Test that user input cannot inject FTS5 syntax"""
+        self.assertEqual(fts5_query('invoice" OR body:x*'), '"invoice" "OR" "body" "x"*')
+        self.assertEqual(search_emails(self.db, "***"), [])
+        self.assertEqual([r["id"] for r in search_emails(self.db, "acmecorp invoi*")], [1])
+    
+    def test_index_uses_fts(self):
+        """Test that searching reads the FTS index rather than scanning emails"""
+        plan = " ".join(row[-1] for row in self.db.execute(text(
+            "EXPLAIN QUERY PLAN SELECT e.id FROM emails_fts JOIN emails e ON e.id = emails_fts.rowid "
+            "WHERE emails_fts MATCH 'invoice'"
+        )))
+        self.assertIn("VIRTUAL TABLE INDEX", plan)
+        self.assertIn("SEARCH e USING INTEGER PRIMARY KEY", plan)
+
+if __name__ == "__main__":
+    unittest.main()
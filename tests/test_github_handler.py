@@ -111,6 +111,61 @@ class TestGitHubHandler(unittest.TestCase):
         self.assertEqual(result['status_code'], 404)
         self.assertIn('Not Found', result['error'])
     
+    @patch('app.backend.github.github_handler.Github')
+    def test_repository_and_labels_cached(self, mock_github):
+        """Test that repeated issues reuse the repository handle and create missing labels once"""
+        mock_github_instance = MagicMock()
+        mock_github.return_value = mock_github_instance
+        mock_repo = MagicMock()
+        mock_github_instance.get_repo.return_value = mock_repo
+        existing = MagicMock()
+        existing.name = 'Client-Email'
+        mock_repo.get_labels.return_value = [existing]
+        
+        handler = GitHubHandler()
+        for n in range(3):
+            result = handler.create_issue(title=f'Issue {n}', body='Body', repository='owner/repo')
+            self.assertTrue(result['success'])
+        
+        mock_github_instance.get_repo.assert_called_once_with('owner/repo')
+        mock_repo.get_labels.assert_called_once()
+        mock_repo.create_label.assert_called_once_with('auto-generated', GITHUB_API["label_color"])
+        self.assertEqual(mock_repo.create_issue.call_count, 3)
+        self.assertEqual(mock_repo.create_issue.call_args[1]['labels'], GITHUB_API["issue_labels"])
+    
+    @patch('app.backend.github.github_handler.Github')
+    def test_label_creation_failure_keeps_issue(self, mock_github):
+        """Test that a label that cannot be created is left off instead of failing the issue"""
+        from github import GithubException
+        mock_github_instance = MagicMock()
+        mock_github.return_value = mock_github_instance
+        mock_repo = MagicMock()
+        mock_github_instance.get_repo.return_value = mock_repo
+        mock_repo.get_labels.return_value = []
+        mock_repo.create_label.side_effect = [None, GithubException(403, {'message': 'Forbidden'}, None)]
+        
+        handler = GitHubHandler()
+        result = handler.create_issue(title='Test Issue', body='Body', repository='owner/repo',
+                                      labels=['bug', 'priority'])
+        
+        self.assertTrue(result['success'])
+        self.assertEqual(mock_repo.create_issue.call_args[1]['labels'], ['bug'])
+    
+    @patch('app.backend.github.github_handler.Github')
+    def test_repository_cache_expires(self, mock_github):
+        """Test that a repository is fetched again once its handle is older than the TTL"""
+        mock_github_instance = MagicMock()
+        mock_github.return_value = mock_github_instance
+        
+        handler = GitHubHandler()
+        handler.get_repository('owner/repo')
+        handler.get_repository('Owner/Repo')
+        self.assertEqual(mock_github_instance.get_repo.call_count, 1)
+        
+        handler.repo_cache_ttl = 0
+        handler.get_repository('owner/repo')
+        self.assertEqual(mock_github_instance.get_repo.call_count, 2)
+    
     def test_format_issue_from_email(self):
         """Test formatting email data into GitHub issue format"""
         handler = GitHubHandler()
@@ -0,0 +1,182 @@
+"""
+Test script for the staged ingestion pipeline
+"""
+
+import os
+import sys
+import tempfile
+import time
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# Add parent directory to path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.models import Base, Client, Email, Log
+from app.backend.email.prefilter import EmailPrefilter
+from app.backend.email.raw_archive import RawMessageArchive
+from app.backend.pipeline.ingestion import IngestionPipeline, load_emails, thread_key
+
+class TestIngestionPipeline(unittest.TestCase):
+    """Test cases for concurrent ingestion"""
+    
+    def setUp(self):
+        """Set up an in-memory database and a mocked routing engine"""
+        engine = create_engine(
+            "sqlite://",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool
+        )
+        Base.metadata.create_all(bind=engine)
+        self.engine = engine
+        self.db = sessionmaker(bind=engine)()
+        self.db.add(Client(id=1, name='Acme Corporation', domains=['acmecorp.com'], commercial_contact='sales@internal.com'))
+        self.db.commit()
+        
+        self.calls = []
+        self.lock = threading.Lock()
+        
+        def decide(email_data):
+            time.sleep(0.1)
+            with self.lock:
+                self.calls.append(email_data['subject'])
+            return {"classification": "commercial", "confidence": 0.9,
+                    "classification_source": "classifier", "needs_manual_review": False}
+        
+        self.routing_engine = MagicMock()
+        self.routing_engine.decide.side_effect = decide
+        self.routing_engine.route_decision.return_value = {
+            "success": True, "action": "email_forward", "classification": "commercial",
+            "confidence": 0.9, "destination": "sales@internal.com"
+        }
+        self.pipeline = IngestionPipeline(self.routing_engine, EmailPrefilter())
+    
+    def tearDown(self):
+        """Clean up after tests"""
+        self.db.close()
+    
+    def make_email(self, i, sender='client@acmecorp.com', headers=None):
+        """Build parsed email data"""
+        return {
+            'message_id': f'<msg{i}@acmecorp.com>',
+            'sender': sender,
+            'recipient': 'inbox@smartinbox.com',
+            'subject': f'Subject {i}',
+            'body': 'Please send a quote.',
+            'attachments': [],
+            'headers': headers or {}
+        }
+    
+    def test_concurrent_processing(self):
+        """Test that slow calls overlap instead of adding up"""
+        emails = [self.make_email(i) for i in range(16)]
+        
+        start = time.monotonic()
+        summary = self.pipeline.run(self.db, emails)
+        elapsed = time.monotonic() - start
+        
+        self.assertEqual(summary['processed'], 16)
+        self.assertLess(elapsed, 1.0)
+        self.assertEqual(self.db.query(Email).filter(Email.status == 'processed').count(), 16)
+        self.assertEqual(self.db.query(Log).filter(Log.action == 'processing').count(), 16)
+    
+    def test_outcomes(self):
+        """Test duplicates, prefiltered and unidentified emails"""
+        self.pipeline.run(self.db, [self.make_email(1)])
+        summary = self.pipeline.run(self.db, [
+            self.make_email(1),
+            self.make_email(2, headers={'auto-submitted': 'auto-replied'}),
+            self.make_email(3, sender='someone@unknown.com')
+        ])
+        
+        self.assertEqual(summary['new'], 2)
+        self.assertEqual(summary['filtered'], 1)
+        self.assertEqual(summary['unidentified'], 1)
+        self.assertEqual(self.db.query(Email).filter(Email.status == 'filtered').count(), 1)
+        unidentified = self.db.query(Email).filter(Email.message_id == '<msg3@acmecorp.com>').one()
+        self.assertEqual(unidentified.routing_action, 'manual_review')
+    
+    def test_batched_persistence(self):
+        """Test that a fetched batch uses a constant number of statements and commits"""
+        self.routing_engine.decide.side_effect = None
+        self.routing_engine.decide.return_value = {
+            "classification": "commercial", "confidence": 0.9,
+            "classification_source": "classifier", "needs_manual_review": False
+        }
+        self.pipeline.run(self.db, [self.make_email(0)])
+        
+        statements = []
+        commits = []
+        event.listen(self.engine, "before_cursor_execute",
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+        event.listen(self.engine, "commit", lambda conn: commits.append(conn))
+        
+        emails = [self.make_email(i) for i in range(60)]
+        emails += [self.make_email(i, sender='someone@unknown.com') for i in range(100, 110)]
+        summary = self.pipeline.run(self.db, emails + emails[:5])
+        
+        self.assertEqual(summary['new'], 69)
+        self.assertEqual(summary['processed'], 59)
+        self.assertEqual(summary['unidentified'], 10)
+        self.assertLessEqual(len(commits), 4)
+        self.assertLess(len(statements), 20)
+    
+    def test_raw_messages_archived(self):
+        """Test that original bytes of new emails are archived under their email IDs"""
+        with tempfile.TemporaryDirectory() as directory:
+            archive = RawMessageArchive(directory, enabled=True)
+            self.pipeline.raw_archive = archive
+            emails = [dict(self.make_email(i), raw=f'raw message {i}'.encode()) for i in range(3)]
+            self.pipeline.run(self.db, emails + emails[:1])
+            
+            for email in self.db.query(Email):
+                self.assertEqual(archive.get(email.id), f'raw message {email.message_id[4]}'.encode())
+            self.assertEqual(len(archive.index), 3)
+            archive.close()
+    
+    def test_bodies_deferred(self):
+        """Test that bodies load only when undeferred, with the pipeline loading them in bulk"""
+        self.pipeline.run(self.db, [self.make_email(i) for i in range(3)])
+        self.db.expunge_all()
+        
+        email = self.db.query(Email).first()
+        self.assertNotIn('body', email.__dict__)
+        
+        emails = load_emails(self.db, [1, 2, 3])
+        self.assertEqual(emails[2].__dict__['body'], 'Please send a quote.')
+    
+    def test_row_error_isolated(self):
+        """Test that one unpersistable result does not lose the rest of the batch"""
+        def route_decision(email_data, client_data, decision):
+            # A dict cannot be bound to the action_reference column
+            reference = {"bad": True} if email_data['subject'] == 'Subject 2' else "ok"
+            return {"success": True, "action": "email_forward", "classification": "commercial",
+                    "confidence": 0.9, "reference": reference}
+        self.routing_engine.route_decision.side_effect = route_decision
+        
+        self.pipeline.run(self.db, [self.make_email(i) for i in range(4)])
+        
+        statuses = {e.subject: e.status for e in self.db.query(Email).all()}
+        self.assertEqual(statuses['Subject 2'], 'pending')
+        self.assertEqual([statuses[f'Subject {i}'] for i in (0, 1, 3)], ['processed'] * 3)
+    
+    def test_thread_order_preserved(self):
+        """Test that emails of one conversation are processed in order"""
+        root = '<root@acmecorp.com>'
+        emails = [self.make_email(i, headers={'references': root}) for i in range(5)]
+        self.pipeline.run(self.db, emails)
+        self.assertEqual(self.calls, [f'Subject {i}' for i in range(5)])
+    
+    def test_thread_key(self):
+        """Test conversation keys from reply headers"""
+        self.assertEqual(thread_key({'message_id': '<a>', 'headers': {}}), '<a>')
+        self.assertEqual(thread_key({'message_id': '<c>', 'headers': {'in-reply-to': '<b>'}}), '<b>')
+        self.assertEqual(thread_key({'message_id': '<c>', 'headers': {'references': '<a> <b>'}}), '<a>')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,253 @@
+"""
+Test script for the durable job queue and queue worker
+"""
+
+import datetime
+import os
+import sys
+import unittest
+from unittest.mock import MagicMock, patch
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# Add parent directory to path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.models import Base, Client, Email, Job
+from app.backend.email.prefilter import EmailPrefilter
+from app.backend.pipeline.ingestion import IngestionPipeline
+from app.backend.queue.job_queue import JobQueue
+from app.backend.queue.worker import QueueWorker
+
+class TestJobQueue(unittest.TestCase):
+    """Test cases for job leasing"""
+    
+    def setUp(self):
+        """Set up an in-memory database"""
+        engine = create_engine(
+            "sqlite://",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool
+        )
+        Base.metadata.create_all(bind=engine)
+        self.Session = sessionmaker(bind=engine)
+        self.db = self.Session()
+        self.queue = JobQueue()
+    
+    def tearDown(self):
+        """Clean up after tests"""
+        self.db.close()
+    
+    def test_claim_is_exclusive(self):
+        """Test that a job is leased by only one worker"""
+        self.queue.enqueue(self.db, "fetch_mailbox")
+        other = self.Session()
+        
+        first = self.queue.claim(self.db, "worker-1")
+        second = self.queue.claim(other, "worker-2")
+        other.close()
+        
+        self.assertEqual(len(first), 1)
+        self.assertEqual(first[0].lease_owner, "worker-1")
+        self.assertEqual(first[0].attempts, 1)
+        self.assertEqual(second, [])
+    
+    def test_claim_order_and_availability(self):
+        """Test that jobs are claimed by priority and delayed jobs are skipped"""
+        low = self.queue.enqueue(self.db, "process_emails", priority=0)
+        high = self.queue.enqueue(self.db, "process_emails", priority=5)
+        self.queue.enqueue(self.db, "process_emails", priority=9, delay=60)
+        
+        jobs = self.queue.claim(self.db, "worker-1", limit=5)
+        
+        self.assertEqual([job.id for job in jobs], [high.id, low.id])
+    
+    def test_expired_lease_is_reclaimed(self):
+        """Test that a job whose lease expired becomes visible again"""
+        self.queue.enqueue(self.db, "fetch_mailbox")
+        job = self.queue.claim(self.db, "worker-1")[0]
+        job.leased_until = datetime.datetime.utcnow() - datetime.timedelta(seconds=1)
+        self.db.commit()
+        
+        jobs = self.queue.claim(self.db, "worker-2")
+        
+        self.assertEqual(len(jobs), 1)
+        self.assertEqual(jobs[0].lease_owner, "worker-2")
+        self.assertEqual(jobs[0].attempts, 2)
+        self.assertFalse(self.queue.extend_lease(self.db, job.id, "worker-1"))
+        
+        # The worker that lost the lease cannot overwrite the new owner's state
+        self.assertFalse(self.queue.complete(self.db, job, "worker-1"))
+        self.assertFalse(self.queue.fail(self.db, job, "worker-1", "boom"))
+        self.db.refresh(job)
+        self.assertEqual((job.status, job.lease_owner, job.last_error), ("leased", "worker-2", None))
+        self.assertTrue(self.queue.complete(self.db, job, "worker-2"))
+    
+    def test_enqueue_once_deduplicates(self):
+        """Test that a pending job of the same kind is reused"""
+        first = self.queue.enqueue_once(self.db, "fetch_mailbox")
+        self.assertEqual(self.queue.enqueue_once(self.db, "fetch_mailbox").id, first.id)
+        
+        job = self.queue.claim(self.db, "worker-1")[0]
+        self.assertEqual(self.queue.enqueue_once(self.db, "fetch_mailbox").id, first.id)
+        
+        self.queue.complete(self.db, job, "worker-1")
+        self.assertNotEqual(self.queue.enqueue_once(self.db, "fetch_mailbox").id, first.id)
+    
+    def test_fail_retries_then_gives_up(self):
+        """Test that failed jobs are retried with backoff until max attempts"""
+        job = self.queue.enqueue(self.db, "fetch_mailbox")
+        job.max_attempts = 2
+        self.db.commit()
+        
+        job = self.queue.claim(self.db, "worker-1")[0]
+        self.queue.fail(self.db, job, "worker-1", "boom")
+        self.assertEqual(job.status, "queued")
+        self.assertGreater(job.available_at, datetime.datetime.utcnow())
+        
+        job.available_at = datetime.datetime.utcnow()
+        self.db.commit()
+        job = self.queue.claim(self.db, "worker-1")[0]
+        self.queue.fail(self.db, job, "worker-1", "boom")
+        self.assertEqual(job.status, "failed")
+        self.assertEqual(job.last_error, "boom")
+    
+    
+    def test_purge_finished_jobs(self):
+        """Test that only finished jobs past their retention are deleted"""
+        now = datetime.datetime.utcnow()
+        ages = {"done": [1, 48], "failed": [48, 200], "queued": [500], "leased": [500]}
+        for status, hours in ages.items():
+            for age in hours:
+                self.db.add(Job(kind="fetch_mailbox", status=status, updated_at=now - datetime.timedelta(hours=age)))
+        self.db.commit()
+        self.queue.purge_batch_size = 1
+        
+        self.assertEqual(self.queue.purge(self.db, now), 2)
+        
+        remaining = sorted((job.status, round((now - job.updated_at).total_seconds() / 3600)) for job in self.db.query(Job))
+        self.assertEqual(remaining, [("done", 1), ("failed", 48), ("leased", 500), ("queued", 500)])
+
+class TestQueueWorker(unittest.TestCase):
+    """Test cases for running pipeline steps as queue jobs"""
+    
+    def setUp(self):
+        """Set up an in-memory database and a mocked routing engine"""
+        engine = create_engine(
+            "sqlite://",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool
+        )
+        Base.metadata.create_all(bind=engine)
+        self.Session = sessionmaker(bind=engine)
+        db = self.Session()
+        db.add(Client(id=1, name='Acme Corporation', domains=['acmecorp.com'], commercial_contact='sales@internal.com'))
+        db.commit()
+        db.close()
+        
+        routing_engine = MagicMock()
+        routing_engine.warmed = True
+        routing_engine.decide.return_value = {
+            "classification": "commercial", "confidence": 0.9,
+            "classification_source": "classifier", "needs_manual_review": False
+        }
+        routing_engine.route_decision.return_value = {
+            "success": True, "action": "email_forward", "classification": "commercial",
+            "confidence": 0.9, "destination": "sales@internal.com"
+        }
+        self.routing_engine = routing_engine
+        self.worker = QueueWorker(
+            self.Session,
+            pipeline=IngestionPipeline(routing_engine, EmailPrefilter()),
+            worker_id="worker-1"
+        )
+    
+    @patch('app.backend.queue.worker.routing_rule_table')
+    @patch('app.backend.queue.worker.get_email_handler')
+    def test_fetch_then_process(self, mock_get_handler, mock_rule_table):
+        """Test that a fetch job stores emails and enqueues their processing"""
+        mock_get_handler.return_value.receive_emails.return_value = [
+            {
+                'message_id': f'<{i}@acmecorp.com>',
+                'sender': 'client@acmecorp.com',
+                'recipient': 'inbox@example.com',
+                'subject': f'Quote {i}',
+                'body': 'Please send a quote',
+                'headers': {}
+            }
+            for i in range(3)
+        ]
+        db = self.Session()
+        self.worker.queue.enqueue(db, "fetch_mailbox")
+        db.close()
+        
+        self.worker.run(once=True)
+        
+        db = self.Session()
+        jobs = db.query(Job).order_by(Job.id).all()
+        self.assertEqual([job.kind for job in jobs], ["fetch_mailbox", "process_emails"])
+        self.assertTrue(all(job.status == "done" for job in jobs))
+        self.assertEqual(len(jobs[1].payload["threads"]), 3)
+        
+        emails = db.query(Email).all()
+        self.assertEqual(len(emails), 3)
+        self.assertTrue(all(email.status == "processed" for email in emails))
+        self.assertTrue(all(email.routing_action == "email_forward" for email in emails))
+        db.close()
+    
+    def test_unqueued_emails_recovered(self):
+        """Test that stored emails left without a processing job are enqueued again"""
+        db = self.Session()
+        stored_at = datetime.datetime.utcnow() - datetime.timedelta(hours=1)
+        for i in range(4):
+            db.add(Email(message_id=f'<{i}@acmecorp.com>', sender='client@acmecorp.com', recipient='inbox@example.com',
+                         subject=f'Quote {i}', body='Please send a quote', received_at=stored_at,
+                         client_id=1 if i else None))
+        db.commit()
+        # Email 2 is covered by a queued job; email 4 was just stored by a running fetch
+        self.worker.queue.enqueue(db, "process_emails", {"threads": [[2]]})
+        db.query(Email).filter(Email.id == 4).update({Email.received_at: datetime.datetime.utcnow()})
+        db.commit()
+        
+        self.assertEqual(self.worker.recover_unqueued(db), 2)
+        
+        job = db.query(Job).order_by(Job.id.desc()).first()
+        self.assertEqual(job.payload["threads"], [[1], [3]])
+        self.assertEqual(db.get(Email, 1).client_id, 1)
+        self.assertEqual(self.worker.recover_unqueued(db), 0)
+        db.close()
+    
+    def test_jobs_claimed_one_at_a_time(self):
+        """Test that only the running job is leased, so waiting jobs cannot outlive their lease"""
+        db = self.Session()
+        for _ in range(3):
+            self.worker.queue.enqueue(db, "log_retention")
+        db.close()
+        leased = []
+        self.worker.handlers["log_retention"] = lambda db, payload: leased.append(
+            db.query(Job).filter(Job.status == "leased").count()
+        )
+        
+        self.assertEqual(self.worker.run_batch(), 3)
+        
+        self.assertEqual(leased, [1, 1, 1])
+    
+    def test_failed_job_is_requeued(self):
+        """Test that a handler error releases the job for a later retry"""
+        db = self.Session()
+        self.worker.queue.enqueue(db, "unknown_kind")
+        db.close()
+        
+        self.worker.run(once=True)
+        
+        db = self.Session()
+        job = db.query(Job).one()
+        self.assertEqual(job.status, "queued")
+        self.assertEqual(job.last_error, "Unknown job kind: unknown_kind")
+        db.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+"""
+Test script for priority lanes in the ingestion pipeline
+"""
+
+import os
+import sys
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# Add parent directory to path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.models import Base, Client
+from app.backend.email.prefilter import EmailPrefilter
+from app.backend.pipeline.ingestion import IngestionPipeline
+from app.backend.pipeline.lanes import LaneScheduler, lane_for, lane_rank
+
+def conversation(client_id, priority, n=0):
+    """Build the work items of a one-email conversation"""
+    return [{"client_data": {"id": client_id, "priority": priority}, "n": n}]
+
+class TestLaneScheduler(unittest.TestCase):
+    """Test cases for weighted fair queuing between lanes"""
+    
+    def test_lane_for(self):
+        """Test that priorities map to the configured lanes"""
+        self.assertEqual(lane_for(10), "high")
+        self.assertEqual(lane_for(0), "normal")
+        self.assertEqual(lane_for(None), "normal")
+        self.assertEqual(lane_for(-5), "low")
+        self.assertGreater(lane_rank("high"), lane_rank("normal"))
+        self.assertGreater(lane_rank("normal"), lane_rank("low"))
+    
+    def test_weighted_share(self):
+        """Test that lanes with work are served in proportion to their weight"""
+        scheduler = LaneScheduler(client_concurrency=1000)
+        for n in range(100):
+            scheduler.push(conversation(1, 10, n))
+            scheduler.push(conversation(2, -1, n))
+        
+        lanes = []
+        for _ in range(90):
+            lane, items = scheduler.pop()
+            lanes.append(lane)
+            scheduler.done(lane, items)
+        self.assertEqual(lanes[0], "high")
+        self.assertEqual(lanes.count("high"), 80)
+        self.assertEqual(lanes.count("low"), 10)
+    
+    def test_high_priority_jumps_backlog(self):
+        """Test that work arriving in an idle lane is served next, without banked credit"""
+        scheduler = LaneScheduler(client_concurrency=1000)
+        for n in range(50):
+            scheduler.push(conversation(1, 0, n))
+        for _ in range(20):
+            scheduler.done(*scheduler.pop())
+        
+        scheduler.push(conversation(2, 10))
+        scheduler.push(conversation(2, 10))
+        self.assertEqual(scheduler.pop()[0], "high")
+        # Its pass starts at the current virtual time, so normal still gets its share
+        passes = [scheduler.pop()[0] for _ in range(2)]
+        self.assertIn("normal", passes)
+    
+    def test_client_concurrency_cap(self):
+        """Test that one client cannot take more than its share of workers"""
+        scheduler = LaneScheduler(client_concurrency=2)
+        for n in range(10):
+            scheduler.push(conversation(1, 0, n))
+        scheduler.push(conversation(2, 0))
+        
+        taken = [scheduler.pop() for _ in range(3)]
+        self.assertEqual(sorted(items[0]["client_data"]["id"] for _, items in taken), [1, 1, 2])
+        self.assertIsNone(scheduler.pop())
+        self.assertEqual(scheduler.depths()["normal"], {"queued": 8, "in_flight": 3})
+        
+        scheduler.done(*taken[0])
+        self.assertEqual(scheduler.pop()[1][0]["client_data"]["id"], 1)
+
+class TestPipelineLanes(unittest.TestCase):
+    """Test cases for lane scheduling in the pipeline"""
+    
+    def setUp(self):
+        """Set up an in-memory database with a bulk and a VIP client"""
+        engine = create_engine(
+            "sqlite://",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool
+        )
+        Base.metadata.create_all(bind=engine)
+        self.db = sessionmaker(bind=engine)()
+        self.db.add(Client(id=1, name='Bulk CI', domains=['bulk.com'], commercial_contact='ci@internal.com'))
+        self.db.add(Client(id=2, name='VIP', domains=['vip.com'], commercial_contact='vip@internal.com', priority=10))
+        self.db.commit()
+        
+        self.order = []
+        self.lock = threading.Lock()
+        
+        def decide(email_data):
+            time.sleep(0.01)
+            with self.lock:
+                self.order.append(email_data['sender'])
+            return {"classification": "commercial", "confidence": 0.9,
+                    "classification_source": "classifier", "needs_manual_review": False}
+        
+        routing_engine = MagicMock()
+        routing_engine.decide.side_effect = decide
+        routing_engine.route_decision.return_value = {"success": True, "action": "email_forward"}
+        self.pipeline = IngestionPipeline(routing_engine, EmailPrefilter())
+    
+    def tearDown(self):
+        """Clean up after tests"""
+        self.db.close()
+    
+    def test_vip_mail_not_stuck_behind_backlog(self):
+        """Test that a VIP email fetched after a large backlog is processed among the first"""
+        emails = [{
+            'message_id': f'<ci{i}@bulk.com>', 'sender': 'ci@bulk.com', 'recipient': 'inbox@smartinbox.com',
+            'subject': f'Build {i} failed', 'body': 'Build failed', 'attachments': [], 'headers': {}
+        } for i in range(60)]
+        emails.append({
+            'message_id': '<outage@vip.com>', 'sender': 'ops@vip.com', 'recipient': 'inbox@smartinbox.com',
+            'subject': 'Outage', 'body': 'Production is down', 'attachments': [], 'headers': {}
+        })
+        
+        summary = self.pipeline.run(self.db, emails)
+        
+        self.assertEqual(summary["processed"], 61)
+        self.assertLess(self.order.index('ops@vip.com'), 5)
+        self.assertEqual(self.pipeline.lane_depths()["high"], {"queued": 0, "in_flight": 0})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,156 @@
+"""
+Test script for LLM call deadlines, circuit breaking and hedging
+"""
+
+import os
+import sys
+import time
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+# Add parent directory to path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.backend.ai.resilience import CircuitBreaker, DeadlineCaller, LatencyTracker
+from app.backend.ai.classifier import OpenAIClassifier
+
+class TestCircuitBreaker(unittest.TestCase):
+    """Test cases for circuit breaker state transitions"""
+    
+    def test_opens_after_consecutive_failures(self):
+        """Test that the circuit opens at the failure threshold"""
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+        for _ in range(2):
+            breaker.record_failure()
+        self.assertTrue(breaker.allow_request())
+        
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow_request())
+    
+    def test_slow_calls_count_as_failures(self):
+        """Test that calls over the slow threshold open the circuit"""
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60, slow_call_threshold=1.0)
+        breaker.record_success(5.0)
+        breaker.record_success(5.0)
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+    
+    def test_half_open_probe(self):
+        """Test that a single probe is allowed after the reset timeout"""
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+        
+        self.assertTrue(breaker.allow_request())
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertFalse(breaker.allow_request())
+        
+        breaker.record_success(0.1)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(breaker.allow_request())
+    
+    def test_failed_probe_reopens(self):
+        """Test that a failed probe opens the circuit again"""
+        breaker = CircuitBreaker(failure_threshold=5, reset_timeout=0)
+        for _ in range(5):
+            breaker.record_failure()
+        self.assertTrue(breaker.allow_request())
+        
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+
+class TestDeadlineCaller(unittest.TestCase):
+    """Test cases for deadline-bound and hedged calls"""
+    
+    def test_returns_result(self):
+        """Test a call completing within the deadline"""
+        caller = DeadlineCaller(max_workers=2, deadline=1.0)
+        self.assertEqual(caller.call(lambda x: x * 2, 21), 42)
+    
+    def test_deadline_exceeded(self):
+        """Test that slow calls raise once the deadline passes"""
+        caller = DeadlineCaller(max_workers=2, deadline=0.05)
+        start = time.monotonic()
+        with self.assertRaises(TimeoutError):
+            caller.call(time.sleep, 1)
+        self.assertLess(time.monotonic() - start, 0.5)
+    
+    def test_error_propagates(self):
+        """Test that call errors are raised to the caller"""
+        caller = DeadlineCaller(max_workers=2, deadline=1.0)
+        with self.assertRaises(ValueError):
+            caller.call(int, 'not a number')
+    
+    def test_hedged_request(self):
+        """Test that a second request fires once the first exceeds p95 latency"""
+        latency = LatencyTracker(min_samples=1)
+        latency.record(0.01)
+        caller = DeadlineCaller(max_workers=2, deadline=2.0, hedge=True, latency=latency)
+        
+        calls = []
+        lock = threading.Lock()
+        
+        def flaky():
+            with lock:
+                calls.append(1)
+                first = len(calls) == 1
+            time.sleep(1.0 if first else 0.01)
+            return "hedged" if not first else "slow"
+        
+        start = time.monotonic()
+        self.assertEqual(caller.call(flaky), "hedged")
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual(len(calls), 2)
+
+
+class TestOpenAIClassifierFallback(unittest.TestCase):
+    """Test cases for local fallback in the OpenAI classifier"""
+    
+    def setUp(self):
+        """Set up test environment"""
+        self.env_patcher = patch.dict('os.environ', {'OPENAI_API_KEY': 'test_api_key'})
+        self.env_patcher.start()
+        self.technical_email = "We get a server error from the api endpoint, please fix this bug."
+    
+    def tearDown(self):
+        """Clean up after tests"""
+        self.env_patcher.stop()
+    
+    @patch('app.backend.ai.classifier.openai.ChatCompletion.create')
+    def test_api_error_uses_local_classifier(self, mock_openai):
+        """Test that API errors fall back to the keyword classifier"""
+        mock_openai.side_effect = Exception("Service Unavailable")
+        
+        classifier = OpenAIClassifier()
+        classification, confidence = classifier.classify_email(self.technical_email)
+        
+        self.assertEqual(classification, "technical")
+        self.assertEqual(classifier.circuit_breaker.consecutive_failures, 1)
+    
+    @patch('app.backend.ai.classifier.openai.ChatCompletion.create')
+    def test_open_circuit_skips_api(self, mock_openai):
+        """Test that an open circuit routes straight to the local classifier"""
+        classifier = OpenAIClassifier()
+        for _ in range(classifier.circuit_breaker.failure_threshold):
+            classifier.circuit_breaker.record_failure()
+        
+        classification, _ = classifier.classify_email(self.technical_email)
+        
+        mock_openai.assert_not_called()
+        self.assertEqual(classification, "technical")
+    
+    @patch('app.backend.ai.classifier.openai.ChatCompletion.create')
+    def test_request_timeout_passed(self, mock_openai):
+        """Test that the per-call deadline is passed to the client library"""
+        mock_response = MagicMock()
+        mock_response.choices[0].message.content = "technical,0.85"
+        mock_openai.return_value = mock_response
+        
+        classifier = OpenAIClassifier()
+        classifier.classify_email(self.technical_email)
+        
+        self.assertEqual(mock_openai.call_args.kwargs['request_timeout'], classifier.request_timeout)
+
+if __name__ == '__main__':
+    unittest.main()
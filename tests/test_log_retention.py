@@ -0,0 +1,99 @@
+"""
+Test script for log retention and archive search
+"""
+
+import datetime
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from fastapi import Response
+from sqlalchemy.orm import sessionmaker
+
+# Add parent directory to path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.models import Base, Log
+from app.utils.db import create_db_engine
+from app.backend.retention.log_archive import archived_months, run_retention, search_archive
+from app.backend.routes.system_routes import get_logs
+
+NOW = datetime.datetime(2024, 7, 15, 12, 0)
+
+class TestLogRetention(unittest.TestCase):
+    """Test cases for archiving expired log segments"""
+    
+    def setUp(self):
+        """Set up a file database with logs spread over seven months"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.archive_dir = os.path.join(self.tmpdir.name, "archive")
+        self.engine = create_db_engine(f"sqlite:///{os.path.join(self.tmpdir.name, 'test.db')}")
+        Base.metadata.create_all(bind=self.engine)
+        self.db = sessionmaker(bind=self.engine)()
+        for month in range(1, 8):
+            for day in (1, 10, 20):
+                self.db.add(Log(
+                    timestamp=datetime.datetime(2024, month, day),
+                    email_id=month,
+                    action="processing",
+                    status="failure" if day == 10 else "success"
+                ))
+        self.db.commit()
+        self.settings = patch.dict(
+            "app.backend.retention.log_archive.LOG_RETENTION",
+            {"retention_days": 90, "archive_dir": self.archive_dir, "delete_batch_size": 2}
+        )
+        self.settings.start()
+    
+    def tearDown(self):
+        """Clean up after tests"""
+        self.settings.stop()
+        self.db.close()
+        self.engine.dispose()
+        self.tmpdir.cleanup()
+    
+    def test_expired_months_archived_and_removed(self):
+        """Test that months past the retention window move to archive files"""
+        summary = run_retention(self.engine, now=NOW)
+        
+        # 90 days before July 15 falls in April, so January-March are expired
+        self.assertEqual(summary["archived"], 9)
+        self.assertEqual(summary["segments"], ["logs-2024-01.jsonl.gz", "logs-2024-02.jsonl.gz", "logs-2024-03.jsonl.gz"])
+        self.assertEqual(self.db.query(Log).count(), 12)
+        self.assertEqual(min(log.timestamp for log in self.db.query(Log)), datetime.datetime(2024, 4, 1))
+        
+        # A second run finds nothing left to archive
+        self.assertEqual(run_retention(self.engine, now=NOW)["archived"], 0)
+        self.assertEqual(len(archived_months(self.archive_dir)), 3)
+    
+    def test_search_archive(self):
+        """Test filtering archived logs by date range and status"""
+        run_retention(self.engine, now=NOW)
+        rows = search_archive(
+            {"status": "failure", "start_date": datetime.datetime(2024, 2, 1)},
+            limit=10,
+            archive_dir=self.archive_dir
+        )
+        self.assertEqual([row["timestamp"] for row in rows],
+                         [datetime.datetime(2024, 3, 10), datetime.datetime(2024, 2, 10)])
+        self.assertTrue(all(row["archived"] for row in rows))
+    
+    def test_logs_endpoint_merges_archive(self):
+        """Test paging through hot and archived logs with include_archived"""
+        run_retention(self.engine, now=NOW)
+        seen = []
+        cursor = None
+        while True:
+            response = Response()
+            page = get_logs(response, limit=4, status="success", cursor=cursor, include_archived=True, db=self.db)
+            seen += [row["timestamp"] for row in page]
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+        expected = [datetime.datetime(2024, month, day) for month in range(7, 0, -1) for day in (20, 1)]
+        self.assertEqual(seen, expected)
+
+if __name__ == "__main__":
+    unittest.main()
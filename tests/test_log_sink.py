@@ -0,0 +1,90 @@
+"""
+Test script for the buffered audit log sink
+"""
+
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+from sqlalchemy.orm import sessionmaker
+
+# Add parent directory to path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.models import Base, Client, Email, Log
+from app.utils.db import create_db_engine
+from app.utils.log_sink import LogSink
+from app.backend.pipeline.ingestion import apply_processing_result
+
+class TestLogSink(unittest.TestCase):
+    """Test cases for buffered log writes"""
+    
+    def setUp(self):
+        """Set up a file database and a sink without timed flushes"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.engine = create_db_engine(f"sqlite:///{os.path.join(self.tmpdir.name, 'test.db')}")
+        Base.metadata.create_all(bind=self.engine)
+        self.db = sessionmaker(bind=self.engine)()
+        self.sink = LogSink(batch_size=5, flush_interval_ms=60000, enabled=True)
+    
+    def tearDown(self):
+        """Clean up after tests"""
+        self.sink.close()
+        self.db.close()
+        self.engine.dispose()
+        self.tmpdir.cleanup()
+    
+    def log_count(self):
+        return self.db.query(Log).count()
+    
+    def test_written_after_commit_and_flush(self):
+        """Test that buffered rows are only written once committed and flushed"""
+        self.sink.write(self.db, action="processing", status="success")
+        self.assertEqual(self.log_count(), 0)
+        self.db.commit()
+        self.assertEqual(self.sink.flush(), 1)
+        self.assertEqual(self.log_count(), 1)
+    
+    def test_rollback_discards(self):
+        """Test that rows of a rolled back transaction are not written"""
+        self.sink.write(self.db, action="processing", status="success")
+        self.db.rollback()
+        self.db.commit()
+        self.assertEqual(self.sink.flush(), 0)
+        self.assertEqual(self.log_count(), 0)
+    
+    def test_batch_size_triggers_flush(self):
+        """Test that a full batch is written by the background thread"""
+        for i in range(5):
+            self.sink.write(self.db, action="processing", status="success", details=str(i))
+        self.db.commit()
+        deadline = time.monotonic() + 5
+        while self.log_count() < 5 and time.monotonic() < deadline:
+            time.sleep(0.01)
+            self.db.rollback()
+        self.assertEqual(self.log_count(), 5)
+    
+    def test_critical_is_synchronous(self):
+        """Test that critical rows are written in the caller's transaction"""
+        self.sink.write(self.db, critical=True, action="manual_review", status="success")
+        self.db.commit()
+        self.assertEqual(self.log_count(), 1)
+        self.assertEqual(self.sink.buffer, [])
+    
+    def test_close_flushes(self):
+        """Test that closing the sink writes the remaining rows"""
+        self.db.add(Client(id=1, name="Acme"))
+        email = Email(message_id="<1@example.com>", sender="a@example.com", recipient="b@example.com", client_id=1)
+        self.db.add(email)
+        self.db.commit()
+        apply_processing_result(email, {"success": True, "action": "email_forward", "classification": "commercial"}, self.db, self.sink)
+        self.db.commit()
+        self.sink.close()
+        log = self.db.query(Log).one()
+        self.assertEqual((log.email_id, log.action), (email.id, "processing"))
+        self.assertEqual(self.db.query(Email).one().status, "processed")
+
+if __name__ == "__main__":
+    unittest.main()
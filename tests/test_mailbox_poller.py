@@ -0,0 +1,120 @@
+"""
+Test script for the single-flight mailbox poller
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+
+from sqlalchemy import create_engine
+
+# Add parent directory to path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.backend.email.poller import MailboxLock, MailboxPoller
+
+class TestMailboxPoller(unittest.TestCase):
+    """Test cases for mailbox leader election and trigger coalescing"""
+    
+    def setUp(self):
+        """Set up a lock directory and a SQLite-like engine"""
+        self.lock_dir = tempfile.mkdtemp()
+        self.engine = MagicMock()
+        self.engine.dialect.name = "sqlite"
+        self.pollers = []
+    
+    def tearDown(self):
+        """Clean up after tests"""
+        for poller in self.pollers:
+            poller.stop(timeout=2)
+        shutil.rmtree(self.lock_dir)
+    
+    def make_poller(self, sync):
+        lock = MailboxLock(self.engine, "inbox@example.com", lock_dir=self.lock_dir)
+        poller = MailboxPoller(MagicMock, self.engine, sync, mailbox="inbox@example.com", interval=3600, lock=lock)
+        poller.election_interval = 0.05
+        self.pollers.append(poller)
+        return poller
+    
+    def wait_for(self, condition, timeout=2):
+        deadline = time.time() + timeout
+        while not condition() and time.time() < deadline:
+            time.sleep(0.01)
+        return condition()
+    
+    def test_lock_file_next_to_database(self):
+        """Test that lock files follow the SQLite database whatever the working directory"""
+        engine = create_engine(f"sqlite:///{os.path.join(self.lock_dir, 'smart_inbox.db')}")
+        lock = MailboxLock(engine, "inbox@example.com")
+        self.assertEqual(os.path.dirname(lock.lock_path), self.lock_dir)
+        
+        cwd = os.getcwd()
+        try:
+            os.chdir(self.lock_dir)
+            relative = MailboxLock(create_engine("sqlite:///smart_inbox.db"), "inbox@example.com")
+        finally:
+            os.chdir(cwd)
+        self.assertEqual(relative.lock_path, lock.lock_path)
+    
+    def test_file_lock_is_exclusive(self):
+        """Test that only one holder gets the mailbox lock"""
+        first = MailboxLock(self.engine, "inbox@example.com", lock_dir=self.lock_dir)
+        second = MailboxLock(self.engine, "inbox@example.com", lock_dir=self.lock_dir)
+        other_mailbox = MailboxLock(self.engine, "support@example.com", lock_dir=self.lock_dir)
+        
+        self.assertTrue(first.acquire())
+        self.assertFalse(second.acquire())
+        self.assertTrue(other_mailbox.acquire())
+        
+        first.release()
+        self.assertTrue(second.acquire())
+        second.release()
+        other_mailbox.release()
+    
+    def test_triggers_coalesce_into_running_sync(self):
+        """Test that triggers during a sync cause a single follow-up sync"""
+        release = threading.Event()
+        calls = []
+        
+        def sync(db):
+            calls.append(time.time())
+            release.wait(2)
+        
+        poller = self.make_poller(sync)
+        poller.start()
+        self.assertTrue(self.wait_for(lambda: len(calls) == 1))
+        
+        statuses = [poller.trigger() for _ in range(5)]
+        self.assertEqual(statuses, ["coalesced"] * 5)
+        
+        release.set()
+        self.assertTrue(self.wait_for(lambda: len(calls) == 2))
+        time.sleep(0.1)
+        self.assertEqual(len(calls), 2)
+    
+    def test_leadership_fails_over(self):
+        """Test that a standby poller takes over when the leader stops"""
+        leader_calls = []
+        standby_calls = []
+        
+        leader = self.make_poller(lambda db: leader_calls.append(db))
+        leader.start()
+        self.assertTrue(self.wait_for(lambda: leader_calls))
+        
+        standby = self.make_poller(lambda db: standby_calls.append(db))
+        self.assertEqual(standby.trigger(), "leader_elsewhere")
+        self.assertFalse(standby.is_leader)
+        
+        leader.stop(timeout=2)
+        self.assertTrue(self.wait_for(lambda: standby_calls))
+        self.assertTrue(standby.is_leader)
+        self.assertEqual(len(leader_calls), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,167 @@
+"""
+Test script for TF-IDF nearest-neighbour classification
+"""
+
+import datetime
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# Add parent directory to path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.backend.ai.nearest_neighbour import TfidfIndex, NearestNeighbourClassifier, tokenize
+from app.backend.routes.routing_engine import RoutingEngine
+from app.models.models import Base, Email
+
+class TestNearestNeighbour(unittest.TestCase):
+    """Test cases for the TF-IDF index and neighbour vote"""
+    
+    def setUp(self):
+        """Set up test environment"""
+        self.history = [
+            (1, "The deployment crashed with a database exception in the api server", "technical"),
+            (2, "Server error 500 when calling the api endpoint after the upgrade", "technical"),
+            (3, "Stack trace attached, the nightly build fails with a null pointer exception", "technical"),
+            (4, "Please send the invoice for the annual subscription and the updated pricing", "commercial"),
+            (5, "We would like a quote for 50 additional licenses, invoice to accounts payable", "commercial"),
+            (6, "Can we schedule a meeting next week to discuss the onboarding timeline", "administrative"),
+        ]
+        self.index = TfidfIndex()
+        for doc_id, text, label in self.history:
+            self.index.add(doc_id, text, label)
+    
+    def test_tokenize(self):
+        """Test tokenization strips markup and stopwords"""
+        self.assertEqual(tokenize("<p>Hello, the API server crashed!</p>"), ["api", "server", "crashed"])
+    
+    def test_query_returns_similar_documents(self):
+        """Test nearest neighbours are ranked by similarity"""
+        neighbours = self.index.query("The api server throws an exception after deployment", 2)
+        self.assertEqual(len(neighbours), 2)
+        self.assertEqual(neighbours[0][0], 1)
+        self.assertTrue(all(label == "technical" for _, label, _ in neighbours))
+        self.assertGreaterEqual(neighbours[0][2], neighbours[1][2])
+    
+    def test_relabel_existing_document(self):
+        """Test that adding an indexed email again only updates its label"""
+        self.assertTrue(self.index.add(6, "ignored", "commercial"))
+        self.assertFalse(self.index.add(6, "ignored", "commercial"))
+        self.assertEqual(len(self.index), 6)
+        self.assertEqual(self.index.query("schedule a meeting", 1)[0][1], "commercial")
+    
+    def test_save_and_load(self):
+        """Test the compact on-disk round trip"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "index.bin")
+            self.index.save(path)
+            loaded = TfidfIndex.load(path)
+        
+        self.assertEqual(loaded.doc_ids, self.index.doc_ids)
+        self.assertEqual(loaded.labels, self.index.labels)
+        query = "invoice for additional licenses"
+        self.assertEqual(
+            [n[0] for n in loaded.query(query, 3)],
+            [n[0] for n in self.index.query(query, 3)]
+        )
+    
+    def test_classifier_vote(self):
+        """Test classification by neighbour vote"""
+        classifier = NearestNeighbourClassifier(index=self.index)
+        result = classifier.classify_email("Send us a quote and invoice for the subscription")
+        classification, confidence = result
+        self.assertEqual(classification, "commercial")
+        self.assertGreater(confidence, 0.7)
+        self.assertEqual(result.source, "nearest_neighbour")
+    
+    def test_classifier_fallback(self):
+        """Test delegation to the fallback classifier without confident neighbours"""
+        fallback = MagicMock()
+        fallback.classify_email.return_value = ("administrative", 0.9)
+        
+        classifier = NearestNeighbourClassifier(fallback=fallback, index=self.index)
+        result = classifier.classify_email("Completely unrelated words zebra")
+        
+        fallback.classify_email.assert_called_once()
+        self.assertEqual(result, ("administrative", 0.9))
+    
+    def test_learn_adds_to_index(self):
+        """Test incremental indexing of labelled emails"""
+        classifier = NearestNeighbourClassifier(index=self.index)
+        classifier.save_every = 1000
+        classifier.learn("Renewal contract for the enterprise plan", "commercial", 7, "classifier")
+        classifier.learn("No reference means nothing is indexed", "commercial", None, "classifier")
+        classifier.learn("Its own votes are never indexed", "commercial", 8, "nearest_neighbour")
+        
+        self.assertEqual(len(self.index), 7)
+        self.assertEqual(self.index.query("enterprise plan renewal", 1)[0][0], 7)
+    
+    @patch('app.backend.routes.routing_engine.GitHubHandler')
+    @patch('app.backend.routes.routing_engine.get_email_handler')
+    def test_engine_does_not_learn_neighbour_votes(self, mock_email_handler, mock_github_handler):
+        """Test that the index learns from the fallback classifier but not from its own votes"""
+        fallback = MagicMock()
+        fallback.classify_email.return_value = ("administrative", 0.9)
+        classifier = NearestNeighbourClassifier(fallback=fallback, index=self.index)
+        classifier.save_every = 1000
+        with patch('app.backend.routes.routing_engine.get_ai_classifier', return_value=classifier):
+            engine = RoutingEngine()
+        engine.sender_history.enabled = False
+        
+        voted = engine.decide({'id': 7, 'sender': 'ap@acmecorp.com', 'body': "Send us a quote and invoice for the subscription"})
+        self.assertEqual(voted['classification_source'], "nearest_neighbour")
+        self.assertEqual(len(self.index), 6)
+        
+        delegated = engine.decide({'id': 8, 'sender': 'ap@acmecorp.com', 'body': "Completely unrelated words zebra"})
+        self.assertEqual(delegated['classification_source'], "classifier")
+        self.assertEqual(len(self.index), 7)
+    
+    def test_load_history_reads_labels_since_watermark(self):
+        """Test that labels learnt after the last save and relabels reach the index on restart"""
+        db = sessionmaker(bind=create_engine("sqlite://"))()
+        Base.metadata.create_all(bind=db.get_bind())
+        saved_at = datetime.datetime.utcnow() - datetime.timedelta(hours=1)
+        for doc_id, text, label in self.history[:3]:
+            db.add(Email(id=doc_id, message_id=f"<{doc_id}@acmecorp.com>", sender="ops@acmecorp.com",
+                         recipient="inbox@smartinbox.com", subject="Support", body=text, classification=label,
+                         classification_source="classifier", status="processed", processed_at=saved_at))
+        db.commit()
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "knn.bin")
+            with patch.dict('app.backend.ai.nearest_neighbour.AI_SETTINGS',
+                            {"nearest_neighbour": {"k": 15, "min_similarity": 0.1, "index_path": path,
+                                                   "max_terms_per_doc": 200, "save_every": 1000}}):
+                classifier = NearestNeighbourClassifier()
+                classifier.load_history(db)
+                self.assertEqual(len(classifier.index), 3)
+                self.assertEqual(TfidfIndex.load(path).watermark, saved_at)
+                
+                # Learnt but not saved before a restart: a new email and a manual relabel of email 1
+                now = datetime.datetime.utcnow()
+                doc_id, text, label = self.history[3]
+                db.add(Email(id=doc_id, message_id="<4@acmecorp.com>", sender="ap@acmecorp.com",
+                             recipient="inbox@smartinbox.com", subject="Invoice", body=text, classification=label,
+                             classification_source="classifier", status="processed", processed_at=now))
+                relabelled = db.get(Email, 1)
+                relabelled.classification = "commercial"
+                relabelled.classification_source = "manual"
+                relabelled.processed_at = now
+                db.commit()
+                
+                restarted = NearestNeighbourClassifier()
+                restarted.load_history(db)
+                
+                saved = TfidfIndex.load(path)
+                self.assertEqual(sorted(saved.doc_ids), [1, 2, 3, 4])
+                self.assertEqual(saved.labels[saved.doc_ids.index(1)], "commercial")
+                self.assertEqual(saved.watermark, now)
+        db.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+"""
+Test script for keyset pagination
+"""
+
+import datetime
+import os
+import sys
+import unittest
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# Add parent directory to path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.models import Base, Client, Log
+from app.utils.pagination import decode_cursor, encode_cursor, keyset_page
+
+class TestKeysetPagination(unittest.TestCase):
+    """Test cases for cursor-based pages"""
+    
+    def setUp(self):
+        """Set up an in-memory database with logs sharing timestamps"""
+        engine = create_engine(
+            "sqlite://",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool
+        )
+        Base.metadata.create_all(bind=engine)
+        self.db = sessionmaker(bind=engine)()
+        self.base = datetime.datetime(2024, 1, 1)
+        for i in range(25):
+            # Pairs of logs share a timestamp to exercise the id tie-breaker
+            self.add_log(self.base + datetime.timedelta(minutes=i // 2))
+        self.db.commit()
+    
+    def tearDown(self):
+        """Clean up after tests"""
+        self.db.close()
+    
+    def add_log(self, timestamp):
+        self.db.add(Log(action="processing", status="success", timestamp=timestamp))
+    
+    def walk(self, query, columns, limit, **kwargs):
+        pages = []
+        cursor = None
+        while True:
+            rows, cursor = keyset_page(query, columns, cursor, limit, **kwargs)
+            pages.append([row.id for row in rows])
+            if not cursor:
+                return pages
+    
+    def test_pages_cover_all_rows_once(self):
+        """Test that walking the cursor visits every row exactly once in order"""
+        pages = self.walk(self.db.query(Log), [Log.timestamp, Log.id], 10)
+        
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        ids = [i for page in pages for i in page]
+        expected = [log.id for log in self.db.query(Log).order_by(Log.timestamp.desc(), Log.id.desc())]
+        self.assertEqual(ids, expected)
+    
+    def test_new_rows_do_not_shift_pages(self):
+        """Test that rows inserted between requests do not repeat rows on later pages"""
+        query = self.db.query(Log)
+        first, cursor = keyset_page(query, [Log.timestamp, Log.id], None, 10)
+        
+        for _ in range(5):
+            self.add_log(self.base + datetime.timedelta(hours=1))
+        self.db.commit()
+        
+        second, _ = keyset_page(query, [Log.timestamp, Log.id], cursor, 10)
+        self.assertFalse({log.id for log in first} & {log.id for log in second})
+        self.assertEqual(second[0].id, first[-1].id - 1)
+    
+    def test_ascending_single_column(self):
+        """Test ascending pages keyed on id only"""
+        for i in range(5):
+            self.db.add(Client(name=f"Client {i}"))
+        self.db.commit()
+        
+        pages = self.walk(self.db.query(Client), [Client.id], 2, descending=False)
+        self.assertEqual(pages, [[1, 2], [3, 4], [5]])
+    
+    def test_cursor_round_trip(self):
+        """Test cursor encoding and malformed cursors"""
+        values = [datetime.datetime(2024, 5, 1, 12, 30, 15, 123), 42]
+        self.assertEqual(decode_cursor(encode_cursor(values), 2), values)
+        
+        with self.assertRaises(ValueError):
+            decode_cursor("not-a-cursor", 2)
+        with self.assertRaises(ValueError):
+            decode_cursor(encode_cursor([42]), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+"""
+Test script for automated and bulk mail prefilter
+"""
+
+import os
+import sys
+import unittest
+from unittest.mock import MagicMock, patch
+
+# Add parent directory to path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.backend.email.prefilter import EmailPrefilter
+from app.backend.email.email_handler import ImapSmtpHandler
+
+class TestEmailPrefilter(unittest.TestCase):
+    """Test cases for the header-based prefilter"""
+    
+    def setUp(self):
+        """Set up test environment"""
+        self.email_data = {
+            'sender': 'Jane Doe <jane@acmecorp.com>',
+            'subject': 'API Integration Issue',
+            'body': 'We are experiencing problems with the API integration.',
+            'headers': {}
+        }
+        self.prefilter = EmailPrefilter()
+    
+    def test_regular_email_passes(self):
+        """Test that a regular client email is not filtered"""
+        self.assertIsNone(self.prefilter.check(self.email_data))
+    
+    def test_email_without_headers_passes(self):
+        """Test that emails parsed without headers are not filtered"""
+        del self.email_data['headers']
+        self.assertIsNone(self.prefilter.check(self.email_data))
+    
+    def test_delivery_status_notification(self):
+        """Test bounce detection from DSN content type"""
+        self.email_data['headers']['content-type'] = 'multipart/report; report-type=delivery-status; boundary="x"'
+        result = self.prefilter.check(self.email_data)
+        self.assertEqual(result['category'], 'bounce')
+        self.assertEqual(result['handling'], 'filter')
+    
+    def test_mailer_daemon_sender(self):
+        """Test bounce detection from sender address"""
+        self.email_data['sender'] = 'Mail Delivery Subsystem <MAILER-DAEMON@example.com>'
+        self.assertEqual(self.prefilter.check(self.email_data)['category'], 'bounce')
+    
+    def test_auto_submitted(self):
+        """Test auto-reply detection from Auto-Submitted header"""
+        self.email_data['headers']['auto-submitted'] = 'auto-replied'
+        self.assertEqual(self.prefilter.check(self.email_data)['category'], 'auto_reply')
+        
+        # 'no' explicitly marks a human-sent message
+        self.email_data['headers']['auto-submitted'] = 'no'
+        self.assertIsNone(self.prefilter.check(self.email_data))
+    
+    def test_x_autoreply(self):
+        """Test auto-reply detection from X-Autoreply header"""
+        self.email_data['headers']['x-autoreply'] = 'yes'
+        self.assertEqual(self.prefilter.check(self.email_data)['category'], 'auto_reply')
+    
+    def test_mailing_list_and_bulk(self):
+        """Test list and bulk detection"""
+        self.email_data['headers']['list-id'] = '<announce.lists.example.com>'
+        self.assertEqual(self.prefilter.check(self.email_data)['category'], 'mailing_list')
+        
+        del self.email_data['headers']['list-id']
+        self.email_data['headers']['precedence'] = 'bulk'
+        self.assertEqual(self.prefilter.check(self.email_data)['category'], 'bulk')
+    
+    def test_configurable_handling(self):
+        """Test per-category handling from settings"""
+        self.prefilter.handling = {'mailing_list': 'manual_review'}
+        self.email_data['headers']['list-id'] = '<announce.lists.example.com>'
+        self.assertEqual(self.prefilter.check(self.email_data)['handling'], 'manual_review')
+    
+    def test_disabled(self):
+        """Test that a disabled prefilter never matches"""
+        self.prefilter.enabled = False
+        self.email_data['headers']['auto-submitted'] = 'auto-generated'
+        self.assertIsNone(self.prefilter.check(self.email_data))
+    
+    def test_parse_email_keeps_headers(self):
+        """Test that parsed emails expose lowercased headers"""
+        raw_email = (
+            b'From: client@acmecorp.com\r\nTo: inbox@smartinbox.com\r\n'
+            b'Subject: Out of office\r\nAuto-Submitted: auto-replied\r\n\r\nI am away.'
+        )
+        email_data = ImapSmtpHandler.parse_email(raw_email)
+        self.assertEqual(email_data['headers']['auto-submitted'], 'auto-replied')
+        self.assertEqual(self.prefilter.check(email_data)['category'], 'auto_reply')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+"""
+Test script checking that hot queries use indexes (EXPLAIN regression check)
+"""
+
+import datetime
+import os
+import sys
+import unittest
+
+from sqlalchemy import create_engine, inspect, text, tuple_
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# Add parent directory to path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.models import Base, Email, Log, RoutingRule
+from app.utils.migrations import MIGRATIONS, run_migrations
+from app.utils.pagination import decode_cursor, encode_cursor
+
+class TestQueryPlans(unittest.TestCase):
+    """Test cases for index usage of list, stats and log queries"""
+    
+    def setUp(self):
+        """Set up an in-memory database with the current schema"""
+        self.engine = create_engine(
+            "sqlite://",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool
+        )
+        Base.metadata.create_all(bind=self.engine)
+        self.db = sessionmaker(bind=self.engine)()
+    
+    def tearDown(self):
+        """Clean up after tests"""
+        self.db.close()
+    
+    def plan(self, query) -> str:
+        """Get the SQLite query plan for an ORM query"""
+        sql = str(query.statement.compile(self.engine, compile_kwargs={"literal_binds": True}))
+        with self.engine.connect() as connection:
+            rows = connection.execute(text(f"EXPLAIN QUERY PLAN {sql}")).fetchall()
+        return "\n".join(row[-1] for row in rows)
+    
+    def assertUsesIndex(self, query, index_name):
+        plan = self.plan(query)
+        self.assertIn(index_name, plan)
+        self.assertNotRegex(plan, r"SCAN (emails|logs|routing_rules)\b(?! USING)")
+    
+    def test_email_list(self):
+        """Test GET /emails with and without a status filter"""
+        query = self.db.query(Email).filter(Email.status == "pending").order_by(Email.received_at.desc()).limit(100)
+        self.assertUsesIndex(query, "ix_emails_status_received_at")
+        
+        query = self.db.query(Email).order_by(Email.received_at.desc()).limit(100)
+        self.assertUsesIndex(query, "ix_emails_received_at")
+    
+    def test_email_list_projection(self):
+        """Test that the email list does not read message bodies"""
+        from app.backend.routes.email_routes import EMAIL_LIST_COLUMNS
+        
+        sql = str(self.db.query(*EMAIL_LIST_COLUMNS).statement)
+        self.assertNotIn("emails.body", sql)
+        self.assertNotIn("emails.body", str(self.db.query(Email).statement))
+    
+    def test_keyset_pages(self):
+        """Test that later keyset pages seek the index instead of scanning"""
+        cursor = encode_cursor([datetime.datetime(2024, 1, 1), 500])
+        query = self.db.query(Email).filter(Email.status == "pending")
+        query = query.filter(tuple_(Email.received_at, Email.id) < tuple_(*decode_cursor(cursor, 2)))
+        query = query.order_by(Email.received_at.desc(), Email.id.desc()).limit(101)
+        self.assertUsesIndex(query, "ix_emails_status_received_at")
+        self.assertIn("received_at<", self.plan(query).replace(" ", ""))
+    
+    def test_stats_counts(self):
+        """Test the /system/stats counts"""
+        query = self.db.query(Email).filter(Email.status == "processed")
+        self.assertUsesIndex(query, "ix_emails_status")
+        
+        query = self.db.query(Email).filter(Email.status == "pending", Email.routing_action == "manual_review")
+        self.assertUsesIndex(query, "ix_emails_status_routing_action")
+    
+    def test_log_search(self):
+        """Test GET /system/logs filters"""
+        query = self.db.query(Log).filter(Log.email_id == 1).order_by(Log.timestamp.desc())
+        self.assertUsesIndex(query, "ix_logs_email_id")
+        
+        since = datetime.datetime(2024, 1, 1)
+        query = (
+            self.db.query(Log)
+            .filter(Log.action == "processing", Log.status == "failure", Log.timestamp >= since)
+            .order_by(Log.timestamp.desc())
+        )
+        self.assertUsesIndex(query, "ix_logs_action_status_timestamp")
+    
+    def test_rule_lookup(self):
+        """Test active routing rules of a client by priority"""
+        query = (
+            self.db.query(RoutingRule)
+            .filter(RoutingRule.client_id == 1, RoutingRule.active == True)
+            .order_by(RoutingRule.priority.desc())
+        )
+        self.assertUsesIndex(query, "ix_routing_rules_client_active_priority")
+    
+    def test_migration_adds_indexes(self):
+        """Test that migrations add indexes to tables created without them"""
+        with self.engine.begin() as connection:
+            for table in ("emails", "logs", "routing_rules"):
+                for index in inspect(connection).get_indexes(table):
+                    if index["name"].startswith("ix_"):
+                        connection.execute(text(f"DROP INDEX {index['name']}"))
+        
+        applied = run_migrations(self.engine)
+        self.assertEqual(applied, [name for _, name, _ in MIGRATIONS])
+        
+        names = {index["name"] for index in inspect(self.engine).get_indexes("emails")}
+        self.assertIn("ix_emails_status_received_at", names)
+        self.assertEqual(run_migrations(self.engine), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,247 @@
+"""
+Test script for per-destination rate limits and digest batching
+"""
+
+import datetime
+import os
+import sys
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# Add parent directory to path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.models import Base, Client, Email
+from app.backend.pipeline.ingestion import apply_processing_result
+from app.backend.pipeline.retry import RetryScheduler
+from app.backend.routes.rate_limit import RateLimiter, TokenBucket
+from app.backend.routes.routing_engine import RoutingEngine
+
+LIMITS = {
+    "email_forward": {"rate": 0.01, "burst": 2},
+    "github_issue": {"rate": 0.01, "burst": 1},
+}
+
+class TestTokenBucket(unittest.TestCase):
+    """Test cases for the token bucket"""
+    
+    def test_burst_then_refill(self):
+        """Test that a bucket allows its burst and then refills at its rate"""
+        bucket = TokenBucket(rate=50, burst=3)
+        self.assertEqual([bucket.try_acquire() for _ in range(3)], [0, 0, 0])
+        self.assertGreater(bucket.try_acquire(), 0)
+        time.sleep(0.05)
+        self.assertEqual(bucket.try_acquire(), 0)
+        self.assertAlmostEqual(TokenBucket(rate=0.5, burst=0).try_acquire(), 2, places=1)
+    
+    def test_buckets_per_destination(self):
+        """Test that each destination has its own bucket and unknown kinds are not limited"""
+        limiter = RateLimiter(LIMITS)
+        self.assertEqual(limiter.try_acquire("github_issue", "acme/support"), 0)
+        self.assertGreater(limiter.try_acquire("github_issue", "ACME/support"), 0)
+        self.assertEqual(limiter.try_acquire("github_issue", "globex/support"), 0)
+        self.assertFalse(any(limiter.try_acquire("slack", "#ops") for _ in range(10)))
+
+class TestRoutingRateLimits(unittest.TestCase):
+    """Test cases for rate-limited routing and digests"""
+    
+    def setUp(self):
+        """Set up an in-memory database and a routing engine with mocked handlers and tight limits"""
+        engine = create_engine(
+            "sqlite://",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool
+        )
+        Base.metadata.create_all(bind=engine)
+        self.Session = sessionmaker(bind=engine)
+        self.db = self.Session()
+        self.db.add(Client(id=1, name='Acme Corporation', domains=['acmecorp.com'], github_repository='acme/support'))
+        self.db.commit()
+        
+        self.patchers = [
+            patch('app.backend.routes.routing_engine.get_email_handler'),
+            patch('app.backend.routes.routing_engine.GitHubHandler'),
+            patch('app.backend.routes.routing_engine.get_ai_classifier'),
+            patch('app.backend.routes.digest.SessionLocal', self.Session),
+            patch.dict('app.backend.routes.routing_engine.ROUTING', {"rate_limits": LIMITS}),
+        ]
+        for patcher in self.patchers:
+            patcher.start()
+        self.client_data = {'id': 1, 'name': 'Acme Corporation', 'github_repository': 'acme/support'}
+    
+    def tearDown(self):
+        """Clean up after tests"""
+        for patcher in reversed(self.patchers):
+            patcher.stop()
+        self.db.close()
+    
+    def make_engine(self, digest):
+        with patch.dict('app.backend.routes.routing_engine.ROUTING',
+                        {"digest": {"enabled": digest, "window": 60, "max_items": 100}}):
+            engine = RoutingEngine()
+        engine.email_handler.forward_email.return_value = True
+        engine.github_handler.format_issue_from_email.side_effect = lambda email_data, name: {
+            "title": email_data['subject'], "body": email_data['body']
+        }
+        engine.github_handler.create_issue.return_value = {
+            "success": True, "issue_number": 7, "issue_url": "https://github.com/acme/support/issues/7"
+        }
+        engine.github_handler.add_issue_comment.return_value = {
+            "success": True, "comment_url": "https://github.com/acme/support/issues/7#issuecomment-1"
+        }
+        self.addCleanup(engine.close)
+        return engine
+    
+    def email(self, n):
+        """Store a pending email and return its email data"""
+        email = Email(message_id=f'<build{n}@acmecorp.com>', sender=f'ci{n}@acmecorp.com',
+                      recipient='inbox@smartinbox.com', subject=f'Build {n} failed',
+                      body=f'Build {n} failed', status='pending', client_id=1)
+        self.db.add(email)
+        self.db.commit()
+        return {'id': email.id, 'sender': email.sender, 'subject': email.subject, 'body': email.body}
+    
+    def route(self, route_call, count):
+        """Route `count` new emails and store each result as the pipeline does"""
+        results = []
+        for n in range(count):
+            email_data = self.email(n)
+            result = route_call(email_data)
+            apply_processing_result(self.db.get(Email, email_data['id']), result, self.db)
+            self.db.commit()
+            results.append(result)
+        return results
+    
+    def statuses(self):
+        self.db.expire_all()
+        return [email.status for email in self.db.query(Email).order_by(Email.id)]
+    
+    def test_limited_forward_deferred(self):
+        """Test that without digests an email over the limit is deferred without waiting"""
+        engine = self.make_engine(digest=False)
+        started = time.monotonic()
+        results = self.route(lambda email_data: engine.forward_email(email_data, 'tech@internal.com', 'Forwarded'), 3)
+        
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual([r["success"] for r in results], [True, True, False])
+        self.assertEqual(results[2]["status"], "deferred")
+        self.assertGreater(results[2]["retry_after"], 0)
+        self.assertIn("Rate limit reached", results[2]["message"])
+        self.assertEqual(engine.email_handler.forward_email.call_count, 2)
+        self.assertEqual(self.statuses(), ["processed", "processed", "deferred"])
+    
+    def test_forward_burst_coalesced_into_digest(self):
+        """Test that a burst to one contact costs one forward for everything over the limit"""
+        engine = self.make_engine(digest=True)
+        results = self.route(lambda email_data: engine.forward_email(email_data, 'tech@internal.com', 'Forwarded'), 10)
+        
+        self.assertEqual([r.get("status") for r in results].count("digest_pending"), 8)
+        self.assertEqual(engine.digest.pending(), {"email_forward:tech@internal.com": 8})
+        self.assertEqual(self.statuses(), ["processed"] * 2 + ["digest_pending"] * 8)
+        
+        engine.close()
+        
+        self.assertEqual(engine.email_handler.forward_email.call_count, 3)
+        digest_email = engine.email_handler.forward_email.call_args[0][0]
+        self.assertEqual(digest_email["subject"], "Digest of 8 emails")
+        self.assertIn("Build 9 failed", digest_email["body"])
+        self.assertEqual(engine.digest.pending(), {})
+        self.assertEqual(self.statuses(), ["processed"] * 10)
+    
+    def test_issue_digest_comments_on_recent_issue(self):
+        """Test that issues over the limit become one comment on the issue just created"""
+        engine = self.make_engine(digest=True)
+        self.route(lambda email_data: engine.create_github_issue(email_data, self.client_data, 'acme/support'), 4)
+        
+        engine.close()
+        
+        engine.github_handler.create_issue.assert_called_once()
+        engine.github_handler.add_issue_comment.assert_called_once()
+        repository, number, body = engine.github_handler.add_issue_comment.call_args[0]
+        self.assertEqual((repository, number), ('acme/support', 7))
+        self.assertIn("Build 3 failed", body)
+        self.db.expire_all()
+        self.assertEqual(self.db.query(Email).order_by(Email.id.desc()).first().action_reference,
+                         "https://github.com/acme/support/issues/7#issuecomment-1")
+    
+    def test_failed_digest_scheduled_for_retry(self):
+        """Test that the emails of a digest that fails to send are scheduled for a retry"""
+        engine = self.make_engine(digest=True)
+        engine.email_handler.forward_email.side_effect = [True, True, False]
+        self.route(lambda email_data: engine.forward_email(email_data, 'tech@internal.com', 'Forwarded'), 4)
+        
+        self.assertEqual(engine.digest.flush(force=True), 0)
+        
+        self.assertEqual(engine.digest.pending(), {})
+        self.assertEqual(self.statuses(), ["processed", "processed", "error", "error"])
+        failed = self.db.query(Email).filter(Email.status == "error").all()
+        self.assertTrue(all(email.routing_attempts == 1 and email.next_attempt_at for email in failed))
+    
+    def review(self, engine, count):
+        """Manually review `count` new emails as commercial through the email routes"""
+        from app.backend.routes import email_routes
+        
+        self.db.get(Client, 1).commercial_contact = 'sales@internal.com'
+        self.db.commit()
+        engine.rule_table = MagicMock()
+        engine.rule_table.match.return_value = None
+        with patch.object(email_routes, "routing_engine", engine), patch.object(email_routes, "routing_rule_table"):
+            return [
+                email_routes.update_email_after_review(
+                    self.email(n)['id'], {"classification": "commercial", "client_id": 1}, db=self.db
+                )["routing_result"]
+                for n in range(count)
+            ]
+    
+    def test_manual_review_over_limit_deferred(self):
+        """Test that a manual review over the rate limit is deferred instead of marked processed"""
+        engine = self.make_engine(digest=False)
+        results = self.review(engine, 3)
+        
+        self.assertEqual(results[2]["status"], "deferred")
+        self.assertEqual(engine.email_handler.forward_email.call_count, 2)
+        self.assertEqual(self.statuses(), ["processed", "processed", "deferred"])
+        deferred = self.db.query(Email).filter(Email.status == "deferred").one()
+        self.assertEqual((deferred.routing_attempts or 0), 0)
+        self.assertIsNotNone(deferred.next_attempt_at)
+    
+    def test_manual_review_over_limit_sent_in_digest(self):
+        """Test that a manual review over the rate limit waits for its digest"""
+        engine = self.make_engine(digest=True)
+        self.review(engine, 3)
+        
+        self.assertEqual(self.statuses(), ["processed", "processed", "digest_pending"])
+        
+        engine.close()
+        
+        self.assertEqual(engine.email_handler.forward_email.call_count, 3)
+        self.assertEqual(self.statuses(), ["processed"] * 3)
+    
+    def test_unsaved_emails_wait_and_lost_digests_recovered(self):
+        """Test that only stored digest emails are sent and that lost ones come due for the retry scheduler"""
+        engine = self.make_engine(digest=True)
+        self.route(lambda email_data: engine.forward_email(email_data, 'tech@internal.com', 'Forwarded'), 2)
+        email_data = self.email(2)
+        result = engine.forward_email(email_data, 'tech@internal.com', 'Forwarded')
+        
+        # The pipeline has not stored the result yet
+        self.assertEqual(engine.digest.flush(force=True), 0)
+        self.assertEqual(engine.digest.pending(), {"email_forward:tech@internal.com": 1})
+        
+        apply_processing_result(self.db.get(Email, email_data['id']), result, self.db)
+        self.db.commit()
+        # The process dies before the digest is sent
+        engine.digest.digests.clear()
+        
+        scheduler = RetryScheduler(MagicMock())
+        due = datetime.datetime.utcnow() + datetime.timedelta(seconds=engine.digest.hold_seconds + 1)
+        self.assertEqual(scheduler.claim(self.db), [])
+        self.assertEqual(scheduler.claim(self.db, due), [email_data['id']])
+
+if __name__ == "__main__":
+    unittest.main()
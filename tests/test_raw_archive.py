@@ -0,0 +1,81 @@
+"""
+Test script for the raw message archive
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+# Add parent directory to path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.backend.email.raw_archive import INDEX_ENTRY, RawMessageArchive
+
+def raw_message(i):
+    return (
+        f"Message-ID: <{i}@example.com>\r\nFrom: a@example.com\r\nSubject: Test {i}\r\n\r\n".encode()
+        + b"Hello world. " * 200
+    )
+
+class TestRawMessageArchive(unittest.TestCase):
+    """Test cases for compressed append-only segments"""
+    
+    def setUp(self):
+        """Set up an archive with small segments in a temporary directory"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.archive = RawMessageArchive(self.tmpdir.name, segment_size=1024, enabled=True)
+    
+    def tearDown(self):
+        """Clean up after tests"""
+        self.archive.close()
+        self.tmpdir.cleanup()
+    
+    def test_round_trip_across_segments(self):
+        """Test that messages are compressed, rotated over segments and read back"""
+        self.assertEqual(self.archive.append_many((i, raw_message(i)) for i in range(1, 11)), 10)
+        for i in range(11, 31):
+            self.archive.append(i, raw_message(i))
+        
+        segments = [name for name in os.listdir(self.tmpdir.name) if name.endswith(".seg")]
+        self.assertGreater(len(segments), 1)
+        stored = sum(os.path.getsize(os.path.join(self.tmpdir.name, name)) for name in segments)
+        self.assertLess(stored, sum(len(raw_message(i)) for i in range(1, 31)) / 5)
+        
+        for i in (1, 15, 30):
+            self.assertEqual(self.archive.get(i), raw_message(i))
+        self.assertIsNone(self.archive.get(99))
+    
+    def test_reopen_and_other_writer(self):
+        """Test that a reader finds messages appended by another instance"""
+        reader = RawMessageArchive(self.tmpdir.name, enabled=True)
+        self.archive.append(1, raw_message(1))
+        self.assertEqual(reader.get(1), raw_message(1))
+        self.archive.append(2, raw_message(2))
+        self.assertIn(2, reader)
+        reader.close()
+    
+    def test_torn_index_entry_ignored(self):
+        """Test that a partially written index entry is skipped and overwritten"""
+        self.archive.append(1, raw_message(1))
+        with open(self.archive.index_path, "ab") as index_file:
+            index_file.write(b"\x00" * (INDEX_ENTRY.size // 2))
+        self.archive.append(2, raw_message(2))
+        
+        reader = RawMessageArchive(self.tmpdir.name, enabled=True)
+        self.assertEqual(reader.get(1), raw_message(1))
+        self.assertEqual(reader.get(2), raw_message(2))
+        reader.close()
+    
+    def test_corruption_detected(self):
+        """Test that a damaged record raises instead of returning wrong bytes"""
+        self.archive.append(1, raw_message(1))
+        segment, offset, length = self.archive.locate(1)
+        with open(self.archive.segment_path(segment), "r+b") as segment_file:
+            segment_file.seek(offset - 4)
+            segment_file.write(b"\xff\xff\xff\xff")
+        with self.assertRaises(ValueError):
+            self.archive.get(1)
+
+if __name__ == "__main__":
+    unittest.main()
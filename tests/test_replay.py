@@ -0,0 +1,150 @@
+"""
+Test script for replaying stored emails
+"""
+
+import datetime
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from sqlalchemy.orm import sessionmaker
+
+# Add parent directory to path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.models import Base, Client, Email
+from app.utils.db import create_db_engine
+from app.backend.email.raw_archive import RawMessageArchive
+from app.backend.replay.replay import run_replay
+
+class TestReplay(unittest.TestCase):
+    """Test cases for replaying routing decisions"""
+    
+    def setUp(self):
+        """Set up a file database with emails and their recorded decisions"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.engine = create_db_engine(f"sqlite:///{os.path.join(self.tmpdir.name, 'test.db')}")
+        Base.metadata.create_all(bind=self.engine)
+        self.db = sessionmaker(bind=self.engine)()
+        
+        client = Client(
+            name="Acme",
+            domains=["acme.com"],
+            github_repository="acme/support",
+            technical_contact="tech@acme.com",
+            commercial_contact="sales@acme.com",
+            administrative_contact="admin@acme.com"
+        )
+        self.db.add(client)
+        self.db.flush()
+        
+        recorded = [
+            ("bob@acme.com", "Crash on login", "We hit a bug: the server crash shows an error", client.id, "technical", 1.0, "github_issue"),
+            ("ann@acme.com", "Invoice", "Please send the invoice and the price quote", client.id, "commercial", 1.0, "email_forward"),
+            ("eve@unknown.org", "Hello", "Just saying hello", None, None, None, "manual_review"),
+        ]
+        for i, (sender, subject, body, client_id, classification, confidence, action) in enumerate(recorded, 1):
+            self.db.add(Email(
+                message_id=f"<{i}@example.com>",
+                sender=sender,
+                recipient="support@example.com",
+                subject=subject,
+                body=body,
+                received_at=datetime.datetime(2024, 1, i),
+                client_id=client_id,
+                classification=classification,
+                confidence_score=confidence,
+                routing_action=action,
+                status="processed"
+            ))
+        self.db.add(Email(message_id="<pending@example.com>", sender="bob@acme.com",
+                          recipient="support@example.com", body="bug", status="pending"))
+        self.db.commit()
+        self.client_id = client.id
+    
+    def tearDown(self):
+        """Clean up after tests"""
+        self.db.close()
+        self.engine.dispose()
+        self.tmpdir.cleanup()
+    
+    def replay(self, **config):
+        config.setdefault("workers", 0)
+        config.setdefault("sender_history", False)
+        return run_replay(self.db, config)
+    
+    def test_unchanged_configuration(self):
+        """Test that replaying with the live configuration reproduces the recorded decisions"""
+        with patch("app.backend.routes.routing_engine.GitHubHandler") as github, \
+             patch("app.backend.routes.routing_engine.get_email_handler") as email_handler:
+            report = self.replay()
+        
+        github.assert_not_called()
+        email_handler.assert_not_called()
+        self.assertEqual(report["emails"], 3)
+        self.assertEqual(report["changed"], 0)
+        self.assertEqual(report["unchanged"], 3)
+        self.assertEqual(report["errors"], 0)
+        self.assertEqual(report["replayed_actions"], {"github_issue": 1, "email_forward": 1, "manual_review": 1})
+    
+    def test_candidate_rules(self):
+        """Test that a candidate routing rule shows up as a changed action"""
+        report = self.replay(rules=[{
+            "client_id": self.client_id,
+            "classification": "technical",
+            "action": "email_forward",
+            "destination": "oncall@acme.com"
+        }])
+        
+        self.assertEqual(report["changed"], 1)
+        self.assertEqual(report["changed_fields"], {"action": 1})
+        self.assertEqual(report["transitions"], {"github_issue -> email_forward": 1})
+        sample = report["samples"][0]
+        self.assertEqual(sample["id"], 1)
+        self.assertEqual(sample["replayed"]["destination"], "oncall@acme.com")
+        self.assertEqual(sample["replayed"]["rule_id"], 1)
+    
+    def test_candidate_threshold(self):
+        """Test that a stricter threshold sends recorded classifications to manual review"""
+        report = self.replay(classifier="recorded", confidence_threshold=1.01, sample_size=1)
+        
+        self.assertEqual(report["changed"], 2)
+        self.assertEqual(report["transitions"], {"github_issue -> manual_review": 1, "email_forward -> manual_review": 1})
+        self.assertEqual(len(report["samples"]), 1)
+    
+    def test_filters_and_limit(self):
+        """Test that the date range, client and limit select the replayed emails"""
+        self.assertEqual(self.replay(start_date=datetime.datetime(2024, 1, 2))["emails"], 2)
+        self.assertEqual(self.replay(client_id=self.client_id)["emails"], 2)
+        self.assertEqual(self.replay(limit=1, chunk_size=1)["emails"], 1)
+    
+    def test_raw_source(self):
+        """Test that the raw source re-parses archived messages"""
+        raw_dir = os.path.join(self.tmpdir.name, "raw")
+        archive = RawMessageArchive(raw_dir, enabled=True)
+        archive.append(1, (
+            b"Message-ID: <1@example.com>\r\nFrom: bob@acme.com\r\nTo: support@example.com\r\n"
+            b"Subject: Pricing\r\n\r\nWhat is the price of the pro plan? Please send a quote."
+        ))
+        archive.close()
+        
+        report = self.replay(source="raw", raw_directory=raw_dir)
+        
+        self.assertEqual(report["changed"], 1)
+        self.assertEqual(report["changed_fields"], {"classification": 1, "action": 1})
+        self.assertEqual(report["samples"][0]["replayed"]["classification"], "commercial")
+    
+    def test_worker_processes(self):
+        """Test that a process pool produces the same report as an inline replay"""
+        rules = [{"client_id": self.client_id, "classification": "commercial",
+                  "action": "github_issue", "destination": "acme/sales"}]
+        inline = self.replay(rules=rules)
+        pooled = self.replay(rules=rules, workers=2, chunk_size=1)
+        
+        for key in ("emails", "changed", "unchanged", "changed_fields", "transitions"):
+            self.assertEqual(pooled[key], inline[key])
+
+if __name__ == "__main__":
+    unittest.main()
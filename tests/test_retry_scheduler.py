@@ -0,0 +1,174 @@
+"""
+Test script for retrying emails whose routing failed
+"""
+
+import datetime
+import os
+import sys
+import unittest
+from unittest.mock import MagicMock, patch
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# Add parent directory to path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.models import Base, Client, Email, Log
+from app.backend.email.prefilter import EmailPrefilter
+from app.backend.pipeline.ingestion import IngestionPipeline, retry_delay
+from app.backend.pipeline.retry import RetryScheduler
+
+FAILED = {"success": False, "action": "error", "classification": "technical", "confidence": 0.9,
+          "message": "Failed to create GitHub issue: 502 Bad Gateway"}
+ROUTED = {"success": True, "action": "github_issue", "classification": "technical", "confidence": 0.9,
+          "reference": "https://github.com/acme/support/issues/1"}
+
+class TestRetryScheduler(unittest.TestCase):
+    """Test cases for backoff, retries and dead-lettering"""
+    
+    def setUp(self):
+        """Set up an in-memory database, a mocked routing engine and one ingested email"""
+        engine = create_engine(
+            "sqlite://",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool
+        )
+        Base.metadata.create_all(bind=engine)
+        self.db = sessionmaker(bind=engine)()
+        self.db.add(Client(id=1, name='Acme Corporation', domains=['acmecorp.com'], github_repository='acme/support'))
+        self.db.commit()
+        
+        self.routing_engine = MagicMock()
+        self.routing_engine.decide.return_value = {
+            "classification": "technical", "confidence": 0.9,
+            "classification_source": "classifier", "needs_manual_review": False
+        }
+        self.routing_engine.route_decision.return_value = FAILED
+        self.pipeline = IngestionPipeline(self.routing_engine, EmailPrefilter())
+        self.scheduler = RetryScheduler(self.pipeline)
+        self.settings = patch.dict("app.backend.pipeline.ingestion.RETRY", {"max_attempts": 3, "jitter": 0})
+        self.settings.start()
+        
+        self.pipeline.run(self.db, [{
+            'message_id': '<msg1@acmecorp.com>',
+            'sender': 'client@acmecorp.com',
+            'recipient': 'inbox@smartinbox.com',
+            'subject': 'Server crash',
+            'body': 'The server crashes on login.',
+            'attachments': [],
+            'headers': {}
+        }])
+        self.email = self.db.query(Email).one()
+    
+    def tearDown(self):
+        """Clean up after tests"""
+        self.settings.stop()
+        self.db.close()
+    
+    def run_due(self):
+        """Run the scheduler as if the email's next attempt were due"""
+        self.db.refresh(self.email)
+        return self.scheduler.run(self.db, now=self.email.next_attempt_at)
+    
+    def test_failure_scheduled_with_backoff(self):
+        """Test that a failed routing is scheduled for a retry instead of staying in error"""
+        self.assertEqual(self.email.status, "error")
+        self.assertEqual(self.email.routing_attempts, 1)
+        self.assertIsNotNone(self.email.next_attempt_at)
+        self.assertEqual(self.scheduler.run(self.db), {"retried": 0, "processed": 0, "errors": 0})
+        
+        with patch.dict("app.backend.pipeline.ingestion.RETRY", {"base_delay": 60, "max_delay": 600, "jitter": 0.5}):
+            with patch("app.backend.pipeline.ingestion.random.random", return_value=0):
+                self.assertEqual([retry_delay(n) for n in (1, 2, 3, 10)], [60, 120, 240, 600])
+            with patch("app.backend.pipeline.ingestion.random.random", return_value=1):
+                self.assertEqual(retry_delay(2), 60)
+    
+    def test_retry_routes_from_stored_classification(self):
+        """Test that a retry re-runs only the routing step and clears the schedule"""
+        self.routing_engine.route_decision.return_value = ROUTED
+        
+        summary = self.run_due()
+        
+        self.assertEqual(summary, {"retried": 1, "processed": 1, "errors": 0})
+        self.assertEqual(self.routing_engine.decide.call_count, 1)
+        decision = self.routing_engine.route_decision.call_args[0][2]
+        self.assertEqual(decision["classification_source"], "stored")
+        self.db.refresh(self.email)
+        self.assertEqual(self.email.status, "processed")
+        self.assertIsNone(self.email.next_attempt_at)
+        self.assertIsNone(self.email.error_message)
+    
+    def test_dead_letter_after_max_attempts(self):
+        """Test that an email is dead-lettered once it runs out of attempts"""
+        self.assertEqual(self.run_due()["errors"], 1)
+        self.db.refresh(self.email)
+        self.assertEqual(self.email.routing_attempts, 2)
+        self.assertEqual(self.email.status, "error")
+        
+        self.run_due()
+        self.db.refresh(self.email)
+        self.assertEqual(self.email.routing_attempts, 3)
+        self.assertEqual(self.email.status, "dead_letter")
+        self.assertEqual(self.scheduler.run(self.db, now=datetime.datetime.utcnow() + datetime.timedelta(days=1))["retried"], 0)
+        details = self.db.query(Log.details).filter(Log.email_id == self.email.id).order_by(Log.id.desc()).first()[0]
+        self.assertIn("Dead-lettered after 3 attempts", details)
+    
+    def test_configuration_errors_not_retried(self):
+        """Test that failures needing a configuration change are not scheduled"""
+        self.routing_engine.route_decision.return_value = {**FAILED, "retryable": False}
+        self.run_due()
+        
+        self.db.refresh(self.email)
+        self.assertEqual(self.email.status, "error")
+        self.assertIsNone(self.email.next_attempt_at)
+    
+    def test_deferred_emails_keep_attempt_budget(self):
+        """Test that emails held back by a rate limit are retried without using attempts"""
+        self.routing_engine.route_decision.return_value = {
+            **FAILED, "action": "github_issue", "status": "deferred", "retry_after": 5,
+            "message": "Rate limit reached for acme/support"
+        }
+        for _ in range(5):
+            self.assertEqual(self.run_due()["retried"], 1)
+        
+        self.db.refresh(self.email)
+        self.assertEqual(self.email.status, "deferred")
+        self.assertEqual(self.email.routing_attempts, 1)
+        self.assertGreater(self.email.next_attempt_at, datetime.datetime.utcnow())
+        
+        self.routing_engine.route_decision.return_value = ROUTED
+        self.run_due()
+        self.db.refresh(self.email)
+        self.assertEqual(self.email.status, "processed")
+    
+    def test_manual_review_failure_scheduled(self):
+        """Test that a failed routing after a manual review is scheduled and can be retried"""
+        from app.backend.routes import email_routes
+        
+        with patch.object(email_routes, "routing_engine") as routing_engine, \
+                patch.object(email_routes, "routing_rule_table"):
+            routing_engine.route_email.return_value = FAILED
+            result = email_routes.update_email_after_review(
+                self.email.id, {"classification": "technical", "client_id": 1}, db=self.db
+            )
+        
+        self.assertFalse(result["routing_result"]["success"])
+        self.db.refresh(self.email)
+        self.assertEqual(self.email.status, "error")
+        self.assertEqual(self.email.routing_attempts, 2)
+        self.assertIsNotNone(self.email.next_attempt_at)
+        self.assertEqual(self.email.error_message, FAILED["message"])
+        self.assertEqual(email_routes.retry_email(self.email.id, db=self.db)["status"], "success")
+    
+    def test_claimed_emails_hidden_from_other_schedulers(self):
+        """Test that a claimed email is not claimed again until its lease expires"""
+        now = self.email.next_attempt_at
+        self.assertEqual(self.scheduler.claim(self.db, now), [self.email.id])
+        self.assertEqual(self.scheduler.claim(self.db, now), [])
+        later = now + datetime.timedelta(seconds=self.scheduler.lease_seconds)
+        self.assertEqual(self.scheduler.claim(self.db, later), [self.email.id])
+
+if __name__ == "__main__":
+    unittest.main()
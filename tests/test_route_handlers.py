@@ -0,0 +1,29 @@
+"""
+Test script checking that database-backed route handlers do not block the event loop
+"""
+
+import asyncio
+import os
+import sys
+import unittest
+
+# Add parent directory to path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.backend.routes import client_routes, email_routes, routing_rules_routes, system_routes
+
+class TestRouteHandlers(unittest.TestCase):
+    """Test cases for route handler execution model"""
+    
+    def test_handlers_run_in_threadpool(self):
+        """Test that handlers using blocking sessions are plain functions, which FastAPI runs in its threadpool"""
+        for module in (client_routes, email_routes, routing_rules_routes, system_routes):
+            for route in module.router.routes:
+                with self.subTest(path=route.path, methods=sorted(route.methods)):
+                    self.assertFalse(
+                        asyncio.iscoroutinefunction(route.endpoint),
+                        f"{route.endpoint.__name__} is async but uses blocking database or network calls"
+                    )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+"""
+Test script for the compiled routing rule decision table
+"""
+
+import os
+import sys
+import unittest
+from unittest.mock import MagicMock, patch
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# Add parent directory to path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.backend.routes.rule_table import RoutingRuleTable
+from app.backend.routes.routing_engine import RoutingEngine
+from app.models.models import Base, Client, RoutingRule
+
+def make_rule(id, classification, action, destination, priority=1, active=True, client_id=1):
+    """Build a routing rule row stand-in"""
+    rule = MagicMock()
+    rule.id = id
+    rule.client_id = client_id
+    rule.classification = classification
+    rule.action = action
+    rule.destination = destination
+    rule.priority = priority
+    rule.active = active
+    return rule
+
+class TestRoutingRuleTable(unittest.TestCase):
+    """Test cases for compiling and matching routing rules"""
+    
+    def setUp(self):
+        """Set up test environment"""
+        self.rules = [
+            make_rule(1, 'technical', 'github_issue', 'acme/support', priority=1),
+            make_rule(2, 'technical', 'github_issue', 'acme/urgent', priority=5),
+            make_rule(3, 'commercial', 'email_forward', 'deals@internal.com'),
+            make_rule(4, 'administrative', 'email_forward', 'office@internal.com', active=False),
+            make_rule(5, 'technical', 'github_issue', 'globex/helpdesk', client_id=2),
+        ]
+        self.table = RoutingRuleTable()
+        self.db = MagicMock()
+        self.db.query.return_value.filter.return_value.all.return_value = self.rules
+    
+    def test_compile_sorts_by_priority(self):
+        """Test that rules are keyed and ordered by priority"""
+        table = RoutingRuleTable.compile(self.rules)
+        self.assertEqual([r.id for r in table[(1, 'technical')]], [2, 1])
+        self.assertEqual([r.id for r in table[(2, 'technical')]], [5])
+        self.assertNotIn((1, 'administrative'), table)
+    
+    def test_match(self):
+        """Test lookups after loading"""
+        self.assertIsNone(self.table.match(1, 'technical'))
+        
+        self.table.load(self.db)
+        self.assertEqual(self.table.match(1, 'technical').destination, 'acme/urgent')
+        self.assertEqual(self.table.match(1, 'commercial').destination, 'deals@internal.com')
+        self.assertIsNone(self.table.match(1, 'administrative'))
+        self.assertIsNone(self.table.match(3, 'technical'))
+    
+    def test_reload_swaps_table(self):
+        """Test that reloading replaces the table"""
+        self.table.load(self.db)
+        self.db.query.return_value.filter.return_value.all.return_value = self.rules[2:3]
+        self.table.load(self.db)
+        self.assertIsNone(self.table.match(1, 'technical'))
+    
+    def test_ensure_loaded(self):
+        """Test that fresh tables are not reloaded"""
+        self.table.ensure_loaded(self.db)
+        self.table.ensure_loaded(self.db)
+        self.assertEqual(self.db.query.return_value.filter.return_value.all.call_count, 1)
+    
+    def test_rule_change_reloads_other_tables(self):
+        """Test that a rule change made by one process is seen by the others' next ensure_loaded"""
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        Base.metadata.create_all(bind=engine)
+        Session = sessionmaker(bind=engine)
+        db = Session()
+        db.add(Client(id=1, name='Acme Corporation'))
+        db.add(RoutingRule(id=1, client_id=1, classification='technical', action='github_issue', destination='acme/support'))
+        db.commit()
+        
+        other = RoutingRuleTable()
+        other.ensure_loaded(db)
+        self.assertEqual(other.match(1, 'technical').destination, 'acme/support')
+        
+        writer = Session()
+        writer.get(RoutingRule, 1).destination = 'acme/urgent'
+        writer.commit()
+        writer.close()
+        
+        other.ensure_loaded(db)
+        self.assertEqual(other.match(1, 'technical').destination, 'acme/urgent')
+        db.close()
+    
+    @patch('app.backend.routes.routing_engine.get_ai_classifier')
+    @patch('app.backend.routes.routing_engine.GitHubHandler')
+    @patch('app.backend.routes.routing_engine.get_email_handler')
+    def test_engine_applies_rule(self, mock_email_handler, mock_github_handler, mock_ai_classifier):
+        """Test that the routing engine prefers matching rules over client contacts"""
+        mock_email_handler.return_value.forward_email.return_value = True
+        engine = RoutingEngine()
+        engine.rule_table = self.table
+        self.table.load(self.db)
+        
+        email_data = {'id': 1, 'sender': 'client@acmecorp.com', 'subject': 'Quote', 'body': 'Pricing please'}
+        client_data = {'id': 1, 'name': 'Acme Corporation', 'commercial_contact': 'sales@internal.com'}
+        
+        result = engine.route_email(email_data, client_data, 'commercial')
+        mock_email_handler.return_value.forward_email.assert_called_once_with(email_data, 'deals@internal.com')
+        self.assertEqual(result['rule_id'], 3)
+        self.assertEqual(result['destination'], 'deals@internal.com')
+        
+        # No active rule: fall back to the client's contact
+        client_data['administrative_contact'] = 'admin@internal.com'
+        result = engine.route_email(email_data, client_data, 'administrative')
+        self.assertEqual(result['destination'], 'admin@internal.com')
+        self.assertNotIn('rule_id', result)
+
+if __name__ == '__main__':
+    unittest.main()
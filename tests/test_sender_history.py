@@ -0,0 +1,146 @@
+"""
+Test script for per-sender classification history
+"""
+
+import os
+import sys
+import datetime
+import unittest
+from unittest.mock import MagicMock, patch
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# Add parent directory to path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.models import Base, Email
+from app.backend.ai.sender_history import SenderHistory
+from app.backend.routes.routing_engine import RoutingEngine
+
+class TestSenderHistory(unittest.TestCase):
+    """Test cases for sender history summaries and predictions"""
+    
+    def setUp(self):
+        """Set up test environment"""
+        self.history = SenderHistory()
+        self.history.min_samples = 3
+        self.history.dominance = 0.75
+        self.sender = 'Accounts Payable <ap@acmecorp.com>'
+    
+    def test_no_history(self):
+        """Test that unknown senders have no prediction"""
+        self.assertIsNone(self.history.summary(self.sender))
+        self.assertIsNone(self.history.predict(self.sender))
+    
+    def test_summary_normalizes_sender(self):
+        """Test that history is keyed by bare address"""
+        self.history.record(self.sender, 'commercial', 0.9)
+        self.history.record('AP@AcmeCorp.com', 'commercial', 0.8)
+        
+        summary = self.history.summary('ap@acmecorp.com')
+        self.assertEqual(summary['samples'], 2)
+        self.assertEqual(summary['counts'], {'commercial': 2})
+        self.assertAlmostEqual(summary['mean_confidence']['commercial'], 0.85)
+    
+    def test_stable_sender_prediction(self):
+        """Test prediction for a dominant, recent history"""
+        for _ in range(4):
+            self.history.record(self.sender, 'commercial', 0.9)
+        
+        self.assertEqual(self.history.predict(self.sender), ('commercial', 0.9))
+    
+    def test_mixed_sender_no_prediction(self):
+        """Test that mixed histories fall back to the classifier"""
+        for classification in ['commercial', 'technical', 'commercial', 'administrative']:
+            self.history.record(self.sender, classification, 0.9)
+        
+        self.assertIsNone(self.history.predict(self.sender))
+    
+    def test_stale_history_no_prediction(self):
+        """Test that old histories are not trusted"""
+        old = datetime.datetime.utcnow() - datetime.timedelta(days=365)
+        for _ in range(4):
+            self.history.record(self.sender, 'commercial', 0.9, old)
+        
+        self.assertIsNone(self.history.predict(self.sender))
+    
+    def test_window_and_eviction(self):
+        """Test the rolling window and sender cap"""
+        self.history.window = 3
+        self.history.max_senders = 2
+        self.history._senders.clear()
+        for classification in ['technical', 'commercial', 'commercial', 'commercial']:
+            self.history.record(self.sender, classification, 0.9)
+        self.assertEqual(self.history.summary(self.sender)['counts'], {'commercial': 3})
+        
+        self.history.record('a@example.com', 'technical', 0.9)
+        self.history.record('b@example.com', 'technical', 0.9)
+        self.assertIsNone(self.history.summary(self.sender))
+    
+    def test_load_reads_only_trusted_outcomes(self):
+        """Test that warm-up skips emails classified from the history itself"""
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(bind=engine)
+        db = sessionmaker(bind=engine)()
+        processed_at = datetime.datetime.utcnow()
+        sources = ['classifier', 'manual', 'sender_history', 'sender_history', None]
+        for i, source in enumerate(sources):
+            db.add(Email(message_id=f'<{i}@acmecorp.com>', sender='ap@acmecorp.com', recipient='inbox@example.com',
+                         classification='commercial', confidence_score=0.8, classification_source=source,
+                         status='processed', processed_at=processed_at))
+        db.commit()
+        
+        self.history.load(db)
+        db.close()
+        
+        summary = self.history.summary(self.sender)
+        self.assertEqual(summary['samples'], 2)
+        self.assertAlmostEqual(summary['mean_confidence']['commercial'], 0.9)
+    
+    @patch('app.backend.routes.routing_engine.get_ai_classifier')
+    @patch('app.backend.routes.routing_engine.GitHubHandler')
+    @patch('app.backend.routes.routing_engine.get_email_handler')
+    def test_engine_skips_classifier_for_stable_sender(self, mock_email_handler, mock_github_handler, mock_ai_classifier):
+        """Test that the routing engine uses the sender history instead of the classifier"""
+        mock_ai_classifier.return_value.confidence_threshold = 0.7
+        mock_email_handler.return_value.forward_email.return_value = True
+        
+        engine = RoutingEngine()
+        for _ in range(engine.sender_history.min_samples):
+            engine.record_classification({'sender': self.sender}, 'commercial', 0.95, 'classifier')
+        
+        result = engine.process_email(
+            {'sender': self.sender, 'subject': 'Invoice', 'body': 'Please find attached.'},
+            {'id': 1, 'name': 'Acme Corporation', 'commercial_contact': 'sales@internal.com'}
+        )
+        
+        mock_ai_classifier.return_value.classify_email.assert_not_called()
+        self.assertEqual(result['classification'], 'commercial')
+        self.assertEqual(result['classification_source'], 'sender_history')
+        self.assertEqual(result['action'], 'email_forward')
+    
+    @patch('app.backend.ai.classifier.openai.ChatCompletion.create')
+    @patch('app.backend.routes.routing_engine.get_ai_classifier')
+    @patch('app.backend.routes.routing_engine.GitHubHandler')
+    @patch('app.backend.routes.routing_engine.get_email_handler')
+    def test_open_breaker_does_not_teach_history(self, mock_email_handler, mock_github_handler, mock_ai_classifier, mock_openai):
+        """Test that keyword guesses made while the OpenAI circuit is open are not learnt from"""
+        from app.backend.ai.classifier import OpenAIClassifier
+        
+        with patch.dict('os.environ', {'OPENAI_API_KEY': 'test_api_key'}):
+            classifier = OpenAIClassifier()
+        for _ in range(classifier.circuit_breaker.failure_threshold):
+            classifier.circuit_breaker.record_failure()
+        mock_ai_classifier.return_value = classifier
+        
+        engine = RoutingEngine()
+        for _ in range(engine.sender_history.min_samples + 1):
+            decision = engine.decide({'sender': self.sender, 'body': 'We get a server error, please fix this bug.'})
+        
+        mock_openai.assert_not_called()
+        self.assertEqual(decision['classification_source'], 'fallback')
+        self.assertIsNone(engine.sender_history.summary(self.sender))
+
+if __name__ == '__main__':
+    unittest.main()